@@ -1,5 +1,6 @@
 from django.contrib import admin
-from livequiz.models import LiveQuizModel, LiveQuizParticipant
+from livequiz.models import LiveQuizModel, LiveQuizParticipant, LiveQuizTeam
 
 admin.site.register(LiveQuizModel)
-admin.site.register(LiveQuizParticipant)
\ No newline at end of file
+admin.site.register(LiveQuizParticipant)
+admin.site.register(LiveQuizTeam)
\ No newline at end of file
@@ -0,0 +1,67 @@
+'''
+Open response rounds: every player types an answer to the question on screen, and the
+host sees them grouped by what they say rather than one by one.
+'''
+
+import unicodedata
+
+# Longest answer kept, in characters.
+MAX_ANSWER_LENGTH = 256
+
+# Seconds between answer summaries sent to the host while answers are coming in.
+SUMMARY_INTERVAL = 0.5
+
+# Most groups listed in a summary. The rest are only counted.
+MAX_SUMMARY_GROUPS = 50
+
+
+def normalize(text: str) -> str:
+    '''
+    The form of an answer used for grouping: case folded, without punctuation and with
+    whitespace collapsed, so that "Paris." and "  paris" count as the same answer.
+    '''
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = ''.join(char for char in text if char.isalnum() or char.isspace())
+    return ' '.join(text.split())
+
+
+class AnswerGroup:
+    '''Answers that normalize to the same text, shown as the first one received.'''
+    __slots__ = ('text', 'count')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.count = 0
+
+
+class AnswerRound:
+    '''
+    The answers to one question. Groups are keyed by normalized text, so adding an
+    answer is a single hash lookup, and each player answers once.
+    '''
+
+    def __init__(self, question_id: int):
+        self.question_id = question_id
+        self.groups: dict[str, AnswerGroup] = {}
+        self.answered = set()
+        self.total = 0
+
+    def has_answered(self, player) -> bool:
+        return player in self.answered
+
+    def add(self, player, text: str) -> AnswerGroup:
+        '''Counts the answer of player towards its group.'''
+        key = normalize(text)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = AnswerGroup(text.strip())
+
+        group.count += 1
+        self.answered.add(player)
+        self.total += 1
+        return group
+
+    def summary(self) -> list[list]:
+        '''The largest groups as [text, count] lists, largest first.'''
+        groups = sorted(self.groups.values(), key=lambda group: -group.count)
+        return [[group.text, group.count] for group in groups[:MAX_SUMMARY_GROUPS]]
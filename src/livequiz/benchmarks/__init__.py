@@ -0,0 +1,128 @@
+'''
+Benchmarks for the live quiz websocket pipeline. They are ordinary Django test cases
+that are left out of normal test discovery. Run one by naming it, for example
+
+    python manage.py test livequiz.benchmarks.engine
+'''
+
+from statistics import mean
+from time import perf_counter
+
+from channels.auth import AuthMiddlewareStack
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.urls import re_path
+
+from livequiz.consumers import LiveQuizHostConsumer, LiveQuizParticipantConsumer
+from livequiz.models import LiveQuizModel, QuizData
+
+
+def percentile(samples, fraction):
+    '''The sample below which the given fraction of all samples fall.'''
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index]
+
+
+def report(title, samples, unit='ms', scale=1000):
+    '''Prints a one line summary of timing samples given in seconds.'''
+    print(
+        f'{title}: n={len(samples)} '
+        f'mean={mean(samples) * scale:.3f}{unit} '
+        f'p50={percentile(samples, 0.5) * scale:.3f}{unit} '
+        f'p99={percentile(samples, 0.99) * scale:.3f}{unit}'
+    )
+
+
+class Stopwatch:
+    '''Context manager that records how long its body took into a list of samples.'''
+
+    def __init__(self, samples: list):
+        self.samples = samples
+        self.start = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.samples.append(perf_counter() - self.start)
+
+
+def as_user(user, application):
+    '''Wraps an ASGI application so that every scope belongs to user.'''
+    async def app(scope, receive, send):
+        return await application(dict(scope, user=user), receive, send)
+
+    return app
+
+
+def get_application(host):
+    '''The live quiz websocket routes, with host already logged in on the host route.'''
+    return AuthMiddlewareStack(URLRouter([
+        re_path(r'^host/(?P<quiz_code>\w+)$',
+                as_user(host, LiveQuizHostConsumer.as_asgi())),
+        re_path(r'^play/(?P<quiz_code>\w+)$',
+                LiveQuizParticipantConsumer.as_asgi()),
+    ]))
+
+
+def create_board_quiz(host, categories=6, questions=5):
+    '''Synchronously create a live quiz with a full board of questions.'''
+    return LiveQuizModel.objects.create_for_quiz(
+        host,
+        QuizData(name='Benchmark', categories={
+            f'Category {category}': tuple(
+                ((row + 1) * 100, f'Question {category}-{row}', f'Answer {category}-{row}')
+                for row in range(questions)
+            )
+            for category in range(categories)
+        })
+    )
+
+
+# Messages sent on timers of their own, which no benchmark waits for.
+BACKGROUND = {'ping', 'roster update', 'presence'}
+
+
+async def answer_ping(communicator, message):
+    '''Answers message if it is a ping, like a real client, so the socket is not held.'''
+    if message['type'] == 'ping':
+        await communicator.send_json_to(
+            {'type': 'pong', 'payload': {'id': message['payload']['id']}})
+
+
+async def receive(communicator):
+    '''The next message for the communicator that is not a ping or other background.'''
+    while True:
+        message = await communicator.receive_json_from()
+        await answer_ping(communicator, message)
+        if message['type'] not in BACKGROUND:
+            return message
+
+
+async def drain(communicator, quiet=0.02) -> list[dict]:
+    '''Receives messages until none arrive for quiet seconds. Returns those that are not pings.'''
+    messages = []
+    while not await communicator.receive_nothing(quiet):
+        message = await communicator.receive_json_from()
+        await answer_ping(communicator, message)
+        if message['type'] != 'ping':
+            messages.append(message)
+
+    return messages
+
+
+async def connect(application, path, last_type):
+    '''
+    Connects a communicator and receives messages up to the first of type last_type, and
+    whatever else arrives right after. Returns it along with the messages sent on connect.
+    '''
+    communicator = WebsocketCommunicator(application, path)
+    await communicator.connect()
+
+    messages = [await receive(communicator)]
+    while messages[-1]['type'] != last_type:
+        messages.append(await receive(communicator))
+
+    return communicator, messages + await drain(communicator)
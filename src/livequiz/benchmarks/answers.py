@@ -0,0 +1,87 @@
+'''
+An open response round: many players type an answer at the same moment. Answers should
+be acknowledged quickly, written in a handful of batches, and summarized for the host
+rather than forwarded one by one.
+'''
+
+import asyncio
+import random
+from time import perf_counter
+from unittest.mock import patch
+
+from channels.db import database_sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+import livequiz.engine
+from livequiz.benchmarks import (
+    connect, create_board_quiz, drain, get_application, percentile, receive, report
+)
+from livequiz.engine import engine
+from livequiz.models import LiveQuizResponse
+
+PLAYERS = 300
+SPREAD = 2.0
+ANSWERS = ['Paris', 'paris', 'PARIS!', 'Lyon', 'Marseille', 'Nice']
+P99_BUDGET = 0.5
+
+
+class BenchmarkAnswerRound(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(username='host', password='bench')
+        cls.quiz = create_board_quiz(cls.host)
+        cls.question = cls.quiz.categories.first().questions.first()
+
+    async def test_answer_round(self):
+        application = get_application(self.host)
+        host, _ = await connect(application, f'host/{self.quiz.code}', 'snapshot')
+        players = [
+            (await connect(application, f'play/{self.quiz.code}', 'rank'))[0]
+            for _ in range(PLAYERS)
+        ]
+
+        await host.send_json_to({
+            'type': 'set view',
+            'payload': {'view': 'question', 'question_id': self.question.pk}
+        })
+        await host.send_json_to({'type': 'manage answers', 'payload': {'action': 'start'}})
+        for communicator in [host] + players:
+            await drain(communicator)
+
+        latencies = []
+
+        async def answer(communicator):
+            await asyncio.sleep(random.uniform(0, SPREAD))
+            sent = perf_counter()
+            await communicator.send_json_to({
+                'type': 'submit answer',
+                'payload': {'text': random.choice(ANSWERS)}
+            })
+            while (await receive(communicator))['type'] != 'answer round':
+                pass
+            latencies.append(perf_counter() - sent)
+
+        write_changes = livequiz.engine.write_changes
+        with patch('livequiz.engine.write_changes', wraps=write_changes) as writes:
+            await asyncio.gather(*(answer(communicator) for communicator in players))
+            await engine.flush()
+
+        summaries = [
+            message for message in await drain(host, quiet=0.6)
+            if message['type'] == 'answer summary'
+        ]
+        stored = await database_sync_to_async(LiveQuizResponse.objects.count)()
+
+        for communicator in players:
+            await communicator.disconnect()
+        await host.disconnect()
+
+        report(f'answer acknowledged, {PLAYERS} players over {SPREAD}s', latencies)
+        print(f'database batches: {writes.call_count}, host summaries: {len(summaries)}')
+
+        self.assertEqual(stored, PLAYERS)
+        self.assertEqual(summaries[-1]['payload']['total'], PLAYERS)
+        self.assertEqual(summaries[-1]['payload']['distinct'], 4)
+        self.assertLess(len(summaries), PLAYERS / 10)
+        self.assertLess(percentile(latencies, 0.99), P99_BUDGET)
@@ -0,0 +1,93 @@
+'''
+A buzz storm: many players buzz in at the same moment. Exactly one of them may win, the
+rest are queued behind them, and every buzz should be decided quickly.
+'''
+
+import asyncio
+from time import perf_counter
+from unittest.mock import patch
+
+from channels.db import database_sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from livequiz.benchmarks import (
+    connect, create_board_quiz, drain, get_application, percentile, receive, report
+)
+from livequiz.engine import LiveQuizState, engine
+from livequiz.models import LiveQuizModel
+
+PLAYERS = 200
+P99_BUDGET = 0.5
+
+
+class BenchmarkBuzzStorm(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(username='host', password='bench')
+        cls.quiz = create_board_quiz(cls.host)
+
+    @staticmethod
+    async def until(condition):
+        while not condition():
+            await asyncio.sleep(0.001)
+
+    async def test_buzz_storm(self):
+        application = get_application(self.host)
+        host, _ = await connect(application, f'host/{self.quiz.code}', 'snapshot')
+        players = []
+        for _ in range(PLAYERS):
+            communicator, messages = await connect(application, f'play/{self.quiz.code}', 'rank')
+            update = next(message for message in messages if message['type'] == 'player update')
+            players.append((update['payload']['id'], communicator))
+        for communicator in [host] + [communicator for _, communicator in players]:
+            await drain(communicator)
+
+        await host.send_json_to({'type': 'manage buzz', 'payload': {'action': 'start'}})
+        for communicator in [host] + [communicator for _, communicator in players]:
+            await receive(communicator)
+        await engine.flush()
+
+        sent, decided = {}, {}
+        original = LiveQuizState.buzz_in
+
+        def timed_buzz_in(state, player_id, *args):
+            result = original(state, player_id, *args)
+            decided[player_id] = perf_counter()
+            return result
+
+        async def buzz(player_id, communicator):
+            sent[player_id] = perf_counter()
+            await communicator.send_json_to({'type': 'buzz in', 'payload': {}})
+
+        with patch.object(LiveQuizState, 'buzz_in', timed_buzz_in), \
+                patch('livequiz.engine.database_sync_to_async') as database:
+            await asyncio.gather(*(buzz(*player) for player in players))
+
+            await asyncio.wait_for(self.until(lambda: len(decided) == PLAYERS), 10)
+
+            database.assert_not_called()
+
+        updates = [await receive(host)]
+        while not await host.receive_nothing(0.1):
+            updates.append(await host.receive_json_from())
+        updates = [update for update in updates if update['type'] == 'buzz event']
+        winners = [update for update in updates if 'queued' not in update['payload']]
+
+        state = await engine.get_state(self.quiz.code)
+        await engine.flush()
+        stored = await database_sync_to_async(
+            lambda: LiveQuizModel.objects.get(code=self.quiz.code).buzz_event.player.number
+        )()
+
+        for _, communicator in players:
+            await communicator.disconnect()
+        await host.disconnect()
+
+        latencies = [decided[player_id] - sent[player_id] for player_id in sent]
+        report(f'buzz decision, {PLAYERS} simultaneous players', latencies)
+
+        self.assertEqual(len(winners), 1)
+        self.assertEqual(len(state.buzz.queue), PLAYERS)
+        self.assertEqual(winners[0]['payload']['id'], stored)
+        self.assertLess(percentile(latencies, 0.99), P99_BUDGET)
@@ -0,0 +1,66 @@
+'''
+Frames and CPU spent when a host clicks quickly from question to answer to board, with
+every broadcast sent straight away and with them coalesced over a short window.
+'''
+
+import asyncio
+from time import process_time
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+import livequiz.engine as engine_module
+from livequiz.benchmarks import connect, create_board_quiz, drain, get_application
+from livequiz.engine import engine
+from livequiz.models import LiveQuizView
+
+PLAYERS = 200
+ROUNDS = 10
+CLICK_GAP = 0.01
+WINDOW = 0.03
+
+
+class BenchmarkCoalescing(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(username='host', password='bench')
+        cls.quiz = create_board_quiz(cls.host)
+
+    async def click_through(self, state, question_id):
+        for view, question in [(LiveQuizView.QUESTION, question_id),
+                               (LiveQuizView.ANSWER, question_id),
+                               (LiveQuizView.QUIZ_BOARD, None)]:
+            await state.broadcast(await state.submit(state.set_view, view, question))
+            await asyncio.sleep(CLICK_GAP)
+
+    async def test_quick_clicks(self):
+        application = get_application(self.host)
+        players = [
+            (await connect(application, f'play/{self.quiz.code}', 'rank'))[0]
+            for _ in range(PLAYERS)
+        ]
+        for communicator in players:
+            await drain(communicator)
+
+        state = await engine.get_state(self.quiz.code)
+        question_ids = list(state.questions)[:ROUNDS]
+
+        for name, window in [('sent straight away', 0), (f'coalesced over {WINDOW}s', WINDOW)]:
+            frames = 0
+            started = process_time()
+            with patch.object(engine_module, 'COALESCE_WINDOW', window):
+                for question_id in question_ids:
+                    await self.click_through(state, question_id)
+                await asyncio.sleep(2 * WINDOW)
+
+                for communicator in players:
+                    frames += len(await drain(communicator))
+
+            print(f'{ROUNDS} rounds of 3 clicks, {name}: {frames / PLAYERS:.0f} frames per '
+                  f'player, {process_time() - started:.2f}s CPU for {PLAYERS} players')
+
+        print(f'frames saved: {state.frames_saved}')
+
+        for communicator in players:
+            await communicator.disconnect()
@@ -0,0 +1,64 @@
+'''
+Encode and decode throughput of the live quiz JSON codec against the standard library
+json module the consumers used before, on real board and question messages, and the
+size and encode throughput of the MessagePack frames when msgpack is installed.
+'''
+
+import json
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from livequiz import codec
+from livequiz.benchmarks import create_board_quiz
+from livequiz.models import LiveQuizView, render_view
+
+ROUNDS = 20000
+
+
+def throughput(function, payload) -> float:
+    '''Calls of function(payload) per second.'''
+    started = perf_counter()
+    for _ in range(ROUNDS):
+        function(payload)
+    return ROUNDS / (perf_counter() - started)
+
+
+class BenchmarkCodec(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(username='host', password='bench')
+        cls.quiz = create_board_quiz(cls.host)
+
+    def test_codec_throughput(self):
+        categories = self.quiz.get_categories()
+        question = next(iter(categories.values()))[0]
+        messages = {
+            'board': render_view(LiveQuizView.QUIZ_BOARD, categories, []),
+            'question': render_view(LiveQuizView.QUESTION, categories, [], question),
+        }
+
+        for name, message in messages.items():
+            text = json.dumps(message)
+            for library, dumps, loads in [('json', json.dumps, json.loads),
+                                          (codec.NAME, codec.dumps, codec.loads)]:
+                encode = throughput(dumps, message)
+                decode = throughput(loads, text)
+                print(
+                    f'{name} ({len(text)} bytes), {library}: '
+                    f'encode {encode:,.0f}/s {encode * len(text) / 1e6:.1f}MB/s, '
+                    f'decode {decode:,.0f}/s {decode * len(text) / 1e6:.1f}MB/s'
+                )
+
+            bytes_encode = throughput(codec.dumpb, message)
+            print(f'{name} ({len(text)} bytes), {codec.NAME} to bytes: '
+                  f'encode {bytes_encode:,.0f}/s')
+
+            if codec.packb is not None:
+                packed = codec.packb(message)
+                pack = throughput(codec.packb, message)
+                print(f'{name} ({len(packed)} bytes, {len(packed) / len(text):.0%} of '
+                      f'JSON), msgpack: encode {pack:,.0f}/s')
+
+        self.assertEqual(codec.loads(codec.dumps(messages['board'])), messages['board'])
@@ -0,0 +1,85 @@
+'''
+Host action to broadcast latency, with the in memory engine and with the database round
+trips the message handlers used to make.
+'''
+
+from unittest.mock import patch
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from livequiz.benchmarks import (
+    Stopwatch, connect, create_board_quiz, drain, get_application, receive, report
+)
+from livequiz.models import LiveQuizModel, LiveQuizView
+from livequiz.ratelimit import RATE_LIMITS
+
+PLAYERS = 20
+ROUNDS = 200
+
+
+async def legacy_set_view(code, group_name):
+    '''What SetViewMessage did before the engine: read, render and save, then broadcast.'''
+    message = await database_sync_to_async(
+        lambda: LiveQuizModel.objects.get(code=code).set_view(LiveQuizView.QUIZ_BOARD)
+    )()
+
+    await get_channel_layer().group_send(
+        group_name,
+        {
+            'type': 'send.generic.message',
+            'data': message
+        }
+    )
+
+
+class BenchmarkHostActionLatency(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(username='host', password='bench')
+        cls.quiz = create_board_quiz(cls.host)
+
+    async def connect_all(self):
+        application = get_application(self.host)
+        self.host_socket, _ = await connect(application, f'host/{self.quiz.code}', 'snapshot')
+        self.players = [
+            (await connect(application, f'play/{self.quiz.code}', 'rank'))[0]
+            for _ in range(PLAYERS)
+        ]
+        for communicator in [self.host_socket] + self.players:
+            await drain(communicator)
+
+    async def disconnect_all(self):
+        for communicator in [self.host_socket] + self.players:
+            await communicator.disconnect()
+
+    async def receive_everywhere(self):
+        for communicator in [self.host_socket] + self.players:
+            await receive(communicator)
+
+    # The host clicks far faster than anyone would, so lift its limit.
+    @patch.dict(RATE_LIMITS, {'set view': (ROUNDS, ROUNDS)})
+    async def test_set_view_latency(self):
+        await self.connect_all()
+
+        before, after = [], []
+
+        for _ in range(ROUNDS):
+            with Stopwatch(before):
+                await legacy_set_view(self.quiz.code, self.quiz.group_name)
+                await self.receive_everywhere()
+
+        for _ in range(ROUNDS):
+            with Stopwatch(after):
+                await self.host_socket.send_json_to({
+                    'type': 'set view',
+                    'payload': {'view': 'quiz_board', 'question_id': None}
+                })
+                await self.receive_everywhere()
+
+        await self.disconnect_all()
+
+        report(f'set view, database per message, {PLAYERS} players', before)
+        report(f'set view, in memory engine, {PLAYERS} players', after)
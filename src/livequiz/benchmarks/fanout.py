@@ -0,0 +1,72 @@
+'''
+CPU spent fanning one broadcast of the board out to every socket of a quiz, when each
+consumer encodes the message itself and when the broadcast carries it encoded once.
+'''
+
+from time import process_time
+
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+import livequiz.responses as respond
+from livequiz.benchmarks import (
+    connect, create_board_quiz, drain, get_application, receive, report
+)
+from livequiz.engine import engine
+
+PLAYERS = 300
+ROUNDS = 50
+
+
+class BenchmarkBroadcastFanOut(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(username='host', password='bench')
+        cls.quiz = create_board_quiz(cls.host)
+
+    async def receive_everywhere(self, players):
+        for communicator in players:
+            await receive(communicator)
+
+    async def test_fan_out_cpu(self):
+        application = get_application(self.host)
+        players = [
+            (await connect(application, f'play/{self.quiz.code}', 'rank'))[0]
+            for _ in range(PLAYERS)
+        ]
+        for communicator in players:
+            await drain(communicator)
+
+        state = await engine.get_state(self.quiz.code)
+        message = state.last_view_command
+
+        async def encode_per_socket():
+            await get_channel_layer().group_send(
+                state.group_name,
+                {
+                    'type': 'send.generic.message',
+                    'data': message
+                }
+            )
+
+        async def encode_once():
+            # A fresh copy, so that the cached view frame is not reused.
+            await state.broadcast(dict(message))
+
+        results = {}
+        for name, broadcast in [('encoded per socket', encode_per_socket),
+                                ('encoded once', encode_once)]:
+            samples = results[name] = []
+            for _ in range(ROUNDS):
+                started = process_time()
+                await broadcast()
+                await self.receive_everywhere(players)
+                samples.append(process_time() - started)
+
+        for communicator in players:
+            await communicator.disconnect()
+
+        print(f'board message: {len(respond.encode(message).text)} bytes')
+        for name, samples in results.items():
+            report(f'fan out CPU per broadcast, {name}, {PLAYERS} sockets', samples)
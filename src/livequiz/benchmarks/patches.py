@@ -0,0 +1,47 @@
+'''
+What marking a question answered costs when the whole board is rebuilt and broadcast,
+against building the board from the last one and broadcasting a patch.
+'''
+
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+import livequiz.responses as respond
+from livequiz.benchmarks import create_board_quiz
+from livequiz.engine import engine
+from livequiz.models import LiveQuizView, render_view
+
+
+class BenchmarkBoardPatches(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(username='host', password='bench')
+        cls.quiz = create_board_quiz(cls.host, categories=10, questions=10)
+
+    async def test_mark_answered(self):
+        state = await engine.get_state(self.quiz.code)
+        question_ids = list(state.questions)
+
+        full_bytes = patch_bytes = 0
+        full_time = patch_time = 0.0
+        for question_id in question_ids:
+            started = perf_counter()
+            board = render_view(LiveQuizView.QUIZ_BOARD, state.categories,
+                                state.answered_questions | {question_id})
+            full_bytes += len(respond.encode(board).text)
+            full_time += perf_counter() - started
+
+            started = perf_counter()
+            patch = await state.submit(state.mark_answered, question_id)
+            patch_bytes += len(respond.encode(patch).text)
+            patch_time += perf_counter() - started
+
+            self.assertEqual(state.last_view_command, board)
+
+        count = len(question_ids)
+        print(f'full board: {full_bytes / count:,.0f} bytes, '
+              f'{full_time / count * 1e6:,.0f}us per question')
+        print(f'board patch: {patch_bytes / count:,.0f} bytes, '
+              f'{patch_time / count * 1e6:,.0f}us per question')
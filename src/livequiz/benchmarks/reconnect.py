@@ -0,0 +1,49 @@
+'''
+What a room reconnecting after a dropped connection costs, when every player is sent a
+snapshot of the quiz and when they are replayed only the broadcasts they missed.
+'''
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from livequiz import codec
+from livequiz.benchmarks import Stopwatch, connect, create_board_quiz, get_application, report
+from livequiz.engine import engine
+
+PLAYERS = 100
+MISSED = 3
+
+
+class BenchmarkReconnect(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(username='host', password='bench')
+        cls.quiz = create_board_quiz(cls.host, categories=10, questions=10)
+
+    async def reconnect_room(self, query):
+        application = get_application(self.host)
+        samples = []
+        sent = 0
+        players = []
+        for _ in range(PLAYERS):
+            with Stopwatch(samples):
+                communicator, messages = await connect(
+                    application, f'play/{self.quiz.code}{query}', 'rank')
+            sent += sum(len(codec.dumps(message)) for message in messages)
+            players.append(communicator)
+
+        for communicator in players:
+            await communicator.disconnect()
+
+        return samples, sent / PLAYERS
+
+    async def test_reconnect(self):
+        state = await engine.get_state(self.quiz.code)
+        await state.broadcast(state.get_buzz_message())
+        epoch, seq = state.epoch, state.seq
+        for _ in range(MISSED):
+            await state.broadcast(state.get_buzz_message())
+
+        for name, query in [('snapshot', ''), ('replay', f'?epoch={epoch}&seq={seq}')]:
+            samples, sent = await self.reconnect_room(query)
+            report(f'reconnect with {name}, {PLAYERS} players, {sent:,.0f} bytes each', samples)
@@ -0,0 +1,46 @@
+'''
+What the host receives while a class joins: roster updates gathered over a short window
+rather than the whole player list sent again on every join.
+'''
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from livequiz import codec
+from livequiz.benchmarks import connect, create_board_quiz, drain, get_application
+
+PLAYERS = 300
+
+
+class BenchmarkRoster(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(username='host', password='bench')
+        cls.quiz = create_board_quiz(cls.host)
+
+    async def test_join_storm(self):
+        application = get_application(self.host)
+        host, _ = await connect(application, f'host/{self.quiz.code}', 'roster')
+
+        # The host keeps reading, and answering its pings, while everyone joins.
+        players, messages = [], []
+        for _ in range(PLAYERS):
+            players.append((await connect(application, f'play/{self.quiz.code}', 'rank'))[0])
+            messages += await drain(host, quiet=0.001)
+        messages += await drain(host, quiet=0.5)
+        updates = [message for message in messages if message['type'] == 'roster update']
+
+        added = sum(len(update['payload'].get('added', [])) for update in updates)
+        sent = sum(len(codec.dumps(update)) for update in updates)
+        # Sending everyone on every join would repeat the whole list each time.
+        naive = sum(
+            len(codec.dumps({'type': 'roster', 'payload': {'players': [[n, 'Anonymous']] * n}}))
+            for n in range(1, PLAYERS + 1)
+        )
+        print(f'{PLAYERS} players joining: {len(updates)} roster updates, {sent:,} bytes '
+              f'for the host, against {naive:,} bytes resending the roster on every join')
+
+        self.assertEqual(added, PLAYERS)
+
+        for communicator in players + [host]:
+            await communicator.disconnect()
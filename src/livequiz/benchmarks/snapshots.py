@@ -0,0 +1,99 @@
+'''
+Snapshot cost with a thousand live quizzes in one worker: saving them all at once, saving
+the one quiz that just changed, compacting the journal, and restoring after a restart.
+'''
+
+import random
+from copy import copy
+from tempfile import TemporaryDirectory
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from livequiz.benchmarks import Stopwatch, create_board_quiz, report
+from livequiz.engine import LiveQuizEngine, LiveQuizState, Player
+from livequiz.snapshots import SnapshotStore
+
+QUIZZES = 1000
+PLAYERS = 30
+EVENTS = 5000
+
+
+class BenchmarkSnapshots(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(username='host', password='bench')
+        cls.quiz = create_board_quiz(cls.host)
+        cls.categories = cls.quiz.get_categories()
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def start(self):
+        engine = LiveQuizEngine(self.directory)
+        self.addCleanup(engine.snapshots.close)
+        engine.snapshots.open()
+        return engine
+
+    def add_quizzes(self, engine):
+        '''Puts QUIZZES states with an open buzz queue in the engine, as if they were loaded.'''
+        for number in range(QUIZZES):
+            quiz = copy(self.quiz)
+            quiz.code = f'Q{number:05}'
+            players = [
+                Player(number * PLAYERS + index, f'socket {number} {index}', f'Player {index}')
+                for index in range(PLAYERS)
+            ]
+            state = LiveQuizState(engine, quiz, self.categories, players, [], False, None)
+            engine._states[quiz.code] = state
+
+            for player in random.sample(players, 5):
+                player.score = random.randrange(0, 3000, 100)
+
+        return list(engine._states.values())
+
+    async def test_snapshot_cost(self):
+        engine = self.start()
+        states = self.add_quizzes(engine)
+
+        everything = []
+        for _ in range(20):
+            with Stopwatch(everything):
+                for state in states:
+                    engine._unsaved[state.code] = state
+                engine.save_snapshots()
+
+        single = []
+        for _ in range(EVENTS):
+            state = random.choice(states)
+            random.choice(list(state.players.values())).score += 100
+            engine._unsaved[state.code] = state
+            with Stopwatch(single):
+                engine.save_snapshots()
+
+        compaction = []
+        for _ in range(20):
+            with Stopwatch(compaction):
+                engine.snapshots.write_snapshot(engine.snapshots.rotate())
+        engine.snapshots.close()
+
+        opening, restoring = [], []
+        for _ in range(20):
+            store = SnapshotStore(self.directory)
+            with Stopwatch(opening):
+                store.open()
+            store.close()
+
+        for state in states:
+            with Stopwatch(restoring):
+                state.restore(store.get(state.code))
+
+        report(f'snapshot all {QUIZZES} quizzes', everything)
+        report(f'snapshot one quiz of {QUIZZES}', single, unit='us', scale=1e6)
+        report(f'compact {QUIZZES} quizzes', compaction)
+        report(f'open snapshots of {QUIZZES} quizzes', opening)
+        report(f'restore one quiz of {PLAYERS} players', restoring, unit='us', scale=1e6)
+
+        self.assertEqual(len(store.lines), QUIZZES)
@@ -0,0 +1,54 @@
+'''
+Timer accuracy with thousands of live quizzes, each running a question timer and a buzz
+timer on the shared wheel, while hosts keep restarting a share of them.
+'''
+
+import asyncio
+import random
+from time import monotonic, perf_counter
+
+from django.test import SimpleTestCase
+
+from livequiz.benchmarks import percentile, report
+from livequiz.timers import TimerWheel
+
+QUIZZES = 5000
+LONGEST = 2.0
+P99_BUDGET = 0.05
+
+
+class BenchmarkTimerWheel(SimpleTestCase):
+    async def test_timer_lateness(self):
+        wheel = TimerWheel()
+        lateness = []
+
+        def fire(deadline):
+            lateness.append(monotonic() - deadline)
+
+        def schedule(delay):
+            return wheel.schedule(delay, fire, monotonic() + delay)
+
+        scheduling = []
+        timers = []
+        for _ in range(QUIZZES):
+            started = perf_counter()
+            timers.append(schedule(random.uniform(0.1, LONGEST)))
+            timers.append(schedule(random.uniform(0.1, LONGEST)))
+            scheduling.append((perf_counter() - started) / 2)
+
+        cancelling = []
+        for timer in random.sample(timers, len(timers) // 4):
+            started = perf_counter()
+            timer.cancel()
+            cancelling.append(perf_counter() - started)
+            schedule(random.uniform(0.1, LONGEST))
+
+        while wheel.count:
+            await asyncio.sleep(0.1)
+
+        report('timer schedule', scheduling, unit='us', scale=1e6)
+        report('timer cancel', cancelling, unit='us', scale=1e6)
+        report(f'timer lateness, {2 * QUIZZES} timers', lateness)
+
+        self.assertEqual(len(lateness), 2 * QUIZZES)
+        self.assertLess(percentile(lateness, 0.99), P99_BUDGET)
@@ -0,0 +1,60 @@
+'''
+The quiz board as sent to clients, in columns rather than as a dict of question dicts:
+the category names and how many questions each has, the id and value of every question
+in board order, and a bitmap of those answered. Bit i of the bitmap is bit i % 8 of
+byte i // 8, and the bytes are base64 encoded so JSON can carry them too.
+'''
+
+from base64 import b64encode
+
+
+def get_bitmap(indices, size: int) -> bytearray:
+    '''A bitmap of size bits with the bits at indices set.'''
+    bits = bytearray((size + 7) // 8)
+    set_bits(bits, indices)
+    return bits
+
+
+def set_bits(bits: bytearray, indices):
+    '''Sets the bits at indices in place.'''
+    for index in indices:
+        bits[index >> 3] |= 1 << (index & 7)
+
+
+def encode_bitmap(bits: bytearray) -> str:
+    '''The bitmap as clients receive it.'''
+    return b64encode(bits).decode('ascii')
+
+
+def get_positions(categories) -> dict[int, int]:
+    '''Where each question is on the board, by its id.'''
+    return {
+        question.pk: index
+        for index, question in enumerate(
+            question for questions in categories.values() for question in questions)
+    }
+
+
+def render_board(categories, answered) -> dict:
+    '''
+    The board data for categories mapping names to lists of questions, with the
+    questions whose ids are in answered marked.
+    '''
+    ids, values, sizes = [], [], []
+    for questions in categories.values():
+        sizes.append(len(questions))
+        for question in questions:
+            ids.append(question.pk)
+            values.append(question.value)
+
+    bits = get_bitmap(
+        (index for index, question_id in enumerate(ids) if question_id in answered),
+        len(ids)
+    )
+    return {
+        'categories': list(categories),
+        'sizes': sizes,
+        'ids': ids,
+        'values': values,
+        'answered': encode_bitmap(bits)
+    }
@@ -0,0 +1,63 @@
+'''
+The JSON codec for everything a live quiz encodes: websocket frames, snapshots and the
+JSON kept in model fields. orjson is used when it is installed, and the standard library
+otherwise. Either way the JSON is compact and not escaped to ASCII, so both produce the
+same text.
+
+When msgpack is installed, websocket frames can also be encoded as MessagePack for the
+clients that ask for it. Without it, packb and unpackb are None.
+'''
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+if orjson is not None:
+    NAME = 'orjson'
+
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumpb(obj) -> bytes:
+        '''Encodes obj to UTF-8 JSON bytes.'''
+        return orjson.dumps(obj, option=_OPTIONS)
+
+    def dumps(obj) -> str:
+        '''Encodes obj to a JSON string.'''
+        return orjson.dumps(obj, option=_OPTIONS).decode()
+
+    loads = orjson.loads
+
+else:
+    NAME = 'json'
+
+    _encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+    def dumps(obj) -> str:
+        '''Encodes obj to a JSON string.'''
+        return _encoder.encode(obj)
+
+    def dumpb(obj) -> bytes:
+        '''Encodes obj to UTF-8 JSON bytes.'''
+        return _encoder.encode(obj).encode()
+
+    loads = json.loads
+
+if msgpack is not None:
+    def packb(obj) -> bytes:
+        '''Encodes obj to MessagePack, with str as str and bytes as bin.'''
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def unpackb(data: bytes):
+        '''Decodes MessagePack from data.'''
+        return msgpack.unpackb(data, raw=False)
+
+else:
+    packb = unpackb = None
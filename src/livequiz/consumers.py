@@ -1,4 +1,8 @@
+import asyncio
 import logging as LOG
+from random import uniform
+from time import monotonic
+from urllib.parse import parse_qs
 
 from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
@@ -6,32 +10,215 @@ from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from django.contrib.auth.models import User
 
 import livequiz.responses as respond
+from livequiz import codec
+from livequiz.drain import SERVICE_RESTART, drain, reconnect_delay
+from livequiz.engine import engine
+from livequiz.latency import FIRST_PING_DELAY, RoundTripEstimator, ping_interval
 from livequiz.messages import ClientMessage
 from livequiz.models import LiveQuizModel, LiveQuizParticipant
+from livequiz.outbox import SNAPSHOT, TRY_AGAIN_LATER, Close, Outbox
+from livequiz.presence import idle_timeout
+from livequiz.ratelimit import RateLimiter, get_throttled_frame
 
 
-@database_sync_to_async
-def get_quiz_and_host(code):
-    '''Synchronously get the live quiz and its owner from the database.'''
-    livequiz = LiveQuizModel.objects.get(code=code)
-    return livequiz, livequiz.host
+# Websocket subprotocols a client may ask for, by the encoding of the frames it receives.
+JSON_SUBPROTOCOL = 'livequiz.json'
+MSGPACK_SUBPROTOCOL = 'livequiz.msgpack'
 
 
 class LiveQuizConsumer(AsyncJsonWebsocketConsumer):
     '''
     Generic consumer for LiveQuiz interactions that utilizes the messages and reponses
-    module.
+    module. Clients asking for the MessagePack subprotocol receive binary MessagePack
+    frames instead of JSON text, if msgpack is installed. Either way they may send both.
+
+    Everything sent goes through the outbox, written by a task of its own, so that a
+    client slow to take its frames does not hold up the handling of anything else.
+
+    Every socket is pinged as a heartbeat. One that misses a heartbeat is idle until it
+    is heard from again, and nothing more is written to it meanwhile. One silent for too
+    long is closed.
     '''
 
     def __init__(self, *args, **kwargs):
         self.code = None
         self.group_name = None
+        self.live_quiz = None
         self._is_host = False
+        self.latency = RoundTripEstimator()
+        self.rate_limiter = RateLimiter()
+        self._throttled = set()
+        self.binary = False
+        self.outbox = Outbox()
+        self._writer = None
+        self.last_heard = monotonic()
+        self.idle = False
+        self._heartbeat_task = None
 
         super().__init__(*args, **kwargs)
 
+    def select_subprotocol(self) -> str | None:
+        '''
+        The subprotocol to accept: MessagePack if the client asks for it and it is
+        available, or else JSON. Clients asking for neither get plain JSON.
+        '''
+        offered = self.scope.get('subprotocols') or []
+        if MSGPACK_SUBPROTOCOL in offered and codec.packb is not None:
+            return MSGPACK_SUBPROTOCOL
+        if offered:
+            return JSON_SUBPROTOCOL
+        return None
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        self.last_heard = monotonic()
+        if self.idle:
+            self.idle = False
+            self.outbox.release()
+            self.start_writing()
+            await self.on_idle(False)
+
+        if bytes_data is not None and codec.unpackb is not None:
+            await self.receive_json(codec.unpackb(bytes_data), **kwargs)
+        else:
+            await super().receive(text_data, bytes_data, **kwargs)
+
+    async def send_json(self, content, close=False):
+        await self.queue(content)
+        if close:
+            await self.close()
+
+    async def send_frame(self, frame: respond.Frame, numbered=False):
+        '''
+        Sends an already encoded message in the encoding of this socket. Numbered frames
+        are broadcasts, which a snapshot can take the place of.
+        '''
+        await self.queue(frame, numbered)
+
+    async def close(self, code=None):
+        '''
+        Closes the socket once everything already queued has been written, even if the
+        client has not answered its last heartbeat.
+        '''
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+        self.outbox.release()
+        await self.queue(Close(code))
+
+    async def queue(self, item, numbered=False):
+        '''Puts item in the outbox, to be written as soon as those before it are.'''
+        if not self.outbox.put(item, numbered):
+            await self.give_up()
+            return
+
+        if self.live_quiz is not None and self.outbox.behind_since is not None:
+            self.live_quiz.lagging_sockets[self.channel_name] = self.outbox
+        self.start_writing()
+
+    def start_writing(self):
+        '''Starts writing the outbox, unless it is being written already or is held.'''
+        if self._writer is None and not self.outbox.held and len(self.outbox):
+            self._writer = asyncio.create_task(self.write_outbox())
+
+    async def written(self):
+        '''Waits until what is in the outbox has been written, or is no longer wanted.'''
+        if self._writer is not None:
+            await asyncio.wait([self._writer])
+
+    async def write_outbox(self):
+        '''Writes what is in the outbox until there is nothing left, or it is held.'''
+        try:
+            while (item := self.outbox.get()) is not None:
+                if item is SNAPSHOT:
+                    item = await self.live_quiz.get_snapshot_frame()
+                await self.write(item)
+        finally:
+            self._writer = None
+            if self.live_quiz is not None and self.outbox.behind_since is None:
+                self.live_quiz.lagging_sockets.pop(self.channel_name, None)
+
+    async def write(self, item):
+        if isinstance(item, Close):
+            self.outbox.close()
+            await super().close(item.code)
+        elif isinstance(item, respond.Frame):
+            if self.binary and item.binary is not None:
+                await self.send(bytes_data=item.binary)
+            else:
+                await self.send(text_data=item.text)
+        elif self.binary:
+            await self.send(bytes_data=codec.packb(item))
+        else:
+            await super().send_json(item)
+
+    async def heartbeat(self):
+        '''
+        Pings the socket, which keeps the round trip estimate fresh and tells whether
+        anyone is still there. The more players a quiz has, the less often each socket is
+        pinged, and the pings are spread out randomly.
+        '''
+        await asyncio.sleep(uniform(FIRST_PING_DELAY, 2 * FIRST_PING_DELAY))
+
+        while True:
+            pinged_at = monotonic()
+            # A held socket has yet to answer the last ping, which was written after all
+            # the others before it.
+            if not self.outbox.held:
+                await self.send_json(respond.get_ping_message(self.latency.ping()))
+
+            interval = ping_interval(self.live_quiz.presence.connected)
+            await asyncio.sleep(uniform(0.75 * interval, 1.25 * interval))
+
+            if self.last_heard >= pinged_at:
+                continue
+            silence = monotonic() - self.last_heard
+            if silence > idle_timeout(interval):
+                await self.close_silent(silence)
+                return
+            if not self.idle:
+                self.idle = True
+                self.outbox.hold()
+                await self.on_idle(True)
+
+    async def on_idle(self, idle: bool):
+        '''Called when the socket misses a heartbeat, and when it is heard from again.'''
+
+    async def close_silent(self, silence: float):
+        '''Nothing was heard from the client for too long, so take it for dead.'''
+        LOG.warning('Closing socket %s of quiz %s after %.0f silent seconds',
+                    self.channel_name, self.code, silence)
+        self.outbox.close()
+        await super().close(TRY_AGAIN_LATER)
+
+    async def give_up(self):
+        '''The client stayed behind for too long, so have it reconnect instead.'''
+        LOG.warning('Closing socket %s of quiz %s for staying behind: %s',
+                    self.channel_name, self.code, self.outbox.lag())
+        self.outbox.close()
+        if self.live_quiz is not None:
+            self.live_quiz.lagging_sockets.pop(self.channel_name, None)
+            self.live_quiz.slow_sockets_closed += 1
+
+        await super().close(TRY_AGAIN_LATER)
+
+    @classmethod
+    async def decode_json(cls, text_data):
+        return codec.loads(text_data)
+
+    @classmethod
+    async def encode_json(cls, content):
+        return codec.dumps(content)
+
     async def connect(self):
-        await self.accept()
+        subprotocol = self.select_subprotocol()
+        await self.accept(subprotocol)
+        self.binary = subprotocol == MSGPACK_SUBPROTOCOL
+
+        if drain.draining:
+            await self.reconnect_later(reconnect_delay())
+            return
+
+        drain.install()
+        drain.sockets.add(self)
 
         self.code = self.scope['url_route']['kwargs']['quiz_code']
         socket_user = self.scope['user']
@@ -54,15 +241,13 @@ class LiveQuizConsumer(AsyncJsonWebsocketConsumer):
         messages of things that went wrong when connecting. The dict contains important values
         that are required for setup and conveniently access during error checking.
 
-        The default is to verify that the quiz exists. If it does, live_quiz is set to it in the
-        returned dictionary.
+        The default is to verify that the quiz exists. If it does, live_quiz is set to its
+        in memory state in the returned dictionary.
 
         Connection should happen if no errors are found (an empty list is returned)
         '''
         try:
-            live_quiz = await database_sync_to_async(
-                lambda code: LiveQuizModel.objects.get(code=quiz_code)
-            )(quiz_code)
+            live_quiz = await engine.get_state(quiz_code)
 
         except LiveQuizModel.DoesNotExist:
             return {}, ['The specified live quiz does not exist.']
@@ -75,30 +260,50 @@ class LiveQuizConsumer(AsyncJsonWebsocketConsumer):
         default, attaches to the live quiz group. The values dictionary contains any
         useful values from setup (returned by 'find_connect_errors').
         '''
-        self.code = values['live_quiz'].code
-        self.group_name = values['live_quiz'].group_name
+        self.live_quiz = values['live_quiz']
+        self.code = self.live_quiz.code
+        self.group_name = self.live_quiz.group_name
 
         await self.channel_layer.group_add(
             self.group_name,
             self.channel_name
         )
 
-        await self.send_json(respond.get_info_message('Connected successfully.'))
-        await self.send_generic_message({'data': values['live_quiz'].last_view_command})
+        await self.send_frame(respond.CONNECTED_FRAME)
+        await self.catch_up(*self.last_seen())
+
+        self._heartbeat_task = asyncio.create_task(self.heartbeat())
 
-        @database_sync_to_async
-        def get_buzz_info(quiz):
-            event = quiz.buzz_event
-            name, socket = None, None
-            if event and event.player:
-                name, socket = event.player.name, event.player.socket_name
+    def last_seen(self) -> tuple[str | None, int | None]:
+        '''The epoch and seq of the last broadcast a reconnecting client saw, if it says.'''
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            return query['epoch'][0], int(query['seq'][0])
+        except (KeyError, ValueError):
+            return None, None
 
-            return event, name, socket
+    async def catch_up(self, epoch: str | None, seq: int | None):
+        '''
+        Sends the client the broadcasts it missed after seq of epoch, or a snapshot of
+        everything if they are no longer kept.
+        '''
+        frames = await self.live_quiz.frames_since(epoch, seq)
+        if frames is None:
+            await self.send_frame(await self.live_quiz.get_snapshot_frame(), numbered=True)
+            return
 
-        event, name, socket = await get_buzz_info(values['live_quiz'])
-        await self.send_generic_message({'data': respond.get_buzz_event_message(event, socket, name)})
+        for frame in frames:
+            await self.send_frame(frame, numbered=True)
 
     async def disconnect(self, code):
+        drain.sockets.discard(self)
+        self.outbox.close()
+        if self._writer is not None:
+            self._writer.cancel()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+        if self.live_quiz is not None:
+            self.live_quiz.lagging_sockets.pop(self.channel_name, None)
         if self.group_name is not None:
             await self.channel_layer.group_discard(
                 self.group_name,
@@ -108,6 +313,12 @@ class LiveQuizConsumer(AsyncJsonWebsocketConsumer):
         return await super().disconnect(code)
 
     async def receive_json(self, content, **kwargs):
+        msg_type = content.get('type') if isinstance(content, dict) else None
+        if not self.rate_limiter.allow(msg_type):
+            await self.throttle(self.rate_limiter.key(msg_type))
+            return
+        self._throttled.discard(self.rate_limiter.key(msg_type))
+
         try:
             await ClientMessage.handle(self, content, self._is_host)
         except Exception as error:
@@ -115,13 +326,37 @@ class LiveQuizConsumer(AsyncJsonWebsocketConsumer):
             LOG.exception(response)
             await self.send_generic_message({'data': respond.get_error_message([response])})
 
+    async def throttle(self, key):
+        '''
+        Drops a message that came too fast. Only the first of a run of dropped messages
+        is answered, so that flooding the server does not get a flood of errors back.
+        '''
+        if self.live_quiz is not None:
+            self.live_quiz.dropped_messages[key] += 1
+
+        if key not in self._throttled:
+            self._throttled.add(key)
+            await self.send_frame(get_throttled_frame(key))
+
     async def send_generic_message(self, event):
-        '''Send the view data to the client.'''
-        await self.send_json(event['data'])
+        '''
+        Send the view data to the client. A broadcast carries it already encoded as text,
+        which is forwarded as is.
+        '''
+        if 'text' in event:
+            await self.send_frame(respond.Frame(event['text'], event.get('bytes')),
+                                  event.get('seq') is not None)
+        else:
+            await self.send_json(event['data'])
+
+    async def reconnect_later(self, delay: float):
+        '''The worker is shutting down: tell the client when to come back and close.'''
+        await self.send_json(respond.get_reconnect_message(delay))
+        await self.close(code=SERVICE_RESTART)
 
     async def quiz_terminated(self, _: dict):
         '''Send the terminate message'''
-        await self.send_json(respond.get_terminate_message())
+        await self.send_frame(respond.TERMINATE_FRAME)
         await self.close()
 
 
@@ -133,6 +368,7 @@ class LiveQuizHostConsumer(LiveQuizConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._is_host = True
+        self.host_group_name = None
 
     async def find_connect_errors(self, user: User, quiz_code: str):
         '''In addition to parent method, checks for authentication and ownership.'''
@@ -144,11 +380,7 @@ class LiveQuizHostConsumer(LiveQuizConsumer):
         if errors:
             return values, errors
 
-        owner = await database_sync_to_async(
-            lambda livequiz: livequiz.host
-        )(values['live_quiz'])
-
-        if owner != user:
+        if values['live_quiz'].host_id != user.pk:
             errors.append('You are not the owner of the quiz.')
         else:
             values['user'] = user
@@ -156,38 +388,80 @@ class LiveQuizHostConsumer(LiveQuizConsumer):
         return values, errors
 
     async def disconnect(self, code):
+        if self.host_group_name is not None:
+            await self.channel_layer.group_discard(
+                self.host_group_name,
+                self.channel_name
+            )
+
         await super().disconnect(code)
 
         LOG.info('Host disconnecting from live quiz %s with code %s',
                  self.code,
                  code)
 
+        await engine.flush()
+
         return await super().disconnect(code)
 
     async def on_successful_connect(self, values: dict):
         await super().on_successful_connect(values)
+
+        quiz = values['live_quiz']
+        self.host_group_name = quiz.host_group_name
+        await self.channel_layer.group_add(
+            self.host_group_name,
+            self.channel_name
+        )
+        await self.send_generic_message({'data': quiz.get_roster_message()})
+        await self.send_generic_message({'data': quiz.get_presence_message()})
+        if quiz.answers is not None:
+            await self.send_generic_message({'data': quiz.get_answer_summary_message()})
+        if quiz.poll is not None:
+            await self.send_generic_message({'data': quiz.get_histogram_message()})
+
         LOG.debug('Host successfully connect to quiz %s', self.code)
 
 
 class LiveQuizParticipantConsumer(LiveQuizConsumer):
     '''Consumers for participants of quizzes.'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.player_id: int | None = None
+
+    async def disconnect(self, code):
+        if self.player_id is not None:
+            await self.live_quiz.submit(self.live_quiz.leave, self.player_id, self.channel_name)
+
+        return await super().disconnect(code)
+
+    async def on_idle(self, idle: bool):
+        if self.player_id is not None:
+            await self.live_quiz.submit(self.live_quiz.set_idle, self.channel_name, idle)
+
     async def on_successful_connect(self, values: dict):
         await super().on_successful_connect(values)
 
-        old_socket = self.scope['session'].get('socketname', None)
-        self.scope['session']['socketname'] = self.channel_name
+        # The number this session was given in each quiz it joined, by quiz code.
+        numbers = self.scope['session'].get('participants', {})
 
-        await sync_to_async(lambda session: session.save())(self.scope['session'])
+        quiz = values['live_quiz']
+        participant = await database_sync_to_async(
+            lambda code, number: LiveQuizParticipant.objects.register(
+                LiveQuizModel(code=code), number)
+        )(quiz.code, numbers.get(quiz.code))
 
-        @database_sync_to_async
-        def get_player_info(quiz, new_name, old_name):
-            player = LiveQuizParticipant.objects.register_socket(
-                quiz, new_name, old_name)
-            return player.name
+        self.scope['session']['participants'] = {**numbers, quiz.code: participant.number}
+        await sync_to_async(lambda session: session.save())(self.scope['session'])
 
-        name = await get_player_info(values['live_quiz'], self.channel_name, old_socket)
+        player = await quiz.submit(quiz.join, participant, self.channel_name)
+        self.player_id = player.id
 
-        LOG.info(
-            f'Player connected claiming socket {old_socket} to {self.channel_name}')
+        LOG.info(f'Player {player.id} of quiz {quiz.code} connected on {self.channel_name}')
 
-        await self.send_generic_message({'data': respond.get_player_update_message(self.channel_name, name)})
+        team = player.team.pk if player.team else None
+        await self.send_generic_message({
+            'data': respond.get_player_update_message(player.id, player.name, team)
+        })
+        await quiz.publish_scores()
@@ -0,0 +1,105 @@
+'''
+Graceful shutdown of a worker. On SIGTERM it stops taking new sockets, tells every open
+socket to reconnect after a random delay so they do not all come back at once, writes
+every pending change and only then lets the server exit.
+'''
+
+import asyncio
+import logging as LOG
+import os
+import signal
+from random import uniform
+
+from livequiz.engine import engine
+
+# Clients reconnect somewhere between this many seconds after being told to.
+RECONNECT_AFTER = (1.0, 10.0)
+
+# Seconds given to writing pending changes before the worker exits regardless.
+DRAIN_TIMEOUT = 8.0
+
+# Seconds given to sockets to write their reconnect hint and close before moving on.
+CLOSE_TIMEOUT = 2.0
+
+# Close code telling clients the server is restarting, from RFC 6455's registry.
+SERVICE_RESTART = 1012
+
+
+def reconnect_delay() -> float:
+    '''A random delay in seconds for one socket to wait before reconnecting.'''
+    return uniform(*RECONNECT_AFTER)
+
+
+class Drain:
+    '''
+    The sockets open in this worker, and whether it is shutting down. Installs its
+    SIGTERM handler from within the running event loop, on top of the server's own,
+    which it calls once draining is done.
+    '''
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.draining = False
+        self.sockets = set()
+        self._loop = None
+        self._previous = None
+
+    def install(self):
+        '''Handles SIGTERM from now on. Does nothing after the first call.'''
+        if self._loop is not None:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+            self._previous = signal.signal(signal.SIGTERM, self._on_sigterm)
+        except (RuntimeError, ValueError):
+            # Signals can only be handled on the main thread of a running server.
+            return
+
+        self._loop = loop
+
+    def _on_sigterm(self, signum, frame):
+        LOG.info('Received SIGTERM, draining live quiz sockets')
+        self._loop.call_soon_threadsafe(lambda: self._loop.create_task(self.drain()))
+
+    async def drain(self):
+        '''
+        Closes every socket with a reconnect hint, waiting for them to be written, then
+        writes everything the engine has pending before handing over to the previous
+        SIGTERM handler.
+        '''
+        if self.draining:
+            return
+        self.draining = True
+
+        sockets = list(self.sockets)
+        for socket in sockets:
+            await socket.reconnect_later(reconnect_delay())
+
+        if sockets:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(socket.written() for socket in sockets)), CLOSE_TIMEOUT)
+            except asyncio.TimeoutError:
+                LOG.warning('Gave up waiting for live quiz sockets to close')
+
+        try:
+            await asyncio.wait_for(self.engine.drain(), DRAIN_TIMEOUT)
+        except Exception:
+            LOG.exception('Failed to write live quiz changes before exiting')
+
+        self._exit()
+
+    def _exit(self):
+        previous = self._previous
+        if previous is None:
+            return
+
+        if callable(previous):
+            previous(signal.SIGTERM, None)
+        elif previous == signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+
+drain = Drain(engine)
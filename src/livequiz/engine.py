@@ -0,0 +1,1702 @@
+'''
+Keeps the authoritative state of every live quiz hosted by this worker in memory.
+
+Message handlers apply their changes to a LiveQuizState and broadcast the result
+straight away. The engine remembers which quizzes and players changed and writes
+them back to the database in batches shortly afterwards.
+'''
+
+import asyncio
+import logging as LOG
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from itertools import islice
+from secrets import token_urlsafe
+from time import monotonic
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+import livequiz.responses as respond
+from livequiz.answers import MAX_ANSWER_LENGTH, SUMMARY_INTERVAL, AnswerRound
+from livequiz.board import encode_bitmap, get_bitmap, get_positions, set_bits
+from livequiz.history import History
+from livequiz.latency import BUZZ_TOLERANCE
+from livequiz.polls import HISTOGRAM_INTERVAL, Poll
+from livequiz.leaderboard import Leaderboard
+from livequiz.outbox import Outbox
+from livequiz.presence import PRESENCE_INTERVAL, Presence
+from livequiz.roster import ROSTER_INTERVAL, Roster
+from livequiz.models import (
+    BuzzEvent, LiveQuizModel, LiveQuizParticipant, LiveQuizQuestion, LiveQuizResponse,
+    LiveQuizTeam, LiveQuizView, render_view
+)
+from livequiz.snapshots import SnapshotStore
+from livequiz.timers import Timer, timers
+
+FLUSH_INTERVAL = 0.5
+
+# Where quizzes are snapshotted to survive a restart of the worker. None turns it off.
+SNAPSHOT_DIR = getattr(settings, 'LIVEQUIZ_SNAPSHOT_DIR', None)
+
+# How many of the latest broadcasts are kept for replaying to clients that missed them.
+REPLAY_LENGTH = 256
+
+# Seconds broadcasts to a group are held back to go out together as one frame, without
+# those a later one made obsolete. 0 sends every broadcast straight away.
+COALESCE_WINDOW = getattr(settings, 'LIVEQUIZ_COALESCE_WINDOW', 0.03)
+
+
+@dataclass(eq=False)
+class Team:
+    '''In memory copy of a LiveQuizTeam, along with how many members it has.'''
+    pk: int
+    name: str
+    score: int = 0
+    members: int = 0
+
+    def as_list(self):
+        '''The team as sent to clients: id, name, score and members.'''
+        return [self.pk, self.name, self.score, self.members]
+
+
+@dataclass(eq=False)
+class Player:
+    '''In memory copy of a LiveQuizParticipant.'''
+    pk: int
+    id: int
+    name: str
+    score: int = 0
+    team: Team | None = None
+
+
+@dataclass(eq=False)
+class Buzz:
+    '''One buzz, timed in milliseconds from when its window opened.'''
+    player: Player
+    time: int
+
+    def as_dict(self):
+        '''The buzz as sent to clients.'''
+        buzz = {
+            'id': self.player.id,
+            'name': self.player.name,
+            'time': self.time
+        }
+        if self.player.team is not None:
+            buzz['team'] = self.player.team.name
+
+        return buzz
+
+
+class BuzzWindow:
+    '''
+    The buzzes of one open buzz window, ordered by when each player pressed the button.
+    Nobody answers until the window has settled, BUZZ_TOLERANCE after the first buzz
+    arrived, so that slower connections still get a fair chance. After that the first
+    buzz belongs to the player answering and everyone else waits behind them.
+    '''
+
+    def __init__(self, settled=False):
+        self.opened_at = monotonic()
+        self.settled = settled
+        self.queue: deque[Buzz] = deque()
+        self.buzzed = set()
+
+    @property
+    def current(self) -> Buzz | None:
+        '''The buzz of the player currently answering, if anyone is.'''
+        return self.queue[0] if self.settled and self.queue else None
+
+    def has_buzzed(self, key) -> bool:
+        '''
+        Each key only gets one buzz per window. The key is the player, or their team when
+        the whole team is locked by its first buzz.
+        '''
+        return key in self.buzzed
+
+    def add(self, player: Player, pressed_at: float, key=None) -> Buzz:
+        '''
+        Queues a player by when they pressed the button, locking key, or the player if
+        there is none. Buzzes mostly arrive in order, so the place is searched for from
+        the back. Once settled, nobody goes ahead of the current buzzer.
+        '''
+        buzz = Buzz(player, round(max(0, pressed_at - self.opened_at) * 1000))
+
+        index = len(self.queue)
+        first = 1 if self.settled else 0
+        while index > first and self.queue[index - 1].time > buzz.time:
+            index -= 1
+
+        self.queue.insert(index, buzz)
+        self.buzzed.add(player if key is None else key)
+        return buzz
+
+    def advance(self) -> Buzz | None:
+        '''Drops the current buzzer so the next in line answers. Returns the new current buzz.'''
+        if self.current is not None:
+            self.queue.popleft()
+
+        return self.current
+
+    def waiting(self) -> list[dict]:
+        '''Everyone queued behind the current buzzer, as sent to clients.'''
+        if not self.settled:
+            return []
+
+        return [buzz.as_dict() for buzz in list(self.queue)[1:]]
+
+
+# Messages that carry the whole of what they describe, making earlier ones of their type
+# obsolete.
+WHOLE_STATE_MESSAGES = {
+    respond.MessageTypes.SET_VIEW.value,
+    respond.MessageTypes.TEAM_STANDINGS.value,
+    respond.MessageTypes.ANSWER_ROUND.value,
+    respond.MessageTypes.POLL.value,
+}
+
+
+def spawn(tasks: set[asyncio.Task], coroutine) -> asyncio.Task:
+    '''
+    Runs coroutine as a task kept in tasks until it is done, since the event loop only
+    holds weak references to tasks. Whatever it raises is logged.
+    '''
+    task = asyncio.get_running_loop().create_task(coroutine)
+    tasks.add(task)
+    task.add_done_callback(_task_done(tasks))
+    return task
+
+
+def _task_done(tasks: set[asyncio.Task]):
+    def done(task: asyncio.Task):
+        tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            LOG.error('Live quiz task %s failed', task.get_name(), exc_info=task.exception())
+
+    return done
+
+
+def replaces_earlier(message: dict) -> bool:
+    '''Whether message makes every earlier message of its type obsolete.'''
+    if message['type'] == respond.MessageTypes.BUZZ.value:
+        payload = message['payload']
+        return 'queue' in payload or payload['status'] == 'none'
+
+    return message['type'] in WHOLE_STATE_MESSAGES
+
+
+def coalesce(messages: list[dict]) -> list[dict]:
+    '''
+    The messages without those made obsolete by a later one, in order. The last board
+    view is kept whenever a board patch follows it, since the patch applies to that board.
+    '''
+    latest = {}
+    board_view = patched = None
+    for index, message in enumerate(messages):
+        if replaces_earlier(message):
+            latest[message['type']] = index
+        if message['type'] == respond.MessageTypes.SET_VIEW.value:
+            if message['payload']['view'] == LiveQuizView.QUIZ_BOARD.value:
+                board_view = index
+        elif message['type'] == respond.MessageTypes.BOARD_PATCH.value:
+            patched = board_view
+
+    return [
+        message
+        for index, message in enumerate(messages)
+        if index >= latest.get(message['type'], index) or index == patched
+    ]
+
+
+class Transaction:
+    '''
+    The task applying a transaction, the messages it broadcast by group and the ranks it
+    sent by channel name, and the teams it created, which are deleted if it fails.
+    '''
+    __slots__ = ('task', 'messages', 'ranks', 'teams')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.messages: dict[str | None, list[dict]] = {}
+        self.ranks: list[tuple[str, dict]] = []
+        self.teams: list[int] = []
+
+
+class LiveQuizState:
+    '''
+    The in memory state of a single live quiz. Changes are queued with submit so
+    that commands for one quiz are applied one at a time, in the order received.
+    '''
+
+    def __init__(self, engine, quiz: LiveQuizModel, categories, players, teams,
+                 buzz_open, buzz_player_pk):
+        self.engine = engine
+        self.code = quiz.code
+        self.group_name = quiz.group_name
+        self.host_group_name = quiz.host_group_name
+        self.host_id = quiz.host_id
+        self.last_view_command = quiz.last_view_command
+        self.answered_questions = frozenset(quiz.answered_questions)
+        self.history = History()
+
+        self.categories = categories
+        self.questions = {
+            question.pk: question
+            for questions in categories.values()
+            for question in questions
+        }
+        self.board_positions = get_positions(categories)
+
+        # Players by their number within the quiz, and the channel names of those connected.
+        self.players = {player.id: player for player in players}
+        self.sockets: dict[int, str] = {}
+        self.roster = Roster()
+        self.roster_timer: Timer | None = None
+        self.presence = Presence()
+        self.published_presence = self.presence.counts()
+        self.presence_timer: Timer | None = None
+        self.team_mode = quiz.team_mode
+        self.teams = {team.pk: team for team in teams}
+        self.standings_changed = False
+        self.leaderboard = Leaderboard(players)
+        self.published_top = self._top_entries()
+        self.rank_changes = set()
+        self.buzz = BuzzWindow(settled=buzz_player_pk is not None) if buzz_open else None
+        self.stored_buzz_player_pk = buzz_player_pk
+        for player in players:
+            if buzz_open and player.pk == buzz_player_pk:
+                self.buzz.add(player, self.buzz.opened_at)
+
+        self.quiz_dirty = False
+        self.buzz_dirty = False
+        self.buzz_reopened = False
+        self.dirty_players = set()
+        self.dirty_teams = set()
+
+        self.answers: AnswerRound | None = None
+        self.new_responses = []
+        self.summary_timer: Timer | None = None
+
+        self.polls: dict[int, Poll] = {}
+        self.poll: Poll | None = None
+        self.histogram_timer: Timer | None = None
+
+        self.view_timer: Timer | None = None
+        self.buzz_timer: Timer | None = None
+
+        # Messages dropped for coming too fast, by the rate limit they ran into.
+        self.dropped_messages = Counter()
+
+        # Broadcasts waiting for the coalescing window to end, by group, and how many
+        # frames fewer than broadcasts were sent thanks to it.
+        self.outbox: dict[str | None, list[dict]] = {}
+        self.outbox_timer: Timer | None = None
+        self.frames_saved = 0
+
+        # The outboxes of sockets slow to take their frames, by channel name, and how many
+        # sockets were closed for staying behind.
+        self.lagging_sockets: dict[str, Outbox] = {}
+        self.slow_sockets_closed = 0
+
+        self._commands = deque()
+        self._drain_task = None
+        self._transaction: Transaction | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+        # Broadcasts to everyone so far, each numbered by the count when it was sent. The
+        # numbers only mean something within one epoch, which starts over when the state
+        # is loaded again.
+        self.epoch = token_urlsafe(6)
+        self.seq = 0
+        self.recent_frames: deque[respond.Frame] = deque(maxlen=REPLAY_LENGTH)
+        self._board_view = (None, None, None)
+        self._snapshot_frame = (None, None)
+
+    @staticmethod
+    def load(engine, code):
+        '''Synchronously read a live quiz and everything it references from the database.'''
+        quiz = LiveQuizModel.objects.select_related('buzz_event').get(code=code)
+        teams = {
+            pk: Team(pk, name, score)
+            for pk, name, score in quiz.teams.values_list('pk', 'name', 'score')
+        }
+        players = [
+            Player(pk, number, name, score, teams.get(team_id))
+            for pk, number, name, score, team_id in quiz.participants.values_list(
+                'pk', 'number', 'name', 'score', 'team_id')
+        ]
+        for player in players:
+            if player.team is not None:
+                player.team.members += 1
+        event = quiz.buzz_event
+
+        state = LiveQuizState(
+            engine,
+            quiz,
+            quiz.get_categories(),
+            players,
+            teams.values(),
+            buzz_open=event is not None,
+            buzz_player_pk=event.player_id if event else None
+        )
+
+        snapshot = engine.snapshots.get(code)
+        if snapshot is not None:
+            state.restore(snapshot)
+
+        return state
+
+    def snapshot(self) -> dict:
+        '''
+        What a restarted worker needs on top of the database to carry on: the view, the
+        answered questions, the buzz queue and the scores, names and teams of everyone.
+        '''
+        buzz = None
+        if self.buzz is not None:
+            buzz = [
+                self.buzz.settled,
+                [[item.player.pk, item.time] for item in self.buzz.queue]
+            ]
+
+        return {
+            'view': self.last_view_command,
+            'answered': sorted(self.answered_questions),
+            'team_mode': self.team_mode,
+            'teams': [[team.pk, team.score] for team in self.teams.values()],
+            'players': [
+                [player.pk, player.name, player.score, player.team.pk if player.team else None]
+                for player in self.players.values()
+            ],
+            'buzz': buzz
+        }
+
+    def restore(self, snapshot: dict):
+        '''
+        Puts back what a snapshot remembers on top of what was read from the database, and
+        marks all of it to be written back. Players and teams that are gone are skipped.
+        '''
+        self.last_view_command = snapshot['view']
+        self.answered_questions = frozenset(snapshot['answered'])
+        self.team_mode = snapshot['team_mode']
+
+        for pk, score in snapshot['teams']:
+            team = self.teams.get(pk)
+            if team is not None:
+                team.score = score
+                self.dirty_teams.add(team)
+
+        players = {player.pk: player for player in self.players.values()}
+        for pk, name, score, team_pk in snapshot['players']:
+            player = players.get(pk)
+            if player is not None:
+                player.name = name
+                player.score = score
+                player.team = self.teams.get(team_pk)
+                self.dirty_players.add(player)
+
+        for team in self.teams.values():
+            team.members = 0
+        for player in players.values():
+            if player.team is not None:
+                player.team.members += 1
+
+        self.leaderboard = Leaderboard(players.values())
+        self.published_top = self._top_entries()
+
+        self.buzz = None
+        if snapshot['buzz'] is not None:
+            settled, queue = snapshot['buzz']
+            self.buzz = BuzzWindow()
+            for pk, time in queue:
+                player = players.get(pk)
+                if player is not None:
+                    self.buzz.add(player, self.buzz.opened_at + time / 1000,
+                                  self._buzz_key(player))
+            # The settle timer of the window did not survive the restart, which took
+            # longer than it would have anyway.
+            self.buzz.settled = settled or bool(self.buzz.queue)
+
+        self.quiz_dirty = True
+        self.buzz_dirty = True
+
+    def submit(self, command, *args) -> asyncio.Future:
+        '''
+        Queues command(*args) to be applied to this quiz. The returned future resolves to
+        whatever the command returns once it has been applied. Within a transaction, its
+        commands are applied straight away.
+        '''
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        if self._transaction is not None and self._transaction.task is asyncio.current_task():
+            self._apply(command, args, future)
+            return future
+
+        self._commands.append((command, args, future))
+
+        task = self._drain_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._drain_task = loop.create_task(self._drain())
+
+        return future
+
+    @staticmethod
+    def _apply(command, args, future: asyncio.Future):
+        try:
+            future.set_result(command(*args))
+        except Exception as error:
+            future.set_exception(error)
+
+    async def _drain(self):
+        '''
+        The single writer: applies queued commands until none are left. A transaction
+        holds it up until the transaction is over.
+        '''
+        while self._commands:
+            command, args, future = self._commands.popleft()
+            if future.cancelled():
+                continue
+            if command is None:
+                future.set_result(None)
+                await args[0]
+                continue
+
+            self._apply(command, args, future)
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._transaction is not None
+
+    @asynccontextmanager
+    async def transaction(self):
+        '''
+        Applies every command submitted from within, by the same task, without any other
+        command in between. What they broadcast is held back and sent as one message per
+        group at the end. If the body raises, the commands are taken back as far as the
+        history allows, teams created within are deleted again and nothing is broadcast.
+        Either way, the history gets one entry.
+        '''
+        loop = asyncio.get_running_loop()
+        turn, finished = loop.create_future(), loop.create_future()
+        self._commands.append((None, (finished,), turn))
+        task = self._drain_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._drain_task = loop.create_task(self._drain())
+
+        try:
+            await turn
+        except BaseException:
+            turn.cancel()
+            finished.set_result(None)
+            raise
+
+        transaction = self._transaction = Transaction(asyncio.current_task())
+        checkpoint = (
+            self.team_mode, self.answers, self.poll, dict(self.polls), dict(self.teams))
+        pending = (self.summary_timer, self.histogram_timer)
+        self.history.begin()
+        try:
+            yield
+        except BaseException:
+            self.history.rollback(self._restore)
+            self.team_mode, self.answers, self.poll, self.polls, self.teams = checkpoint
+            self._rearm(*pending)
+            if transaction.teams:
+                try:
+                    await database_sync_to_async(delete_teams)(transaction.teams)
+                except Exception:
+                    LOG.exception(
+                        'Failed to delete teams %s of quiz %s', transaction.teams, self.code)
+            raise
+        else:
+            self.history.commit()
+        finally:
+            self._transaction = None
+            finished.set_result(None)
+            self.engine.schedule_flush(self)
+
+        for group_name, messages in transaction.messages.items():
+            await self.broadcast(self._combine(messages), group_name)
+        await self._send_ranks(transaction.ranks)
+
+    def _rearm(self, summary_timer: Timer | None, histogram_timer: Timer | None):
+        '''
+        Puts back the summary and histogram timers as they were before a transaction,
+        scheduling again those its commands cancelled.
+        '''
+        if self.summary_timer is not summary_timer:
+            self._cancel(self.summary_timer)
+            self.summary_timer = summary_timer
+        if summary_timer is not None and not summary_timer.active:
+            self.summary_timer = self._after(
+                SUMMARY_INTERVAL, self.take_answer_summary, group_name=self.host_group_name)
+
+        if self.histogram_timer is not histogram_timer:
+            self._cancel(self.histogram_timer)
+            self.histogram_timer = histogram_timer
+        if histogram_timer is not None and not histogram_timer.active:
+            self.histogram_timer = self._after(
+                HISTOGRAM_INTERVAL, self.take_histogram, group_name=self.host_group_name)
+
+    def _held(self) -> Transaction | None:
+        '''The transaction the current task is applying, if any.'''
+        transaction = self._transaction
+        if transaction is not None and transaction.task is asyncio.current_task():
+            return transaction
+        return None
+
+    def _after(self, delay: float, command, *args, group_name=None) -> Timer:
+        '''
+        Submits command(*args) after delay seconds and broadcasts what it returns, to
+        group_name if given.
+        '''
+        return timers.schedule(
+            delay,
+            lambda: spawn(
+                self._tasks,
+                self._submit_and_broadcast(command, *args, group_name=group_name))
+        )
+
+    async def _submit_and_broadcast(self, command, *args, group_name=None):
+        message = await self.submit(command, *args)
+        if message is not None:
+            await self.broadcast(message, group_name)
+
+    @staticmethod
+    def _cancel(timer: Timer | None):
+        if timer is not None:
+            timer.cancel()
+
+    def _quiz_changed(self):
+        self.quiz_dirty = True
+        self.engine.schedule_flush(self)
+        self.engine.schedule_snapshot(self)
+
+    def _buzz_changed(self):
+        self.buzz_dirty = True
+        self.engine.schedule_flush(self)
+        self.engine.schedule_snapshot(self)
+
+    def _player_changed(self, player: Player):
+        self.dirty_players.add(player)
+        self.engine.schedule_flush(self)
+
+    def _team_changed(self, team: Team):
+        self.dirty_teams.add(team)
+        self.standings_changed = True
+        self.engine.schedule_flush(self)
+
+    @property
+    def buzz_player(self) -> Player | None:
+        '''The player currently answering, if anyone is.'''
+        if self.buzz is None or self.buzz.current is None:
+            return None
+
+        return self.buzz.current.player
+
+    def get_buzz_message(self):
+        '''The buzz event message describing the whole buzz state, including the queue.'''
+        if self.buzz is None:
+            return respond.get_buzz_event_message(False)
+
+        return self._buzz_update(queue=self.buzz.waiting())
+
+    def _buzz_update(self, **changes):
+        '''A buzz event message for the open window carrying the given changes.'''
+        player = self.buzz_player
+        if player is None:
+            return respond.get_buzz_event_message(True, **changes)
+
+        if player.team is not None:
+            changes['team'] = player.team.name
+
+        return respond.get_buzz_event_message(True, player.id, player.name, **changes)
+
+    def set_view(self, view: LiveQuizView, question_id=None, seconds: float | None = None):
+        '''
+        Command: change what everyone is looking at. Returns the set view message. A
+        question shown with seconds reveals its answer by itself once they run out.
+        '''
+        question = None
+        if view in (LiveQuizView.QUESTION, LiveQuizView.ANSWER):
+            try:
+                question = self.questions[int(question_id)]
+            except (KeyError, TypeError, ValueError) as error:
+                raise LiveQuizQuestion.DoesNotExist(
+                    f'Question {question_id} is not part of quiz {self.code}') from error
+
+        self.history.record(('view', self.last_view_command))
+        return self._show(view, question, seconds)
+
+    def _show(self, view: LiveQuizView, question=None, seconds=None):
+        if view == LiveQuizView.QUIZ_BOARD:
+            self.last_view_command = self._board()
+        else:
+            self.last_view_command = render_view(
+                view, self.categories, self.answered_questions, question)
+        self._quiz_changed()
+
+        self._cancel(self.view_timer)
+        self.view_timer = None
+        if seconds and view == LiveQuizView.QUESTION:
+            self.view_timer = self._after(seconds, self.reveal_answer, question.pk)
+
+        return self.last_view_command
+
+    def reveal_answer(self, question_id: int):
+        '''
+        Command: the time for a question ran out, so show its answer. Returns the set view
+        message, or None if the host has moved on from the question in the meantime.
+        '''
+        payload = self.last_view_command.get('payload', {})
+        if payload.get('view') != LiveQuizView.QUESTION.value \
+                or payload.get('data', {}).get('id') != question_id:
+            return None
+
+        return self.set_view(LiveQuizView.ANSWER, question_id)
+
+    def _board(self):
+        '''
+        The set view message for the board. Questions answered since it was last built
+        are marked in a copy of its bitmap, rather than building it again.
+        '''
+        answered, bits, board = self._board_view
+        if answered is self.answered_questions:
+            return board
+
+        if answered is None or not answered <= self.answered_questions:
+            bits = get_bitmap(self._board_indices(self.answered_questions),
+                              len(self.board_positions))
+        else:
+            bits = bytearray(bits)
+            set_bits(bits, self._board_indices(self.answered_questions - answered))
+
+        if board is None:
+            board = render_view(
+                LiveQuizView.QUIZ_BOARD, self.categories, self.answered_questions)
+        data = dict(board['payload']['data'], answered=encode_bitmap(bits))
+        board = respond.get_current_quiz_view_message(LiveQuizView.QUIZ_BOARD.value, data)
+
+        self._board_view = (self.answered_questions, bits, board)
+        return board
+
+    def _board_indices(self, question_ids):
+        return (
+            self.board_positions[question_id]
+            for question_id in question_ids
+            if question_id in self.board_positions
+        )
+
+    def mark_answered(self, question_id: int):
+        '''
+        Command: hide a question from the board and return to it. Returns the board
+        patch for clients to apply to the board they have.
+        '''
+        self.history.record(
+            ('answered', self.answered_questions),
+            ('view', self.last_view_command)
+        )
+        self.answered_questions = self.answered_questions | {question_id}
+        self._show(LiveQuizView.QUIZ_BOARD)
+        return respond.get_board_patch_message([question_id])
+
+    def start_buzz(self, seconds: float | None = None):
+        '''
+        Command: open a fresh buzz, discarding the queue of the last one. With seconds,
+        the window closes by itself once they run out.
+        '''
+        self.history.record(('buzz', self.buzz))
+        self.buzz = BuzzWindow()
+        self.buzz_reopened = True
+        self._buzz_changed()
+
+        self._cancel(self.buzz_timer)
+        self.buzz_timer = self._after(seconds, self.close_buzz, self.buzz) if seconds else None
+
+        return self._buzz_update()
+
+    def end_buzz(self):
+        '''Command: stop whatever buzz was happening.'''
+        self.history.record(('buzz', self.buzz))
+        self._cancel(self.buzz_timer)
+        self.buzz_timer = None
+
+        self.buzz = None
+        self._buzz_changed()
+        return self.get_buzz_message()
+
+    def close_buzz(self, window: BuzzWindow):
+        '''
+        Command: the time for window ran out. Returns the buzz message, or None if the
+        window was already closed or replaced.
+        '''
+        if window is not self.buzz:
+            return None
+
+        return self.end_buzz()
+
+    @staticmethod
+    def _combine(messages: list[dict]) -> dict:
+        '''The messages, without the obsolete ones, as one message.'''
+        messages = coalesce(messages)
+        if len(messages) == 1:
+            return messages[0]
+
+        return respond.get_batch_message(messages)
+
+    async def broadcast(self, message, group_name=None):
+        '''
+        Sends a message to everyone in the quiz, or to group_name if given. Within a
+        transaction, it is held back until the transaction is over. Otherwise it waits out
+        the coalescing window with whatever else is broadcast to the group meanwhile.
+        '''
+        transaction = self._held()
+        if transaction is not None:
+            transaction.messages.setdefault(group_name, []).append(message)
+            return
+
+        if COALESCE_WINDOW <= 0:
+            await self._send(message, group_name)
+            return
+
+        self.outbox.setdefault(group_name, []).append(message)
+        if self.outbox_timer is None:
+            self.outbox_timer = timers.schedule(
+                COALESCE_WINDOW, lambda: spawn(self._tasks, self.send_outbox()))
+
+    async def send_outbox(self):
+        '''Sends what was broadcast during the coalescing window, one frame per group.'''
+        self._cancel(self.outbox_timer)
+        self.outbox_timer = None
+        outbox, self.outbox = self.outbox, {}
+
+        for group_name, messages in outbox.items():
+            self.frames_saved += len(messages) - 1
+            await self._send(self._combine(messages), group_name)
+
+    async def flush_outbox(self):
+        '''
+        Sends what is waiting in the coalescing window straight away, so that seq covers
+        every change already made to the state.
+        '''
+        if self.outbox:
+            await self.send_outbox()
+
+    async def _send(self, message, group_name=None):
+        '''
+        Encodes message once and sends it to the group. Messages to everyone are numbered,
+        for clients to notice a gap and ask for what they missed.
+        '''
+        numbered = group_name is None or group_name == self.group_name
+        if numbered:
+            self.seq += 1
+            message = respond.get_sequenced_message(message, self.seq)
+
+        frame = respond.encode(message)
+        if numbered:
+            self.recent_frames.append(frame)
+
+        await get_channel_layer().group_send(
+            group_name or self.group_name,
+            {
+                'type': 'send.generic.message',
+                'text': frame.text,
+                'bytes': frame.binary,
+                'seq': self.seq if numbered else None
+            }
+        )
+
+    async def frames_since(
+            self, epoch: str | None, seq: int | None) -> list[respond.Frame] | None:
+        '''
+        The broadcasts after seq of epoch, for a client that has seen up to it. None if
+        some of them are no longer kept, and a snapshot has to be sent instead. Whatever is
+        waiting in the coalescing window is sent first, so the replay ends where the state is.
+        '''
+        await self.flush_outbox()
+        if epoch != self.epoch or seq is None or not 0 <= seq <= self.seq:
+            return None
+
+        missed = self.seq - seq
+        if missed > len(self.recent_frames):
+            return None
+
+        return list(islice(self.recent_frames, len(self.recent_frames) - missed, None))
+
+    def get_snapshot_messages(self) -> list[dict]:
+        '''The messages that make up everything everyone should be seeing.'''
+        messages = [
+            self.last_view_command,
+            self.get_buzz_message(),
+            self.get_team_standings_message(),
+            self.get_leaderboard_message(),
+        ]
+        if self.answers is not None:
+            messages.append(self.get_answer_round_message())
+        if self.poll is not None:
+            messages.append(self.get_poll_message())
+
+        return messages
+
+    async def get_snapshot_frame(self) -> respond.Frame:
+        '''
+        The snapshot message, encoded once per broadcast. Whatever changes for everyone is
+        broadcast, so it is only as old as the seq it carries, once whatever is waiting in
+        the coalescing window has been sent.
+        '''
+        await self.flush_outbox()
+        seq, frame = self._snapshot_frame
+        if seq != self.seq:
+            seq = self.seq
+            frame = respond.encode(respond.get_snapshot_message(
+                self.epoch, seq, self.get_snapshot_messages()))
+            self._snapshot_frame = (seq, frame)
+
+        return frame
+
+    def _buzz_key(self, player: Player | None):
+        '''What a buzz locks: the player's team in team mode, or else the player.'''
+        if player is None or not self.team_mode:
+            return player
+
+        return player.team
+
+    def can_buzz(self, player_id: int):
+        '''
+        Whether player_id may buzz right now. Lets repeated buzzes be
+        turned away without queueing. In team mode, players without a team cannot buzz
+        and the first buzz of a team locks the rest of it.
+        '''
+        key = self._buzz_key(self.players.get(player_id))
+        return self.buzz is not None and key is not None and not self.buzz.has_buzzed(key)
+
+    def buzz_in(self, player_id: int, pressed_at: float | None = None):
+        '''
+        Command: a player buzzes. pressed_at is when they pressed the button by our
+        monotonic clock, if we know better than now. Returns the buzz update to broadcast,
+        or None if there is nothing to announce yet.
+
+        The first buzz of a window starts the settle timer. Buzzes arriving before the
+        window settles are only announced when it does.
+        '''
+        if not self.can_buzz(player_id):
+            return None
+
+        window = self.buzz
+        player = self.players[player_id]
+        buzz = window.add(
+            player,
+            monotonic() if pressed_at is None else pressed_at,
+            self._buzz_key(player)
+        )
+
+        if not window.settled:
+            if len(window.queue) == 1:
+                self._after(BUZZ_TOLERANCE, self.settle_buzz, window)
+            return None
+
+        self.engine.schedule_snapshot(self)
+        return self._buzz_update(queued=buzz.as_dict())
+
+    def settle_buzz(self, window: BuzzWindow):
+        '''
+        Command: the first buzzer of window is final. Returns the full buzz message, or None
+        if the window was closed or replaced in the meantime.
+        '''
+        if window is not self.buzz or window.settled:
+            return None
+
+        window.settled = True
+        self._buzz_changed()
+        return self.get_buzz_message()
+
+    def advance_buzz(self):
+        '''
+        Command: the current buzzer is done, so the next one in line gets to answer. The
+        window stays open. Returns the buzz update to broadcast.
+        '''
+        if self.buzz is None or self.buzz.current is None:
+            return self.get_buzz_message()
+
+        self.history.record(('buzz advanced', self.buzz.current))
+        self.buzz.advance()
+        self._buzz_changed()
+        return self._buzz_update(advanced=True)
+
+    def join(self, participant: LiveQuizParticipant, channel_name: str):
+        '''
+        Command: track a participant that was just registered, connected on channel_name.
+        A player coming back keeps the state that has not been written back yet. Either way
+        they are told their rank when the leaderboard is next published.
+        '''
+        player = self.players.get(participant.number)
+
+        if player is None or player.pk != participant.pk:
+            player = Player(
+                participant.pk,
+                participant.number,
+                participant.name,
+                participant.score
+            )
+            index = self.leaderboard.add(player)
+            self.rank_changes.update(self.leaderboard.at(index, len(self.leaderboard)))
+
+        self.players[player.id] = player
+        self.sockets[player.id] = channel_name
+        self.rank_changes.add(player)
+        self.roster.add(player.id, player.name)
+        self._roster_changed()
+        self.presence.add(channel_name)
+        self._presence_changed()
+        return player
+
+    def leave(self, player_id: int, channel_name: str):
+        '''
+        Command: forget the channel of a player that disconnected, unless they have a
+        newer one, and take them off the roster. The socket no longer counts as present.
+        '''
+        if self.sockets.get(player_id) == channel_name:
+            del self.sockets[player_id]
+            self.roster.remove(player_id)
+            self._roster_changed()
+        self.presence.discard(channel_name)
+        self._presence_changed()
+
+    def set_idle(self, channel_name: str, idle: bool):
+        '''Command: the player on channel_name missed their last heartbeat, or spoke again.'''
+        self.presence.set_idle(channel_name, idle)
+        self._presence_changed()
+
+    def rename(self, player_id: int, new_name: str):
+        '''Command: change the name of a player. Returns the player update message.'''
+        player = self.players[player_id]
+        player.name = new_name
+        self._player_changed(player)
+        if player_id in self.sockets:
+            self.roster.add(player_id, new_name)
+            self._roster_changed()
+        return respond.get_player_update_message(
+            player_id, new_name, player.team.pk if player.team else None)
+
+    def score_buzzer(self, points: int | None = None, deduct=False):
+        '''
+        Command: award points to the player currently answering, or take them away. Without
+        points, the question on screen is worth its value. Returns the player, or None if
+        nobody is answering.
+        '''
+        player = self.buzz_player
+        if player is None:
+            return None
+
+        if points is None:
+            points = self.shown_question().value
+        if deduct:
+            points = -points
+        if not points:
+            return player
+
+        self.history.record(('score', (player, player.score)))
+        self._change_score(player, points)
+        return player
+
+    def _change_score(self, player: Player, points: int):
+        old_index, new_index = self.leaderboard.change_score(player, points)
+        self.rank_changes.update(
+            self.leaderboard.at(min(old_index, new_index), max(old_index, new_index) + 1))
+        self._player_changed(player)
+        self.engine.schedule_snapshot(self)
+
+        if player.team is not None:
+            player.team.score += points
+            self._team_changed(player.team)
+
+    def _restore(self, field: str, value):
+        '''Puts back one field from the history. Returns what is needed to change it back.'''
+        match field:
+            case 'view':
+                current = self.last_view_command
+                self._cancel(self.view_timer)
+                self.view_timer = None
+                self.last_view_command = value
+                self._quiz_changed()
+            case 'answered':
+                current = self.answered_questions
+                self.answered_questions = value
+                self._quiz_changed()
+            case 'buzz':
+                current = self.buzz
+                self._cancel(self.buzz_timer)
+                self.buzz_timer = None
+                if value is not None and value.queue:
+                    value.settled = True
+                self.buzz = value
+                self.buzz_reopened = True
+                self._buzz_changed()
+            case 'buzz advanced':
+                current = value
+                field = 'buzz retreated'
+                self.buzz.queue.appendleft(value)
+                self._buzz_changed()
+            case 'buzz retreated':
+                current = value
+                field = 'buzz advanced'
+                self.buzz.advance()
+                self._buzz_changed()
+            case 'score':
+                player, score = value
+                current = (player, player.score)
+                self._change_score(player, score - player.score)
+
+        return field, current
+
+    def undo(self):
+        '''
+        Command: takes back the latest host command. Returns the messages for what it
+        changed, leaving scores to be published.
+        '''
+        return self._history_messages(self.history.undo(self._restore))
+
+    def redo(self):
+        '''Command: applies the latest undone host command again, like undo.'''
+        return self._history_messages(self.history.redo(self._restore))
+
+    def _history_messages(self, fields: set[str]):
+        messages = []
+        if fields & {'view', 'answered'}:
+            messages.append(self.last_view_command)
+        if fields & {'buzz', 'buzz advanced', 'buzz retreated'}:
+            messages.append(self.get_buzz_message())
+
+        return messages
+
+    def shown_question(self) -> LiveQuizQuestion:
+        '''The question or answer on screen. Raises LiveQuizQuestion.DoesNotExist otherwise.'''
+        data = self.last_view_command['payload']['data']
+        try:
+            return self.questions[data['id']]
+        except (KeyError, TypeError) as error:
+            raise LiveQuizQuestion.DoesNotExist(
+                f'No question of quiz {self.code} is being shown') from error
+
+    def _top_entries(self) -> list[dict]:
+        return [
+            {
+                'rank': rank,
+                'id': player.id,
+                'name': player.name,
+                'score': player.score
+            }
+            for rank, player in enumerate(self.leaderboard.top(), start=1)
+        ]
+
+    def get_leaderboard_message(self):
+        '''The whole top of the leaderboard, as it was last published.'''
+        return respond.get_leaderboard_message(self.published_top, len(self.published_top))
+
+    def get_rank_message(self, player: Player):
+        '''Where player is on the leaderboard.'''
+        return respond.get_rank_message(self.leaderboard.rank(player), player.score)
+
+    def take_leaderboard_changes(self):
+        '''
+        Command: compares the top of the leaderboard with what was last published. Returns
+        the leaderboard message with only the entries that changed, or None if none did,
+        along with a rank message for every player whose rank changed since.
+        '''
+        top = self._top_entries()
+        changed = [
+            entry for index, entry in enumerate(top)
+            if index >= len(self.published_top) or self.published_top[index] != entry
+        ]
+
+        message = None
+        if changed or len(top) != len(self.published_top):
+            message = respond.get_leaderboard_message(changed, len(top))
+        self.published_top = top
+
+        ranks = [
+            (self.sockets[player.id], self.get_rank_message(player))
+            for player in self.rank_changes
+            if self.players.get(player.id) is player and player.id in self.sockets
+        ]
+        self.rank_changes = set()
+
+        return message, ranks
+
+    def _roster_changed(self):
+        if self.roster_timer is None:
+            self.roster_timer = self._after(
+                ROSTER_INTERVAL, self.take_roster_changes, group_name=self.host_group_name)
+
+    def get_roster_message(self):
+        '''Everyone connected right now, for a host that just connected.'''
+        return respond.get_roster_message(self.roster.entries())
+
+    def take_roster_changes(self):
+        '''Command: the roster changes that were scheduled for the hosts are due.'''
+        self.roster_timer = None
+        changes = self.roster.take()
+        if changes is None:
+            return None
+
+        return respond.get_roster_update_message(**changes)
+
+    def _presence_changed(self):
+        if self.presence_timer is None:
+            self.presence_timer = self._after(
+                PRESENCE_INTERVAL, self.take_presence_changes, group_name=self.host_group_name)
+
+    def get_presence_message(self):
+        '''How many players are connected and idle right now.'''
+        return respond.get_presence_message(**self.presence.counts())
+
+    def take_presence_changes(self):
+        '''
+        Command: the counts scheduled for the hosts are due. Returns None if they are back
+        to what was last sent.
+        '''
+        self.presence_timer = None
+        counts = self.presence.counts()
+        if counts == self.published_presence:
+            return None
+
+        self.published_presence = counts
+        return respond.get_presence_message(**counts)
+
+    def get_team_standings_message(self):
+        '''Whether team mode is on, and every team from highest score to lowest.'''
+        teams = sorted(self.teams.values(), key=lambda team: (-team.score, team.pk))
+        return respond.get_team_standings_message(
+            self.team_mode,
+            [team.as_list() for team in teams]
+        )
+
+    def take_team_standings(self):
+        '''Command: the team standings message if they changed since last taken, else None.'''
+        if not self.standings_changed:
+            return None
+
+        self.standings_changed = False
+        return self.get_team_standings_message()
+
+    def add_team(self, team: LiveQuizTeam):
+        '''
+        Command: track a team that was just created. Returns the team standings message.
+        Within a transaction, the team is deleted again if the transaction fails.
+        '''
+        self.teams[team.pk] = Team(team.pk, team.name, team.score)
+        if self._transaction is not None:
+            self._transaction.teams.append(team.pk)
+        return self.get_team_standings_message()
+
+    def set_team_mode(self, enabled: bool):
+        '''Command: turn team mode on or off. Returns the team standings message.'''
+        self.team_mode = enabled
+        self._quiz_changed()
+        return self.get_team_standings_message()
+
+    def join_team(self, player_id: int, team_id: int):
+        '''
+        Command: move a player into a team, taking their points along. Returns the player
+        update message. Raises LiveQuizTeam.DoesNotExist for teams of other quizzes.
+        '''
+        team = self.teams.get(team_id)
+        if team is None:
+            raise LiveQuizTeam.DoesNotExist(f'Team {team_id} is not part of quiz {self.code}')
+
+        player = self.players[player_id]
+        if player.team is not team:
+            if player.team is not None:
+                player.team.score -= player.score
+                player.team.members -= 1
+                self._team_changed(player.team)
+
+            player.team = team
+            team.score += player.score
+            team.members += 1
+            self._team_changed(team)
+            self._player_changed(player)
+
+        return respond.get_player_update_message(player_id, player.name, team.pk)
+
+    def start_answers(self):
+        '''
+        Command: start taking typed answers to the question on screen, forgetting those of
+        the last round. Returns the answer round message.
+        '''
+        question = self.shown_question()
+
+        self._cancel(self.summary_timer)
+        self.summary_timer = None
+        self.answers = AnswerRound(question.pk)
+
+        return respond.get_answer_round_message('open', question.pk)
+
+    def end_answers(self):
+        '''
+        Command: stop taking answers. Returns the answer round message for everyone and
+        the final summary for the hosts, which is None if no round was open.
+        '''
+        self._cancel(self.summary_timer)
+        self.summary_timer = None
+
+        answers, self.answers = self.answers, None
+        if answers is None:
+            return respond.get_answer_round_message('closed'), None
+
+        return (
+            respond.get_answer_round_message('closed', answers.question_id),
+            self._answer_summary(answers)
+        )
+
+    def submit_answer(self, player_id: int, text: str) -> int | None:
+        '''
+        Command: a player answers the open round. The answer is grouped straight away and
+        written with the next flush, and a summary for the hosts is scheduled if there is
+        not one on the way already. Returns the id of the question answered, or None if
+        the answer was not accepted.
+        '''
+        player = self.players.get(player_id)
+        if self.answers is None or player is None or self.answers.has_answered(player):
+            return None
+
+        text = text[:MAX_ANSWER_LENGTH]
+        self.answers.add(player, text)
+        self.new_responses.append(LiveQuizResponse(
+            participant_id=player.pk,
+            question_id=self.answers.question_id,
+            text=text
+        ))
+        self.engine.schedule_flush(self)
+
+        if self.summary_timer is None:
+            self.summary_timer = self._after(
+                SUMMARY_INTERVAL, self.take_answer_summary, group_name=self.host_group_name)
+
+        return self.answers.question_id
+
+    @staticmethod
+    def _answer_summary(answers: AnswerRound):
+        return respond.get_answer_summary_message(
+            answers.question_id,
+            answers.total,
+            len(answers.groups),
+            answers.summary()
+        )
+
+    def get_answer_summary_message(self):
+        '''The summary of the open round for the hosts, or None if there is none.'''
+        if self.answers is None:
+            return None
+
+        return self._answer_summary(self.answers)
+
+    def get_answer_round_message(self):
+        '''Whether answers are being taken right now.'''
+        if self.answers is None:
+            return respond.get_answer_round_message('closed')
+
+        return respond.get_answer_round_message('open', self.answers.question_id)
+
+    def take_answer_summary(self):
+        '''Command: the summary that was scheduled for the hosts is due.'''
+        self.summary_timer = None
+        return self.get_answer_summary_message()
+
+    def start_poll(self):
+        '''
+        Command: open a poll on the question on screen, picking up its earlier votes if it
+        was polled before. Returns the poll message. Raises ValueError if the question has
+        no choices.
+        '''
+        question = self.shown_question()
+        if not question.choices:
+            raise ValueError(f'Question {question.pk} has no choices to poll')
+
+        self._cancel(self.histogram_timer)
+        self.histogram_timer = None
+
+        self.poll = self.polls.get(question.pk)
+        if self.poll is None:
+            self.poll = self.polls[question.pk] = Poll(question.pk, question.choices)
+
+        return self.get_poll_message()
+
+    def end_poll(self):
+        '''
+        Command: stop taking votes. Returns the poll message for everyone and the final
+        histogram for the hosts, which is None if no poll was open.
+        '''
+        self._cancel(self.histogram_timer)
+        self.histogram_timer = None
+
+        poll, self.poll = self.poll, None
+        if poll is None:
+            return respond.get_poll_message('closed'), None
+
+        return respond.get_poll_message('closed', poll.question_id), self._histogram(poll)
+
+    def vote(self, player_id: int, choice: int) -> int | None:
+        '''
+        Command: a player picks a choice of the open poll, replacing any earlier pick. A
+        histogram for the hosts is scheduled if there is not one on the way already.
+        Returns the id of the question voted on, or None if the vote was not counted.
+        '''
+        player = self.players.get(player_id)
+        if self.poll is None or player is None:
+            return None
+
+        if self.poll.vote(player, choice) and self.histogram_timer is None:
+            self.histogram_timer = self._after(
+                HISTOGRAM_INTERVAL, self.take_histogram, group_name=self.host_group_name)
+
+        return self.poll.question_id
+
+    @staticmethod
+    def _histogram(poll: Poll):
+        return respond.get_poll_histogram_message(
+            poll.question_id,
+            poll.counts.tolist(),
+            poll.percentages(),
+            poll.total
+        )
+
+    def get_poll_message(self):
+        '''Whether a poll is open, and its choices if it is.'''
+        if self.poll is None:
+            return respond.get_poll_message('closed')
+
+        return respond.get_poll_message('open', self.poll.question_id, self.poll.choices)
+
+    def get_histogram_message(self):
+        '''The histogram of the open poll for the hosts, or None if there is none.'''
+        if self.poll is None:
+            return None
+
+        return self._histogram(self.poll)
+
+    def take_histogram(self):
+        '''Command: the histogram that was scheduled for the hosts is due.'''
+        self.histogram_timer = None
+        return self.get_histogram_message()
+
+    async def publish_scores(self):
+        '''
+        Sends what changed on the leaderboard and the team standings to everyone, and new
+        ranks to their players. Within a transaction, the ranks are held back like
+        broadcasts.
+        '''
+        message, ranks = await self.submit(self.take_leaderboard_changes)
+        standings = await self.submit(self.take_team_standings)
+
+        for changed in (message, standings):
+            if changed is not None:
+                await self.broadcast(changed)
+
+        transaction = self._held()
+        if transaction is not None:
+            transaction.ranks.extend(ranks)
+        else:
+            await self._send_ranks(ranks)
+
+    @staticmethod
+    async def _send_ranks(ranks):
+        channel_layer = get_channel_layer()
+        for channel_name, rank in ranks:
+            await channel_layer.send(
+                channel_name,
+                {
+                    'type': 'send.generic.message',
+                    'data': rank
+                }
+            )
+
+    def take_changes(self):
+        '''Collects the pending changes for the database and marks them as written.'''
+        changes = {'code': self.code}
+
+        if self.quiz_dirty:
+            quiz = LiveQuizModel(code=self.code)
+            quiz.last_view_command = self.last_view_command
+            quiz.answered_questions = sorted(self.answered_questions)
+            quiz.team_mode = self.team_mode
+            changes['quiz'] = quiz
+
+        if self.buzz_dirty:
+            player_pk = self.buzz_player.pk if self.buzz_player else None
+            changes['buzz'] = (
+                self.buzz is not None,
+                player_pk,
+                self.buzz_reopened,
+                self.stored_buzz_player_pk
+            )
+            self.stored_buzz_player_pk = player_pk
+
+        changes['players'] = [
+            LiveQuizParticipant(
+                pk=player.pk,
+                name=player.name,
+                score=player.score,
+                team_id=player.team.pk if player.team else None
+            )
+            for player in self.dirty_players
+        ]
+        changes['teams'] = [
+            LiveQuizTeam(pk=team.pk, score=team.score)
+            for team in self.dirty_teams
+        ]
+        changes['responses'] = self.new_responses
+
+        self.quiz_dirty = False
+        self.buzz_dirty = False
+        self.buzz_reopened = False
+        self.dirty_players = set()
+        self.dirty_teams = set()
+        self.new_responses = []
+
+        return changes
+
+    def restore_changes(self, changes: dict):
+        '''Marks the changes from take_changes as pending again after their write failed.'''
+        if 'quiz' in changes:
+            self.quiz_dirty = True
+
+        if 'buzz' in changes:
+            _, player_pk, reopened, stored_pk = changes['buzz']
+            self.buzz_dirty = True
+            self.buzz_reopened = self.buzz_reopened or reopened
+            if self.stored_buzz_player_pk == player_pk:
+                self.stored_buzz_player_pk = stored_pk
+
+        players = {player.pk: player for player in self.players.values()}
+        self.dirty_players.update(
+            players[player.pk] for player in changes['players'] if player.pk in players)
+        self.dirty_teams.update(
+            self.teams[team.pk] for team in changes['teams'] if team.pk in self.teams)
+        self.new_responses = changes['responses'] + self.new_responses
+
+
+@transaction.atomic
+def write_changes(batch: list[dict]):
+    '''Synchronously write a batch of changes from LiveQuizState.take_changes.'''
+    quizzes = [changes['quiz'] for changes in batch if 'quiz' in changes]
+    if quizzes:
+        LiveQuizModel.objects.bulk_update(
+            quizzes, ['last_view_command_raw', 'answered_questions_raw', 'team_mode'])
+
+    players = [player for changes in batch for player in changes['players']]
+    if players:
+        LiveQuizParticipant.objects.bulk_update(players, ['name', 'score', 'team'])
+
+    teams = [team for changes in batch for team in changes['teams']]
+    if teams:
+        LiveQuizTeam.objects.bulk_update(teams, ['score'])
+
+    responses = [response for changes in batch for response in changes['responses']]
+    if responses:
+        LiveQuizResponse.objects.bulk_create(responses)
+
+    for changes in batch:
+        if 'buzz' in changes:
+            write_buzz(changes['code'], *changes['buzz'])
+
+
+def delete_teams(team_pks: list[int]):
+    '''Synchronously delete teams created by a transaction that failed.'''
+    LiveQuizTeam.objects.filter(pk__in=team_pks).delete()
+
+
+def write_buzz(code, is_open, player_pk, reopened, stored_pk):
+    '''
+    Synchronously write the buzz state of one quiz. When the window is still the one in
+    the database, the current buzzer is recorded with a conditional UPDATE that expects
+    the buzzer this worker stored last (the first time, WHERE player IS NULL). A buzzer
+    stored by anyone else is never replaced.
+    '''
+    events = BuzzEvent.objects.filter(livequizmodel__code=code)
+
+    if is_open and not reopened:
+        if events.filter(player_id=stored_pk).update(player_id=player_pk):
+            return
+        if events.exists():
+            LOG.warning('Buzz for quiz %s was changed elsewhere, keeping the stored buzzer', code)
+            return
+
+    events.delete()
+
+    if is_open:
+        event = BuzzEvent.objects.create(player_id=player_pk)
+        if not LiveQuizModel.objects.filter(code=code).update(buzz_event=event):
+            event.delete()
+
+
+class LiveQuizEngine:
+    '''
+    Finds, caches and periodically saves the LiveQuizState of every quiz in this worker.
+    With a snapshot_dir, quizzes are also snapshotted there as they change, and picked up
+    from there again after a restart.
+    '''
+
+    def __init__(self, snapshot_dir=None):
+        self._states: dict[str, LiveQuizState] = {}
+        self._dirty: dict[str, LiveQuizState] = {}
+        self._flush_handle = None
+        self._flush_loop = None
+
+        self.snapshots = SnapshotStore(snapshot_dir)
+        self._unsaved: dict[str, LiveQuizState] = {}
+        self._snapshot_handle = None
+        self._snapshot_loop = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def get_state(self, code: str) -> LiveQuizState:
+        '''
+        Returns the state of the quiz, reading it from the database the first time. Raises
+        LiveQuizModel.DoesNotExist if there is no such quiz.
+        '''
+        state = self._states.get(code)
+        if state is None:
+            try:
+                self.snapshots.open()
+            except (OSError, ValueError):
+                self.snapshots.compacting = False
+                LOG.exception('Failed to read live quiz snapshots, loading from the database')
+            loaded = await database_sync_to_async(LiveQuizState.load)(self, code)
+            state = self._states.setdefault(code, loaded)
+            if state is loaded and code in self.snapshots.lines:
+                self.schedule_flush(state)
+
+        return state
+
+    def get_loaded_state(self, code: str) -> LiveQuizState | None:
+        '''The state of the quiz if this worker has it in memory, without loading it.'''
+        return self._states.get(code)
+
+    def forget(self, code: str):
+        '''
+        Drops a quiz along with any of its changes that have not been written yet, and its
+        snapshot.
+        '''
+        state = self._states.pop(code, None)
+        if state is not None:
+            state._cancel(state.outbox_timer)
+        self._dirty.pop(code, None)
+        self._unsaved.pop(code, None)
+        if code in self.snapshots.lines:
+            self.snapshots.save({code: None})
+
+    def schedule_flush(self, state: LiveQuizState):
+        '''Remembers that state changed and makes sure a flush happens soon.'''
+        if self._states.get(state.code) is not state:
+            return
+
+        self._dirty[state.code] = state
+
+        loop = asyncio.get_running_loop()
+        if self._flush_handle is None or self._flush_loop is not loop:
+            self._flush_loop = loop
+            self._flush_handle = loop.call_later(
+                FLUSH_INTERVAL,
+                lambda: spawn(self._tasks, self.flush())
+            )
+
+    def schedule_snapshot(self, state: LiveQuizState):
+        '''
+        Remembers that state changed in a way that should survive a restart. Everything
+        that changes before the event loop comes round again is saved in one write.
+        '''
+        if not self.snapshots.enabled or self._states.get(state.code) is not state:
+            return
+
+        self._unsaved[state.code] = state
+
+        loop = asyncio.get_running_loop()
+        if self._snapshot_handle is None or self._snapshot_loop is not loop:
+            self._snapshot_loop = loop
+            self._snapshot_handle = loop.call_soon(self.save_snapshots)
+
+    def save_snapshots(self):
+        '''Appends a snapshot of every quiz that changed to the journal, compacting it if due.'''
+        if self._snapshot_handle is not None:
+            self._snapshot_handle.cancel()
+            self._snapshot_handle = None
+
+        unsaved, self._unsaved = self._unsaved, {}
+        try:
+            due = self.snapshots.save(
+                {code: state.snapshot() for code, state in unsaved.items()})
+        except OSError:
+            LOG.exception('Failed to snapshot live quizzes %s', list(unsaved))
+            return
+
+        if due:
+            spawn(self._tasks, self.compact_snapshots())
+
+    async def compact_snapshots(self):
+        '''Rewrites the snapshot file from the journal without blocking the event loop.'''
+        try:
+            lines = self.snapshots.rotate()
+            await asyncio.to_thread(self.snapshots.write_snapshot, lines)
+        except OSError:
+            self.snapshots.compacting = False
+            LOG.exception('Failed to compact live quiz snapshots')
+
+    async def drain(self):
+        '''
+        Writes every pending change and compacts the snapshots, waiting until both are on
+        disk, so that the worker can exit.
+        '''
+        await self.flush()
+        if not self.snapshots.enabled:
+            return
+
+        self.save_snapshots()
+        while self.snapshots.compacting:
+            await asyncio.sleep(FLUSH_INTERVAL / 10)
+        await self.compact_snapshots()
+
+    async def flush(self):
+        '''
+        Writes every pending change to the database in one transaction, after snapshotting
+        the quizzes they belong to.
+        '''
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        dirty, self._dirty = self._dirty, {}
+        for code, state in list(dirty.items()):
+            # The rest of its changes are yet to come, and belong in the same write.
+            if state.in_transaction:
+                self._dirty[code] = dirty.pop(code)
+        if not dirty:
+            return
+
+        if self.snapshots.enabled:
+            self._unsaved.update(dirty)
+            self.save_snapshots()
+
+        batch = [state.take_changes() for state in dirty.values()]
+
+        try:
+            await database_sync_to_async(write_changes)(batch)
+        except Exception:
+            LOG.exception('Failed to write live quiz changes for %s, will retry', list(dirty))
+            for state, changes in zip(dirty.values(), batch):
+                state.restore_changes(changes)
+                self.schedule_flush(state)
+
+
+engine = LiveQuizEngine(SNAPSHOT_DIR)
+
+
+@receiver(post_delete, sender=LiveQuizModel)
+def on_delete_forget_state(**kwargs):
+    '''A deleted quiz should not be resurrected by a pending write.'''
+    engine.forget(kwargs['instance'].code)
@@ -0,0 +1,72 @@
+'''
+Undo and redo for host commands. An entry only holds the fields a command changed, along
+with the values they had before. Those values are never mutated afterwards, so entries
+share them with the live state and with each other instead of copying the whole quiz.
+'''
+
+from collections import deque
+
+# Host commands that can be undone, per quiz. Older ones are forgotten.
+MAX_HISTORY = 100
+
+
+class History:
+    '''
+    Undo and redo stacks of entries, each a tuple of (field, previous value) pairs. What
+    a field means is up to whoever restores it.
+    '''
+
+    def __init__(self):
+        self.undo_stack = deque(maxlen=MAX_HISTORY)
+        self.redo_stack = []
+        self._group = None
+
+    def record(self, *changes):
+        '''Remembers the previous values of the fields a new command is about to change.'''
+        if self._group is not None:
+            self._group.extend(changes)
+            return
+
+        self.undo_stack.append(changes)
+        self.redo_stack.clear()
+
+    def begin(self):
+        '''Collects what is recorded from here on into one entry, until commit or rollback.'''
+        self._group = []
+
+    def commit(self):
+        '''Records everything collected since begin as a single entry.'''
+        group, self._group = self._group, None
+        if group:
+            self.record(*group)
+
+    def rollback(self, restore) -> set[str]:
+        '''Puts back every field collected since begin, leaving no entry behind.'''
+        group, self._group = self._group, None
+        self._apply(group, restore)
+        return {field for field, _ in group}
+
+    @staticmethod
+    def _apply(changes, restore):
+        return tuple(restore(field, value) for field, value in reversed(changes))
+
+    def undo(self, restore) -> set[str]:
+        '''
+        Puts back the fields of the latest entry with restore(field, value), which returns
+        the (field, value) pair needed to redo it. Returns the fields that changed.
+        '''
+        if not self.undo_stack:
+            return set()
+
+        changes = self.undo_stack.pop()
+        self.redo_stack.append(self._apply(changes, restore))
+        return {field for field, _ in changes}
+
+    def redo(self, restore) -> set[str]:
+        '''Applies the latest undone entry again, like undo. Returns the fields that changed.'''
+        if not self.redo_stack:
+            return set()
+
+        changes = self.redo_stack.pop()
+        self.undo_stack.append(self._apply(changes, restore))
+        return {field for field, _ in changes}
@@ -0,0 +1,92 @@
+'''
+Measures how far away each socket is, so that buzzes can be ordered by when the player
+pressed the button instead of when the buzz reached the server.
+'''
+
+from time import monotonic
+
+# Seconds between pings of one socket while a quiz is small.
+PING_INTERVAL = 5.0
+
+# Pings a single quiz may send per second. Large quizzes ping each socket less often.
+MAX_PINGS_PER_SECOND = 50
+
+# Seconds to wait before the first ping of a new socket.
+FIRST_PING_DELAY = 1.0
+
+# Pings that have not been answered yet, per socket. Older ones are forgotten.
+MAX_OUTSTANDING_PINGS = 4
+
+# No buzz is moved earlier than this many seconds, and the first buzzer of a window is
+# only announced once this long has passed since the first buzz arrived.
+BUZZ_TOLERANCE = 0.15
+
+# Weight of a new sample in the smoothed estimates, as in TCP's SRTT.
+SMOOTHING = 1 / 8
+
+
+def ping_interval(sockets: int) -> float:
+    '''Seconds between pings of each socket in a quiz with this many sockets.'''
+    return max(PING_INTERVAL, sockets / MAX_PINGS_PER_SECOND)
+
+
+class RoundTripEstimator:
+    '''
+    Keeps a smoothed round trip time for one socket, along with the offset between the
+    client's clock and ours. Everything is in seconds of the server's monotonic clock.
+    '''
+
+    def __init__(self):
+        self.round_trip = None
+        self.clock_offset = None
+        self._next_id = 0
+        self._outstanding: dict[int, float] = {}
+
+    def ping(self) -> int:
+        '''Records that a ping is about to be sent and returns its id.'''
+        ping_id = self._next_id
+        self._next_id += 1
+
+        self._outstanding[ping_id] = monotonic()
+        if len(self._outstanding) > MAX_OUTSTANDING_PINGS:
+            del self._outstanding[min(self._outstanding)]
+
+        return ping_id
+
+    def pong(self, ping_id: int, client_time: float | None = None):
+        '''
+        Takes a sample from the answer to ping ping_id. client_time is the client's clock
+        when it answered, which lets us translate its timestamps into ours.
+        '''
+        sent = self._outstanding.pop(ping_id, None)
+        if sent is None:
+            return
+
+        sample = monotonic() - sent
+        self.round_trip = self._smooth(self.round_trip, sample)
+
+        if client_time is not None:
+            offset = client_time - (sent + sample / 2)
+            self.clock_offset = self._smooth(self.clock_offset, offset)
+
+    @staticmethod
+    def _smooth(estimate, sample):
+        if estimate is None:
+            return sample
+
+        return estimate + SMOOTHING * (sample - estimate)
+
+    def pressed_at(self, arrival: float, client_time: float | None = None) -> float:
+        '''
+        Estimates when a message that arrived at arrival was sent, from the client's own
+        timestamp when we know its clock and from half the round trip otherwise. The
+        estimate is never later than arrival nor earlier than BUZZ_TOLERANCE before it.
+        '''
+        if client_time is not None and self.clock_offset is not None:
+            estimate = client_time - self.clock_offset
+        elif self.round_trip is not None:
+            estimate = arrival - self.round_trip / 2
+        else:
+            estimate = arrival
+
+        return min(arrival, max(arrival - BUZZ_TOLERANCE, estimate))
@@ -0,0 +1,71 @@
+'''
+Keeps the players of a live quiz ordered by score, so that ranks and the top of the
+leaderboard never need a full sort.
+'''
+
+from bisect import bisect_left, insort
+
+# How many players everyone sees on the leaderboard.
+LEADERBOARD_SIZE = 10
+
+
+class Leaderboard:
+    '''
+    Players sorted by descending score, ties going to whoever joined first. The order is
+    a sorted list of (-score, pk) keys, so finding a rank is a binary search and a score
+    change moves one key.
+    '''
+
+    def __init__(self, players=()):
+        self._players = {}
+        self._keys = []
+        for player in players:
+            self._players[player.pk] = player
+            self._keys.append(self._key(player))
+        self._keys.sort()
+
+    @staticmethod
+    def _key(player):
+        return (-player.score, player.pk)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, player):
+        return player.pk in self._players
+
+    def add(self, player) -> int:
+        '''Adds a player, or replaces the one with the same pk. Returns their index.'''
+        known = self._players.get(player.pk)
+        if known is not None:
+            self._keys.pop(self.index(known))
+
+        self._players[player.pk] = player
+        insort(self._keys, self._key(player))
+        return self.index(player)
+
+    def index(self, player) -> int:
+        '''Where the player is on the leaderboard, counting from 0.'''
+        return bisect_left(self._keys, self._key(player))
+
+    def rank(self, player) -> int:
+        '''Where the player is on the leaderboard, counting from 1.'''
+        return self.index(player) + 1
+
+    def change_score(self, player, points: int) -> tuple[int, int]:
+        '''Adds points to the score of player. Returns their old and new index.'''
+        old_index = self.index(player)
+        self._keys.pop(old_index)
+
+        player.score += points
+
+        insort(self._keys, self._key(player))
+        return old_index, self.index(player)
+
+    def at(self, start: int, stop: int) -> list:
+        '''The players from index start up to, but not including, stop.'''
+        return [self._players[pk] for _, pk in self._keys[start:stop]]
+
+    def top(self, count: int = LEADERBOARD_SIZE) -> list:
+        '''The count highest scoring players, best first.'''
+        return self.at(0, count)
@@ -4,13 +4,24 @@ Handles messages from the client to the server.
 
 from abc import ABCMeta, abstractmethod
 from enum import Flag, auto
+from time import monotonic
 from typing import Type
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
-from livequiz.models import BuzzEvent, LiveQuizParticipant, LiveQuizView, LiveQuizModel
 import livequiz.responses as respond
+from livequiz.engine import engine
+from livequiz.models import LiveQuizTeam, LiveQuizView
+
+# Longest a host may set a question or buzz timer for.
+MAX_TIMER_SECONDS = 60 * 60
+
+# The type of the envelope that carries several host commands in one message.
+BATCH_TYPE = 'batch'
+
+# Most commands in one batch.
+MAX_BATCH_SIZE = 16
 
 
 class UnexpectedMessageException(Exception):
@@ -47,6 +58,24 @@ class MalformedMessageException(Exception):
     '''Thrown when a message cannot be parsed for the given type.'''
 
 
+def get_seconds(data: dict) -> float | None:
+    '''Reads the optional timer length in seconds from a message payload.'''
+    seconds = data.get('seconds')
+    if seconds is None:
+        return None
+
+    try:
+        seconds = float(seconds)
+    except (TypeError, ValueError) as error:
+        raise MalformedMessageException('Expected seconds to be a number.') from error
+
+    if not 0 <= seconds <= MAX_TIMER_SECONDS:
+        raise MalformedMessageException(
+            f'Expected seconds to be between 0 and {MAX_TIMER_SECONDS}.')
+
+    return seconds or None
+
+
 class ClientMessage(metaclass=ABCMeta):
     '''
     A generic handler for client messages. Subclass for functionality.
@@ -89,9 +118,8 @@ class ClientMessage(metaclass=ABCMeta):
         return klass
 
     @staticmethod
-    async def handle(socket: AsyncJsonWebsocketConsumer, message: dict, is_host=False) -> None:
-        '''
-        Passes the given message information to an appropriate handler.'''
+    def parse(message: dict, is_host=False) -> 'ClientMessage':
+        '''A handler for the message, ready to handle it.'''
         try:
             msg_type = message['type']
             data = message['payload']
@@ -102,9 +130,46 @@ class ClientMessage(metaclass=ABCMeta):
             is_host,
             msg_type=msg_type)
 
-        handler = klass(data)
+        return klass(data)
+
+    @staticmethod
+    async def handle(socket: AsyncJsonWebsocketConsumer, message: dict, is_host=False) -> None:
+        '''
+        Passes the given message information to an appropriate handler. A batch of host
+        commands is handled as one transaction: every command is checked before any is
+        applied, and if one fails, all of them are taken back.
+        '''
+        if isinstance(message, dict) and message.get('type') == BATCH_TYPE:
+            await ClientMessage.handle_batch(socket, message.get('payload'), is_host)
+            return
+
+        handler = ClientMessage.parse(message, is_host)
         await handler.handle_message(socket)
 
+    @staticmethod
+    async def handle_batch(socket, messages: list, is_host=False) -> None:
+        '''Applies the messages in order and broadcasts what they changed all at once.'''
+        if not is_host:
+            raise AuthorizationException(
+                socket_auth=AuthorizationOptions.PLAYER,
+                message_auth=AuthorizationOptions.HOST
+            )
+        if not isinstance(messages, list) or not 0 < len(messages) <= MAX_BATCH_SIZE:
+            raise MalformedMessageException(
+                f'Expected a batch to be a list of 1 to {MAX_BATCH_SIZE} messages.')
+
+        handlers = []
+        for message in messages:
+            handler = ClientMessage.parse(message, is_host)
+            if isinstance(handler, HistoryMessage):
+                raise MalformedMessageException('Undo and redo cannot be part of a batch.')
+            handlers.append(handler)
+
+        quiz = await engine.get_state(socket.code)
+        async with quiz.transaction():
+            for handler in handlers:
+                await handler.handle_message(socket)
+
     @abstractmethod
     async def handle_message(self, socket) -> None:
         '''Attempts to handle the request from the client.'''
@@ -114,7 +179,10 @@ class SetViewMessage(
         ClientMessage,
         message_key='set view',
         authorization=AuthorizationOptions.HOST):
-    '''Command to set the view of the quiz.'''
+    '''
+    Command to set the view of the quiz. A question may come with seconds, after which
+    its answer is revealed automatically.
+    '''
 
     def __init__(self, data):
         try:
@@ -124,24 +192,192 @@ class SetViewMessage(
             raise MalformedMessageException(
                 'Expected view and question_id in message.') from error
 
+        self.seconds = get_seconds(data)
+
     async def handle_message(self, socket) -> None:
-        new_view_string = await database_sync_to_async(
-            lambda code, view, q_id: LiveQuizModel.objects.get(code=code).set_view(
-                LiveQuizView(view), q_id
-            ))(socket.quiz_code, self.view_name, self.question_id)
+        quiz = await engine.get_state(socket.code)
+        message = await quiz.submit(
+            quiz.set_view, LiveQuizView(self.view_name), self.question_id, self.seconds)
 
-        event = {
-            'type': 'send_generic_message',
-            'data': new_view_string
-        }
-        await socket.channel_layer.group_send(socket.group_name, event)
+        await quiz.broadcast(message)
 
 
 class ManageBuzzMessage(
         ClientMessage,
         message_key='manage buzz',
         authorization=AuthorizationOptions.HOST):
-    '''When a buzz starts or stops.'''
+    '''
+    When a buzz starts or stops, or moves on to the next player in line. Starting may
+    come with seconds, after which the buzz ends automatically.
+    '''
+
+    def __init__(self, data):
+        try:
+            self.action = data['action']
+            if not self.action in ['start', 'end', 'next']:
+                raise KeyError('Action must be either "start", "end" or "next"')
+        except Exception as error:
+            raise MalformedMessageException(
+                'Problem getting manage buzz action.'
+            ) from error
+
+        self.seconds = get_seconds(data)
+
+    async def handle_message(self, socket) -> None:
+        quiz = await engine.get_state(socket.code)
+
+        match self.action:
+            case 'start':
+                message = await quiz.submit(quiz.start_buzz, self.seconds)
+            case 'end':
+                message = await quiz.submit(quiz.end_buzz)
+            case 'next':
+                message = await quiz.submit(quiz.advance_buzz)
+
+        await quiz.broadcast(message)
+
+
+class BuzzInMessage(
+        ClientMessage,
+        message_key='buzz in',
+        authorization=AuthorizationOptions.PLAYER):
+    '''A player tries to buzz in! The payload may hold the client's clock as time.'''
+
+    def __init__(self, data) -> None:
+        self.arrival = monotonic()
+        try:
+            self.client_time = float(data['time']) if 'time' in data else None
+        except Exception as error:
+            raise MalformedMessageException(
+                'Expected the buzz time to be a number.') from error
+
+    async def handle_message(self, socket) -> None:
+        quiz = await engine.get_state(socket.code)
+        if not quiz.can_buzz(socket.player_id):
+            return
+
+        pressed_at = socket.latency.pressed_at(self.arrival, self.client_time)
+        message = await quiz.submit(quiz.buzz_in, socket.player_id, pressed_at)
+
+        if message is not None:
+            await quiz.broadcast(message)
+
+
+class ScoreBuzzerMessage(
+        ClientMessage,
+        message_key='score buzzer',
+        authorization=AuthorizationOptions.HOST):
+    '''
+    Awards points to the player answering, or deducts them. Without points, the question
+    on screen is worth its value.
+    '''
+
+    def __init__(self, data):
+        try:
+            self.action = data['action']
+            if not self.action in ['award', 'deduct']:
+                raise KeyError('Action must be either "award" or "deduct"')
+            self.points = int(data['points']) if data.get('points') is not None else None
+            if self.points is not None and self.points < 0:
+                raise ValueError('Points must not be negative')
+        except Exception as error:
+            raise MalformedMessageException(
+                'Expected an award or deduct action and optional points.') from error
+
+    async def handle_message(self, socket) -> None:
+        quiz = await engine.get_state(socket.code)
+        player = await quiz.submit(quiz.score_buzzer, self.points, self.action == 'deduct')
+
+        if player is not None:
+            await quiz.publish_scores()
+
+
+class ManageTeamsMessage(
+        ClientMessage,
+        message_key='manage teams',
+        authorization=AuthorizationOptions.HOST):
+    '''Creates a team with a name, or turns team mode on or off with enabled.'''
+
+    def __init__(self, data):
+        try:
+            self.action = data['action']
+            match self.action:
+                case 'create':
+                    self.name = str(data['name'])[:128]
+                case 'mode':
+                    self.enabled = bool(data['enabled'])
+                case _:
+                    raise KeyError('Action must be either "create" or "mode"')
+        except Exception as error:
+            raise MalformedMessageException(
+                'Expected a create action with a name or a mode action with enabled.'
+            ) from error
+
+    async def handle_message(self, socket) -> None:
+        quiz = await engine.get_state(socket.code)
+
+        match self.action:
+            case 'create':
+                team = await database_sync_to_async(LiveQuizTeam.objects.create)(
+                    name=self.name, quiz_id=socket.code)
+                message = await quiz.submit(quiz.add_team, team)
+            case 'mode':
+                message = await quiz.submit(quiz.set_team_mode, self.enabled)
+
+        await quiz.broadcast(message)
+
+
+class JoinTeamMessage(
+        ClientMessage,
+        message_key='join team',
+        authorization=AuthorizationOptions.PLAYER):
+    '''A player picks their team, bringing their points along.'''
+
+    def __init__(self, data):
+        try:
+            self.team_id = int(data['team'])
+        except Exception as error:
+            raise MalformedMessageException(
+                'Expected the id of a team.') from error
+
+    async def handle_message(self, socket) -> None:
+        quiz = await engine.get_state(socket.code)
+        message = await quiz.submit(quiz.join_team, socket.player_id, self.team_id)
+
+        await socket.send_json(message)
+        await quiz.publish_scores()
+
+
+class HistoryMessage(
+        ClientMessage,
+        message_key='history',
+        authorization=AuthorizationOptions.HOST):
+    '''Undoes the latest host command, or redoes the latest undone one.'''
+
+    def __init__(self, data):
+        try:
+            self.action = data['action']
+            if not self.action in ['undo', 'redo']:
+                raise KeyError('Action must be either "undo" or "redo"')
+        except Exception as error:
+            raise MalformedMessageException(
+                'Problem getting history action.'
+            ) from error
+
+    async def handle_message(self, socket) -> None:
+        quiz = await engine.get_state(socket.code)
+        command = quiz.undo if self.action == 'undo' else quiz.redo
+
+        for message in await quiz.submit(command):
+            await quiz.broadcast(message)
+        await quiz.publish_scores()
+
+
+class ManageAnswersMessage(
+        ClientMessage,
+        message_key='manage answers',
+        authorization=AuthorizationOptions.HOST):
+    '''Starts or ends an open response round for the question on screen.'''
 
     def __init__(self, data):
         try:
@@ -150,94 +386,133 @@ class ManageBuzzMessage(
                 raise KeyError('Action must be either "start" or "end"')
         except Exception as error:
             raise MalformedMessageException(
-                'Problem getting manage buzz action.'
+                'Problem getting manage answers action.'
             ) from error
 
     async def handle_message(self, socket) -> None:
+        quiz = await engine.get_state(socket.code)
+
+        summary = None
         match self.action:
             case 'start':
-                await self.start_buzz_event(socket)
+                message = await quiz.submit(quiz.start_answers)
             case 'end':
-                await self.end_buzz_event(socket)
+                message, summary = await quiz.submit(quiz.end_answers)
 
-    async def start_buzz_event(self, socket):
-        '''Start a new buzz and delete the old.'''
-        def refresh_buzz_event(quiz_code):
-            quiz = LiveQuizModel.objects.get(code=quiz_code)
+        await quiz.broadcast(message)
+        if summary is not None:
+            await quiz.broadcast(summary, quiz.host_group_name)
 
-            if quiz.buzz_event:
-                quiz.buzz_event.delete()
 
-            quiz.buzz_event = BuzzEvent.objects.create()
-            quiz.save()
+class SubmitAnswerMessage(
+        ClientMessage,
+        message_key='submit answer',
+        authorization=AuthorizationOptions.PLAYER):
+    '''A typed answer for the open response round.'''
 
-        await database_sync_to_async(refresh_buzz_event)(socket.quiz_code)
+    def __init__(self, data):
+        try:
+            self.text = str(data['text'])
+        except Exception as error:
+            raise MalformedMessageException(
+                'Expected the text of an answer.') from error
 
-        await socket.channel_layer.group_send(
-            socket.group_name,
-            {
-                'type': 'send.generic.message',
-                'data': respond.get_buzz_event_message(True)
-            }
-        )
+    async def handle_message(self, socket) -> None:
+        quiz = await engine.get_state(socket.code)
 
-    async def end_buzz_event(self, socket):
-        '''End whatever buzzing was happening.'''
-        def delete_buzz_event(quiz_code):
-            quiz = LiveQuizModel.objects.get(code=quiz_code)
+        question_id = await quiz.submit(quiz.submit_answer, socket.player_id, self.text)
+        if question_id is not None:
+            await socket.send_json(respond.get_answer_round_message('submitted', question_id))
 
-            if quiz.buzz_event:
-                quiz.buzz_event.delete()
-            quiz.buzz_event = None
-            quiz.save()
 
-        await database_sync_to_async(delete_buzz_event)(socket.quiz_code)
+class ManagePollMessage(
+        ClientMessage,
+        message_key='manage poll',
+        authorization=AuthorizationOptions.HOST):
+    '''Opens or closes a poll on the choices of the question on screen.'''
 
-        await socket.channel_layer.group_send(
-            socket.group_name,
-            {
-                'type': 'send.generic.message',
-                'data': respond.get_buzz_event_message(False)
-            }
-        )
+    def __init__(self, data):
+        try:
+            self.action = data['action']
+            if not self.action in ['start', 'end']:
+                raise KeyError('Action must be either "start" or "end"')
+        except Exception as error:
+            raise MalformedMessageException(
+                'Problem getting manage poll action.'
+            ) from error
 
+    async def handle_message(self, socket) -> None:
+        quiz = await engine.get_state(socket.code)
 
-class BuzzInMessage(
+        histogram = None
+        match self.action:
+            case 'start':
+                message = await quiz.submit(quiz.start_poll)
+            case 'end':
+                message, histogram = await quiz.submit(quiz.end_poll)
+
+        await quiz.broadcast(message)
+        if histogram is not None:
+            await quiz.broadcast(histogram, quiz.host_group_name)
+
+
+class VoteMessage(
         ClientMessage,
-        message_key='buzz in',
+        message_key='vote',
         authorization=AuthorizationOptions.PLAYER):
-    '''A player tries to buzz in!'''
+    '''A player picks one of the choices of the open poll, by index.'''
 
-    def __init__(self, data) -> None:
-        pass
+    def __init__(self, data):
+        try:
+            self.choice = int(data['choice'])
+        except Exception as error:
+            raise MalformedMessageException(
+                'Expected the index of a choice.') from error
 
     async def handle_message(self, socket) -> None:
-        @database_sync_to_async
-        def attempt_buzz_update(quiz_code, socket_name):
-            quiz = LiveQuizModel.objects.get(code=quiz_code)
-            if not quiz.buzz_event or quiz.buzz_event.player:
-                return False, None
-
-            player = LiveQuizParticipant.objects.get(socket_name=socket_name)
-            quiz.buzz_event.player = player
-            quiz.buzz_event.save()
-
-            return True, player.name
-
-        buzzed_in, name = await attempt_buzz_update(socket.quiz_code, socket.channel_name)
-
-        if buzzed_in:
-            await socket.channel_layer.group_send(
-                socket.group_name,
-                {
-                    'type': 'send.generic.message',
-                    'data': respond.get_buzz_event_message(
-                        True,
-                        socket.channel_name,
-                        name
-                    )
-                }
-            )
+        quiz = await engine.get_state(socket.code)
+
+        question_id = await quiz.submit(quiz.vote, socket.player_id, self.choice)
+        if question_id is not None:
+            await socket.send_json(
+                respond.get_poll_message('voted', question_id, choice=self.choice))
+
+
+class ResyncMessage(
+        ClientMessage,
+        message_key='resync'):
+    '''
+    The client missed a broadcast. It gets those after the epoch and seq it last saw
+    again, or a snapshot of everything.
+    '''
+
+    def __init__(self, data):
+        try:
+            self.epoch = data.get('epoch')
+            self.seq = int(data['seq']) if data.get('seq') is not None else None
+        except Exception as error:
+            raise MalformedMessageException(
+                'Expected the seq of the last broadcast seen.') from error
+
+    async def handle_message(self, socket) -> None:
+        await socket.catch_up(self.epoch, self.seq)
+
+
+class PongMessage(
+        ClientMessage,
+        message_key='pong'):
+    '''The answer to a ping. The payload may hold the client's clock as time.'''
+
+    def __init__(self, data):
+        try:
+            self.ping_id = int(data['id'])
+            self.client_time = float(data['time']) if 'time' in data else None
+        except Exception as error:
+            raise MalformedMessageException(
+                'Expected the id of the ping being answered.') from error
+
+    async def handle_message(self, socket) -> None:
+        socket.latency.pong(self.ping_id, self.client_time)
 
 
 class UpdatePlayerName(
@@ -249,19 +524,19 @@ class UpdatePlayerName(
     def __init__(self, data):
         try:
             self.new_name = data['name']
+            if not isinstance(self.new_name, str):
+                raise TypeError('Name must be a string')
+            self.new_name = self.new_name[:128]
         except Exception as error:
             raise MalformedMessageException(
                 'Expected a name to be provided.') from error
 
     async def handle_message(self, socket) -> None:
-        @database_sync_to_async
-        def update_name(socket_name, new_name):
-            LiveQuizParticipant.objects.filter(
-                socket_name=socket_name).update(name=new_name)
+        quiz = await engine.get_state(socket.code)
+        message = await quiz.submit(quiz.rename, socket.player_id, self.new_name)
 
-        await update_name(socket.channel_name, self.new_name)
-
-        await socket.send_json(respond.get_player_update_message(socket.channel_name, self.new_name))
+        await socket.send_json(message)
+        await quiz.publish_scores()
 
 
 class MarkQuestionAnswered(
@@ -277,18 +552,7 @@ class MarkQuestionAnswered(
                 'Expected a question id in message.') from error
 
     async def handle_message(self, socket) -> None:
-        @database_sync_to_async
-        def mark_question_done(quiz_code, question_id):
-            quiz = LiveQuizModel.objects.get(code=quiz_code)
-            quiz.answered_questions += [question_id]
-            return quiz.set_view(LiveQuizView.QUIZ_BOARD)
-
-        message = await mark_question_done(socket.quiz_code, self.question_id)
-
-        await socket.channel_layer.group_send(
-            socket.group_name,
-            {
-                'type': 'send.generic.message',
-                'data': message
-            }
-        )
+        quiz = await engine.get_state(socket.code)
+        message = await quiz.submit(quiz.mark_answered, self.question_id)
+
+        await quiz.broadcast(message)
@@ -1,16 +1,17 @@
 from dataclasses import dataclass
 from enum import Enum
-from json import dumps, loads
 from string import ascii_uppercase, digits
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.contrib.auth.models import User
 from django.utils.crypto import get_random_string
-from django.db import models, DatabaseError
+from django.db import models, transaction, DatabaseError, IntegrityError
 from django.db.models.signals import pre_delete
 from django.dispatch import receiver
 
+from livequiz import codec
+from livequiz.board import render_board
 from livequiz.responses import get_current_quiz_view_message
 
 SLUG_SIZE = 8
@@ -24,40 +25,46 @@ class QuizData:
     '''
     A representation of data for a live quiz. Each category has
     a name that maps to a tuple of questions. Each question provides
-    a point value, a question string, and an answer string.
+    a point value, a question string, and an answer string, optionally
+    followed by a tuple of choices for polls.
     '''
     name: str
-    categories: dict[str, tuple[tuple[int, str, str]]]
+    categories: dict[str, tuple[tuple]]
 
 
 class ParticipantManager(models.Manager):
     '''Fancy participant manipulations.'''
 
-    def register_socket(self, quiz, new_socket_name, old_socket_name):
+    def register(self, quiz, number=None):
         '''
-        Called when a participant is added to the game. If they want to reconnect
-        to an already existing participant, the old_socket_name must point to an
-        already existing participant. Otherwise, the participant is created.
+        Called when a participant is added to the game. Someone coming back with the number
+        they were given before gets their old participant, if it still exists. Otherwise
+        the participant is created with the next number of the quiz.
         '''
-        obj, _ = LiveQuizParticipant.objects.update_or_create(
-            socket_name=old_socket_name,
-            defaults={
-                'socket_name': new_socket_name,
-                'quiz': quiz
-            }
-        )
+        if number is not None:
+            participant = self.filter(quiz=quiz, number=number).first()
+            if participant is not None:
+                return participant
 
-        return obj
+        for _ in range(UNIQUE_RETRIES):
+            last = self.filter(quiz=quiz).aggregate(last=models.Max('number'))['last']
+            try:
+                with transaction.atomic():
+                    return self.create(quiz=quiz, number=(last or 0) + 1)
+            except IntegrityError:
+                continue
+
+        raise DatabaseError(
+            f'Failed to number a participant of {quiz.code} within {UNIQUE_RETRIES} tries.'
+        )
 
 
 class LiveQuizParticipant(models.Model):
     '''Someone playing the game!'''
     objects = ParticipantManager()
 
-    socket_name = models.CharField(
-        max_length=256,
-        unique=True
-    )
+    # Identifies the participant within its quiz, to clients and to the engine.
+    number = models.PositiveIntegerField()
 
     name = models.CharField(
         max_length=128,
@@ -74,6 +81,19 @@ class LiveQuizParticipant(models.Model):
         related_name='participants'
     )
 
+    team = models.ForeignKey(
+        to='LiveQuizTeam',
+        on_delete=models.SET_NULL,
+        default=None,
+        null=True,
+        related_name='members'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'number'], name='unique_participant_number')
+        ]
+
 
 class BuzzEvent(models.Model):
     '''Someone is supposed to be buzzing in!'''
@@ -93,10 +113,10 @@ def json_property(field_name):
     '''Creates a property the encodes and decodes the field_name string object into a dict using JSON'''
 
     def get_property(self):
-        return loads(getattr(self, field_name))
+        return codec.loads(getattr(self, field_name))
 
     def set_property(self, value):
-        setattr(self, field_name, dumps(value, separators=(',', ':')))
+        setattr(self, field_name, codec.dumps(value))
 
     return property(fget=get_property, fset=set_property)
 
@@ -130,11 +150,12 @@ class LiveQuizManager(models.Manager):
                 for category_name in quiz_data.categories:
                     category = quiz.categories.create(name=category_name)
 
-                    for value, question, answer in quiz_data.categories[category_name]:
+                    for value, question, answer, *choices in quiz_data.categories[category_name]:
                         category.questions.create(
                             value=value,
                             question=question,
-                            answer=answer
+                            answer=answer,
+                            choices=list(choices[0]) if choices else []
                         )
                 quiz.set_view(LiveQuizView.QUIZ_BOARD)
                 quiz.save()
@@ -181,22 +202,19 @@ class LiveQuizModel(models.Model):
         auto_now_add=True
     )
 
-    last_view_command_raw = models.CharField(
-        max_length=512,
+    last_view_command_raw = models.TextField(
         null=True
     )
 
     last_view_command = json_property('last_view_command_raw')
 
-    answered_questions_raw = models.CharField(
-        max_length=512,
+    answered_questions_raw = models.TextField(
         default='[]'
     )
 
     answered_questions = json_property('answered_questions_raw')
 
-    player_data_raw = models.CharField(
-        max_length=2048,
+    player_data_raw = models.TextField(
         default='{}'
     )
 
@@ -208,56 +226,75 @@ class LiveQuizModel(models.Model):
         null=True
     )
 
+    team_mode = models.BooleanField(
+        default=False
+    )
+
     @property
     def group_name(self):
         '''Returns the unique channels group_name for this quiz.'''
         return f'livequiz_group_{self.code}'
 
+    @property
+    def host_group_name(self):
+        '''Returns the channels group_name for only the hosts of this quiz.'''
+        return f'livequiz_hosts_{self.code}'
+
+    def get_categories(self):
+        '''Returns each category name mapped to the list of its questions.'''
+        return {
+            category.name: list(category.questions.all())
+            for category in self.categories.prefetch_related('questions')
+        }
+
     def set_view(self, view: LiveQuizView, question=None):
         '''
         Generates a JSON state for the specified view and saves it in this instances.
 
         Returns the JSON for the generated view.
         '''
-        view_data = {}
-        match view:
-            case LiveQuizView.QUIZ_BOARD:
-                answered = self.answered_questions
-                for category in self.categories.all():
-                    cat_key = category.name
-                    view_data[cat_key] = []
-
-                    for question in category.questions.all():
-                        if question.pk in answered:
-                            view_data[cat_key].append(None)
-                        else:
-                            view_data[cat_key].append({
-                                'id': question.pk,
-                                'value': question.value
-                            })
-            case LiveQuizView.QUESTION:
-                question = LiveQuizQuestion.objects.get(pk=question)
-                view_data = {
-                    'id': question.pk,
-                    'text': question.question
-                }
-            case LiveQuizView.ANSWER:
-                question = LiveQuizQuestion.objects.get(pk=question)
-                view_data = {
-                    'id': question.pk,
-                    'text': question.question,
-                    'answer': question.answer
-                }
-            case _:
-                raise Exception(f'Not a valid view from LiveQuizView: {view}')
-
-        self.last_view_command = get_current_quiz_view_message(
-            view.value, view_data)
+        if view in (LiveQuizView.QUESTION, LiveQuizView.ANSWER):
+            question = LiveQuizQuestion.objects.get(pk=question)
+
+        self.last_view_command = render_view(
+            view,
+            self.get_categories(),
+            self.answered_questions,
+            question
+        )
 
         self.save()
 
         return self.last_view_command
-    
+
+
+def render_view(view: LiveQuizView, categories, answered, question=None):
+    '''
+    Builds the set view message for a quiz without touching the database. The
+    categories map names to lists of questions, answered holds the ids of questions
+    to hide from the board, and question is the question shown by the other views.
+    '''
+    match view:
+        case LiveQuizView.QUIZ_BOARD:
+            view_data = render_board(categories, answered)
+        case LiveQuizView.QUESTION:
+            view_data = {
+                'id': question.pk,
+                'text': question.question
+            }
+            if question.choices:
+                view_data['choices'] = question.choices
+        case LiveQuizView.ANSWER:
+            view_data = {
+                'id': question.pk,
+                'text': question.question,
+                'answer': question.answer
+            }
+        case _:
+            raise Exception(f'Not a valid view from LiveQuizView: {view}')
+
+    return get_current_quiz_view_message(view.value, view_data)
+
 
 @receiver(pre_delete, sender=LiveQuizModel)
 def on_delete_livequiz(**kwargs):
@@ -285,8 +322,40 @@ class LiveQuizQuestion(models.Model):
     value = models.IntegerField(default=100)
     question = models.TextField(max_length=512)
     answer = models.TextField(max_length=512)
+    choices_raw = models.TextField(default='[]')
+    choices = json_property('choices_raw')
     category = models.ForeignKey(
         to=LiveQuizCategory,
         on_delete=models.CASCADE,
         related_name='questions'
     )
+
+
+class LiveQuizTeam(models.Model):
+    '''
+    A team of participants. The score is the sum of the scores of its members, kept up
+    to date as they change rather than recomputed.
+    '''
+    name = models.CharField(max_length=128)
+    score = models.IntegerField(default=0)
+    quiz = models.ForeignKey(
+        to=LiveQuizModel,
+        on_delete=models.CASCADE,
+        related_name='teams'
+    )
+
+
+class LiveQuizResponse(models.Model):
+    '''A typed answer from a participant during an open response round.'''
+    text = models.CharField(max_length=256)
+    submitted = models.DateTimeField(auto_now_add=True)
+    participant = models.ForeignKey(
+        to=LiveQuizParticipant,
+        on_delete=models.CASCADE,
+        related_name='responses'
+    )
+    question = models.ForeignKey(
+        to=LiveQuizQuestion,
+        on_delete=models.CASCADE,
+        related_name='responses'
+    )
@@ -0,0 +1,117 @@
+'''
+The frames waiting to be written to one socket. A socket slow to take them falls behind:
+the broadcasts queued for it are replaced by a single snapshot of the quiz, taken when it
+gets to be written, and broadcasts arriving meanwhile are dropped since the snapshot will
+cover them too. A socket that stays behind is given up on, to reconnect.
+
+ASGI servers take frames as fast as they are sent and buffer them without limit, so how
+long a send takes says nothing about the client. What does is the heartbeat: a client
+answers a ping only once it has received everything written before it. A socket that
+misses a heartbeat has its outbox held, and nothing more is written to it until it is
+heard from again, so its backlog piles up here instead of in the server.
+'''
+
+from collections import deque
+from time import monotonic
+from typing import NamedTuple
+
+# Frames queued for a socket before it counts as behind.
+MAX_QUEUED = 32
+
+# Seconds a socket may stay behind before it is given up on.
+MAX_LAG = 15.0
+
+# Close code asking the client to reconnect later, from RFC 6455's registry.
+TRY_AGAIN_LATER = 1013
+
+# Queued in place of the broadcasts a socket fell behind on.
+SNAPSHOT = object()
+
+
+class Close(NamedTuple):
+    '''Queued to close the socket once everything before it has been written.'''
+    code: int | None = None
+
+
+class Outbox:
+    '''
+    The queue of one socket. Items are frames, messages or Close, and numbered ones are
+    the broadcasts a snapshot takes the place of.
+    '''
+
+    def __init__(self, max_queued=MAX_QUEUED, max_lag=MAX_LAG, clock=monotonic):
+        self.max_queued = max_queued
+        self.max_lag = max_lag
+        self.clock = clock
+        self.items = deque()
+        self.snapshot_queued = False
+        self.behind_since: float | None = None
+        self.dropped = 0
+        self.closed = False
+        self.held = False
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item, numbered=False) -> bool:
+        '''Queues item. Returns False if the socket has been behind for too long.'''
+        if self.closed:
+            return True
+
+        if numbered and self.snapshot_queued:
+            self.dropped += 1
+        else:
+            self.items.append((item, numbered))
+            if len(self.items) >= self.max_queued:
+                self._fall_behind()
+
+        return self.behind < self.max_lag and len(self.items) < self.max_queued
+
+    def _fall_behind(self):
+        if self.behind_since is None:
+            self.behind_since = self.clock()
+
+        kept = deque((item, numbered) for item, numbered in self.items if not numbered)
+        self.dropped += len(self.items) - len(kept)
+        kept.append((SNAPSHOT, True))
+        self.items = kept
+        self.snapshot_queued = True
+
+    def get(self):
+        '''The next item to write, or None while held or once the socket has caught up.'''
+        if self.held:
+            return None
+        if not self.items:
+            self.behind_since = None
+            return None
+
+        item, _ = self.items.popleft()
+        if item is SNAPSHOT:
+            self.snapshot_queued = False
+        return item
+
+    def hold(self):
+        '''The client has not taken what was written yet, so stop writing to it.'''
+        self.held = True
+
+    def release(self):
+        '''The client caught up with what was written, so carry on writing.'''
+        self.held = False
+
+    def close(self):
+        '''Drops everything queued, and whatever is queued from now on.'''
+        self.items.clear()
+        self.snapshot_queued = False
+        self.closed = True
+
+    @property
+    def behind(self) -> float:
+        '''Seconds since the socket fell behind, or 0 if it has not.'''
+        if self.behind_since is None:
+            return 0.0
+
+        return self.clock() - self.behind_since
+
+    def lag(self) -> dict:
+        '''How far behind the socket is, for showing to the host.'''
+        return {'queued': len(self.items), 'dropped': self.dropped, 'behind': self.behind}
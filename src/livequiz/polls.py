@@ -0,0 +1,49 @@
+'''
+Multiple choice polls: every player picks one of the choices of the question on screen,
+and the host watches the counts change live.
+'''
+
+from array import array
+
+# Seconds between histograms sent to the host while votes are coming in.
+HISTOGRAM_INTERVAL = 0.25
+
+
+class Poll:
+    '''
+    The votes for one question. Counts are kept per choice in a compact array, and each
+    player's current choice is remembered so that changing a vote is two increments.
+    '''
+
+    def __init__(self, question_id: int, choices: list[str]):
+        self.question_id = question_id
+        self.choices = choices
+        self.counts = array('L', [0] * len(choices))
+        self.votes = {}
+
+    @property
+    def total(self) -> int:
+        return len(self.votes)
+
+    def vote(self, player, choice: int) -> bool:
+        '''
+        Records that player picked choice, replacing their earlier vote. Returns whether
+        the counts changed. Raises IndexError for choices the question does not have.
+        '''
+        if not 0 <= choice < len(self.counts):
+            raise IndexError(f'Question {self.question_id} has no choice {choice}')
+
+        previous = self.votes.get(player)
+        if previous == choice:
+            return False
+
+        if previous is not None:
+            self.counts[previous] -= 1
+        self.counts[choice] += 1
+        self.votes[player] = choice
+        return True
+
+    def percentages(self) -> list[float]:
+        '''The share of the votes each choice has, out of 100.'''
+        total = self.total
+        return [round(100 * count / total, 1) if total else 0.0 for count in self.counts]
@@ -0,0 +1,61 @@
+'''
+Who is actually there. Every socket is pinged as a heartbeat, and one that has not been
+heard from since its last ping counts as idle until it speaks again. A socket silent for
+long enough is taken for a dead connection and closed. Each live quiz keeps the players
+connected and idle in sets, so counting them never touches the participants table.
+'''
+
+# Seconds a socket may stay silent before it is closed, at the least.
+IDLE_TIMEOUT = 30.0
+
+# Heartbeats in a row a socket may leave unanswered before it is closed, for quizzes so
+# large that their heartbeats are further apart than IDLE_TIMEOUT allows for.
+MISSED_HEARTBEATS = 3
+
+# Seconds over which changes to the counts are gathered before they are sent to the hosts.
+PRESENCE_INTERVAL = 1.0
+
+
+def idle_timeout(interval: float) -> float:
+    '''Seconds of silence after which a socket pinged every interval seconds is closed.'''
+    return max(IDLE_TIMEOUT, MISSED_HEARTBEATS * interval)
+
+
+class Presence:
+    '''The channel names of the players connected to one quiz, and of those idle.'''
+
+    def __init__(self):
+        self.sockets: set[str] = set()
+        self.quiet: set[str] = set()
+
+    def add(self, channel_name: str):
+        '''A player connected on channel_name.'''
+        self.sockets.add(channel_name)
+        self.quiet.discard(channel_name)
+
+    def discard(self, channel_name: str):
+        '''The socket on channel_name disconnected.'''
+        self.sockets.discard(channel_name)
+        self.quiet.discard(channel_name)
+
+    def set_idle(self, channel_name: str, idle: bool):
+        '''Whether the socket on channel_name missed its last heartbeat.'''
+        if channel_name not in self.sockets:
+            return
+
+        if idle:
+            self.quiet.add(channel_name)
+        else:
+            self.quiet.discard(channel_name)
+
+    @property
+    def connected(self) -> int:
+        return len(self.sockets)
+
+    @property
+    def idle(self) -> int:
+        return len(self.quiet)
+
+    def counts(self) -> dict:
+        '''The counts, as sent to the hosts.'''
+        return {'connected': self.connected, 'idle': self.idle}
@@ -0,0 +1,81 @@
+'''
+Token buckets that keep a single socket from flooding the worker with messages. Every
+socket has a bucket per message type that refills at a steady rate, and a message that
+finds its bucket empty is dropped before any handler sees it.
+'''
+
+from functools import lru_cache
+from time import monotonic
+
+from django.conf import settings
+
+import livequiz.responses as respond
+
+# Messages per second a socket may send of a type, and how many it may send in a burst.
+# Types without a limit of their own share one bucket with the default limit.
+DEFAULT_RATE_LIMIT = (10.0, 20)
+RATE_LIMITS = {
+    'buzz in': (2.0, 4),
+    'set player name': (0.5, 3),
+    'join team': (1.0, 3),
+    'submit answer': (1.0, 3),
+    'vote': (2.0, 4),
+    'pong': (2.0, 4),
+    'resync': (0.5, 3),
+    **getattr(settings, 'LIVEQUIZ_RATE_LIMITS', {})
+}
+
+
+class TokenBucket:
+    '''Holds up to capacity tokens, refilling rate tokens per second. A message costs one.'''
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: int, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        '''Takes a token if there is one. Returns whether there was.'''
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens < 1:
+            return False
+
+        self.tokens -= 1
+        return True
+
+
+class RateLimiter:
+    '''The buckets of one socket, made as each message type is first sent.'''
+
+    def __init__(self, limits=None, default=DEFAULT_RATE_LIMIT, clock=monotonic):
+        self.limits = RATE_LIMITS if limits is None else limits
+        self.default = default
+        self.clock = clock
+        self.buckets: dict[str | None, TokenBucket] = {}
+
+    def key(self, msg_type) -> str | None:
+        '''The bucket msg_type takes from: its own if it has a limit, or else the shared one.'''
+        return msg_type if isinstance(msg_type, str) and msg_type in self.limits else None
+
+    def allow(self, msg_type) -> bool:
+        '''Whether a message of msg_type may be handled now.'''
+        key = self.key(msg_type)
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate, capacity = self.limits.get(key, self.default)
+            bucket = self.buckets[key] = TokenBucket(rate, capacity, self.clock())
+
+        return bucket.take(self.clock())
+
+
+@lru_cache(maxsize=len(RATE_LIMITS) + 1)
+def get_throttled_frame(key: str | None) -> respond.Frame:
+    '''The error frame, already encoded, for a socket emptying the bucket of key.'''
+    return respond.encode(respond.get_error_message([
+        f'Too many {key or "other"} messages. Slow down!'
+    ]))
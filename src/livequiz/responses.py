@@ -3,6 +3,9 @@ Contains all responses sent from the server to the client.
 '''
 
 from enum import Enum
+from typing import NamedTuple
+
+from livequiz import codec
 
 
 class MessageTypes(Enum):
@@ -13,6 +16,35 @@ class MessageTypes(Enum):
     TERMINATE = 'terminated'
     BUZZ = 'buzz event'
     PLAYER_UPDATE = 'player update'
+    PING = 'ping'
+    LEADERBOARD = 'leaderboard'
+    RANK = 'rank'
+    TEAM_STANDINGS = 'team standings'
+    ANSWER_ROUND = 'answer round'
+    ANSWER_SUMMARY = 'answer summary'
+    POLL = 'poll'
+    POLL_HISTOGRAM = 'poll histogram'
+    RECONNECT = 'reconnect'
+    BATCH = 'batch'
+    BOARD_PATCH = 'board patch'
+    SNAPSHOT = 'snapshot'
+    ROSTER = 'roster'
+    ROSTER_UPDATE = 'roster update'
+    PRESENCE = 'presence'
+
+
+class Frame(NamedTuple):
+    '''
+    A message encoded once for every kind of socket: as JSON text, and as MessagePack
+    when the codec has it.
+    '''
+    text: str
+    binary: bytes | None = None
+
+
+def encode(message: dict) -> Frame:
+    '''The frames for a message, as sent over the websocket.'''
+    return Frame(codec.dumps(message), codec.packb(message) if codec.packb else None)
 
 
 def get_generic_message(msg_type: MessageTypes, payload: object):
@@ -67,31 +99,211 @@ def get_terminate_message():
     )
 
 
-def get_buzz_event_message(exists: bool, player_socket=None, player_name=None):
-    '''Either respond none, open, closed with appropriate info for closed.'''
+# Frames that never change, encoded once.
+CONNECTED_FRAME = encode(get_info_message('Connected successfully.'))
+TERMINATE_FRAME = encode(get_terminate_message())
+
+
+def get_buzz_event_message(exists: bool, player_id=None, player_name=None,
+                           queue=None, queued=None, advanced=False, team=None):
+    '''
+    Either respond none, open, closed with appropriate info for closed, including the
+    team of the player answering if they have one. A full update
+    lists everyone waiting behind the current buzzer in queue. Otherwise the update is
+    incremental: queued is one buzz added to the end of the queue, advanced means the
+    first waiting buzz became the current one, and neither means the queue is empty.
+    '''
     if not exists:
         payload = {
             'status': 'none'
         }
-    elif player_socket is None:
+    elif player_id is None:
         payload = {
             'status': 'open'
         }
     else:
         payload = {
             'status': 'closed',
-            'socket': player_socket,
+            'id': player_id,
             'name': player_name
         }
+        if team is not None:
+            payload['team'] = team
+
+    if queue is not None:
+        payload['queue'] = queue
+    if queued is not None:
+        payload['queued'] = queued
+    if advanced:
+        payload['advanced'] = True
 
     return get_generic_message(
         MessageTypes.BUZZ,
         payload
     )
 
-def get_player_update_message(socket_name, new_name):
-    '''Just tell them the new name.'''
+def get_batch_message(messages: list[dict]):
+    '''Several messages that belong together, to be handled in order.'''
+    return get_generic_message(
+        MessageTypes.BATCH,
+        messages
+    )
+
+
+def get_sequenced_message(message: dict, seq: int):
+    '''
+    The message numbered seq among the broadcasts of a quiz, so that clients can tell when
+    they missed one.
+    '''
+    return {**message, 'seq': seq}
+
+
+def get_snapshot_message(epoch: str, seq: int, messages: list[dict]):
+    '''
+    Everything a client should be showing, as of broadcast seq of epoch. The messages are
+    handled in order, and broadcasts up to seq are already part of them.
+    '''
+    return get_generic_message(
+        MessageTypes.SNAPSHOT,
+        {'epoch': epoch, 'seq': seq, 'messages': messages}
+    )
+
+
+def get_board_patch_message(answered: list[int]):
+    '''Back to the board, which now has the questions in answered hidden.'''
+    return get_generic_message(
+        MessageTypes.BOARD_PATCH,
+        {'answered': answered}
+    )
+
+
+def get_reconnect_message(after: float):
+    '''The server is going away, so come back in after seconds.'''
+    return get_generic_message(
+        MessageTypes.RECONNECT,
+        {'after': round(after, 3)}
+    )
+
+def get_ping_message(ping_id: int):
+    '''Asks the client for a pong so we can time the round trip.'''
+    return get_generic_message(
+        MessageTypes.PING,
+        {'id': ping_id}
+    )
+
+def get_player_update_message(player_id, new_name, team=None):
+    '''Just tell them the new name, and the id of their team if they joined one.'''
+    payload = {'name': new_name, 'id': player_id}
+    if team is not None:
+        payload['team'] = team
+
     return get_generic_message(
         MessageTypes.PLAYER_UPDATE,
-        {'name': new_name, 'socket': socket_name}
-    )
\ No newline at end of file
+        payload
+    )
+
+
+def get_leaderboard_message(entries: list[dict], size: int):
+    '''
+    Changes to the top of the leaderboard. Each entry replaces whoever held its rank, and
+    size is how many players the top now holds.
+    '''
+    return get_generic_message(
+        MessageTypes.LEADERBOARD,
+        {'entries': entries, 'size': size}
+    )
+
+
+def get_rank_message(rank: int, score: int):
+    '''Where one player now is on the leaderboard.'''
+    return get_generic_message(
+        MessageTypes.RANK,
+        {'rank': rank, 'score': score}
+    )
+
+
+def get_team_standings_message(enabled: bool, teams: list[list]):
+    '''
+    Whether team mode is on, and every team from highest score to lowest. Each team is
+    a list of its id, name, score and number of members, to keep the message small.
+    '''
+    return get_generic_message(
+        MessageTypes.TEAM_STANDINGS,
+        {'enabled': enabled, 'teams': teams}
+    )
+
+
+def get_answer_round_message(status: str, question_id=None):
+    '''
+    Whether answers are being taken for question_id: open or closed for everyone, and
+    submitted for a player whose answer was accepted.
+    '''
+    return get_generic_message(
+        MessageTypes.ANSWER_ROUND,
+        {'status': status, 'question': question_id}
+    )
+
+
+def get_answer_summary_message(question_id: int, total: int, distinct: int, groups: list[list]):
+    '''
+    The answers so far for the host: how many there are, how many different ones, and
+    the largest groups of matching answers as [text, count] lists.
+    '''
+    return get_generic_message(
+        MessageTypes.ANSWER_SUMMARY,
+        {'question': question_id, 'total': total, 'distinct': distinct, 'groups': groups}
+    )
+
+
+def get_roster_message(entries: dict[int, str]):
+    '''Everyone connected to the quiz, for the host, as [id, name] lists.'''
+    return get_generic_message(
+        MessageTypes.ROSTER,
+        {'players': [[player_id, name] for player_id, name in entries.items()]}
+    )
+
+
+def get_roster_update_message(added: list[list], renamed: list[list], left: list[int]):
+    '''
+    What changed on the roster: players added or renamed as [id, name] lists, and the
+    ids of those who left. Empty lists are left out.
+    '''
+    changes = {'added': added, 'renamed': renamed, 'left': left}
+    return get_generic_message(
+        MessageTypes.ROSTER_UPDATE,
+        {key: value for key, value in changes.items() if value}
+    )
+
+
+def get_presence_message(connected: int, idle: int):
+    '''How many players are connected, and how many of them missed their last heartbeat.'''
+    return get_generic_message(
+        MessageTypes.PRESENCE,
+        {'connected': connected, 'idle': idle}
+    )
+
+
+def get_poll_message(status: str, question_id=None, choices=None, choice=None):
+    '''
+    Whether a poll is open or closed, with the choices to pick from while it is open. A
+    player whose vote was counted gets voted with the choice they picked.
+    '''
+    payload = {'status': status, 'question': question_id}
+    if choices is not None:
+        payload['choices'] = choices
+    if choice is not None:
+        payload['choice'] = choice
+
+    return get_generic_message(
+        MessageTypes.POLL,
+        payload
+    )
+
+
+def get_poll_histogram_message(question_id: int, counts: list[int], percentages: list[float],
+                               total: int):
+    '''The votes so far for each choice of the poll, for the host.'''
+    return get_generic_message(
+        MessageTypes.POLL_HISTOGRAM,
+        {'question': question_id, 'counts': counts, 'percentages': percentages, 'total': total}
+    )
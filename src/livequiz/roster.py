@@ -0,0 +1,60 @@
+'''
+The players connected to a live quiz, as the hosts see them. Hosts get the whole roster
+when they connect and only what changed after that, gathered over ROSTER_INTERVAL so
+that a room full of players joining at once costs a handful of messages.
+'''
+
+# Seconds over which roster changes are gathered before they are sent to the hosts.
+ROSTER_INTERVAL = 0.25
+
+
+class Roster:
+    '''The names of connected players by id, as last sent, and the changes since.'''
+
+    def __init__(self):
+        self.published: dict[int, str] = {}
+        self.changes: dict[int, str | None] = {}
+
+    def add(self, player_id: int, name: str):
+        '''A player connected, or was renamed while connected.'''
+        self.changes[player_id] = name
+
+    def remove(self, player_id: int):
+        '''A player disconnected.'''
+        self.changes[player_id] = None
+
+    def entries(self) -> dict[int, str]:
+        '''Everyone connected right now, changes included.'''
+        entries = dict(self.published)
+        for player_id, name in self.changes.items():
+            if name is None:
+                entries.pop(player_id, None)
+            else:
+                entries[player_id] = name
+
+        return entries
+
+    def take(self) -> dict | None:
+        '''
+        The players added, renamed and left since the last call, or None if nothing
+        changed for the hosts. A player who joined and left in between never shows up.
+        '''
+        added, renamed, left = [], [], []
+        for player_id, name in self.changes.items():
+            known = self.published.get(player_id)
+            if name is None:
+                if known is not None:
+                    left.append(player_id)
+                    del self.published[player_id]
+            elif known is None:
+                added.append([player_id, name])
+                self.published[player_id] = name
+            elif known != name:
+                renamed.append([player_id, name])
+                self.published[player_id] = name
+        self.changes = {}
+
+        if not (added or renamed or left):
+            return None
+
+        return {'added': added, 'renamed': renamed, 'left': left}
@@ -0,0 +1,175 @@
+'''
+Snapshots of live quizzes on local disk, so that a restarted worker carries on from the
+moment it stopped rather than from the last write to the database.
+
+Every save appends one line per quiz to a journal. Once the journal holds more lines
+than there are quizzes, the latest line of each quiz is written to the snapshot file
+and the journal starts over. Each line is the quiz code, a tab and the snapshot as
+JSON, or nothing after the tab for a quiz that was deleted. Only the code is read on
+boot, the JSON is decoded once the quiz is actually loaded.
+'''
+
+import logging as LOG
+import os
+from pathlib import Path
+
+from livequiz import codec
+
+SNAPSHOT_FILE = 'snapshot.jsonl'
+JOURNAL_FILE = 'journal.jsonl'
+ROTATED_JOURNAL_FILE = 'journal.old.jsonl'
+
+# Journal lines written before it is worth compacting, however few quizzes there are.
+COMPACT_AFTER = 1000
+
+
+def encode(code: str, snapshot: dict | None) -> bytes:
+    '''The journal line for the snapshot of quiz code. None marks it deleted.'''
+    if snapshot is None:
+        return code.encode() + b'\t\n'
+
+    return b'%s\t%s\n' % (code.encode(), codec.dumpb(snapshot))
+
+
+class SnapshotStore:
+    '''
+    The latest snapshot line of every quiz, kept in memory and on disk in directory.
+    Without a directory, nothing is saved and nothing is restored.
+    '''
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory else None
+        self.lines: dict[str, bytes] = {}
+        self.journal_length = 0
+        self.compacting = False
+        self.opened = False
+        self._journal = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    def open(self):
+        '''
+        Reads the snapshot and replays the journals on top of it, then compacts them so the
+        next boot has less to read. Does nothing after the first call.
+        '''
+        if self.opened or not self.enabled:
+            return
+        self.opened = True
+
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for name in (SNAPSHOT_FILE, ROTATED_JOURNAL_FILE, JOURNAL_FILE):
+                try:
+                    with open(self._path(name), 'rb') as file:
+                        self._read(file)
+                except FileNotFoundError:
+                    pass
+        except Exception:
+            # Some of the snapshots could be older than what the database has by now.
+            self.lines = {}
+            raise
+
+        self.write_snapshot(self.rotate())
+
+    def _read(self, file):
+        for line in file:
+            # A line cut short by a crash is all that can be missing its newline.
+            if not line.endswith(b'\n'):
+                LOG.warning('Ignoring a truncated live quiz snapshot in %s', file.name)
+                break
+
+            code, _, snapshot = line.partition(b'\t')
+            code = code.decode()
+            if snapshot.strip():
+                self.lines[code] = line
+            else:
+                self.lines.pop(code, None)
+
+    def get(self, code: str) -> dict | None:
+        '''
+        The latest snapshot of quiz code, if there is one. A snapshot that cannot be decoded
+        is dropped, and the quiz starts over from the database.
+        '''
+        line = self.lines.get(code)
+        if line is None:
+            return None
+
+        try:
+            return codec.loads(line.partition(b'\t')[2])
+        except ValueError:
+            LOG.exception('Ignoring an unreadable snapshot of live quiz %s', code)
+            del self.lines[code]
+            return None
+
+    def save(self, snapshots: dict[str, dict | None]) -> bool:
+        '''
+        Appends snapshots, by quiz code, to the journal in one write. A snapshot of None
+        forgets the quiz. Returns whether the journal is due to be compacted.
+        '''
+        if not self.enabled or not snapshots:
+            return False
+
+        lines = [encode(code, snapshot) for code, snapshot in snapshots.items()]
+        for code, line in zip(snapshots, lines):
+            if line.endswith(b'\t\n'):
+                self.lines.pop(code, None)
+            else:
+                self.lines[code] = line
+
+        if self._journal is None:
+            self._journal = open(self._path(JOURNAL_FILE), 'ab')
+
+        self._journal.write(b''.join(lines))
+        self._journal.flush()
+        self.journal_length += len(lines)
+
+        return not self.compacting and self.journal_length >= max(COMPACT_AFTER, len(self.lines))
+
+    def rotate(self) -> list[bytes]:
+        '''
+        Starts a new journal and returns the lines that make up the snapshot up to here,
+        for write_snapshot. The old journal is kept until that snapshot is written.
+        '''
+        self.compacting = True
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+        journal, rotated = self._path(JOURNAL_FILE), self._path(ROTATED_JOURNAL_FILE)
+        if rotated.exists() and journal.exists():
+            # The last compaction failed, so the rotated journal is still needed.
+            with open(rotated, 'ab') as file:
+                file.write(journal.read_bytes())
+            journal.unlink()
+        elif journal.exists():
+            os.replace(journal, rotated)
+        self.journal_length = 0
+
+        return list(self.lines.values())
+
+    def write_snapshot(self, lines: list[bytes]):
+        '''
+        Synchronously replaces the snapshot file with lines from rotate and drops the
+        journal they came from. Safe to run in another thread.
+        '''
+        try:
+            temporary = self._path(SNAPSHOT_FILE + '.tmp')
+            with open(temporary, 'wb') as file:
+                file.write(b''.join(lines))
+                file.flush()
+                os.fsync(file.fileno())
+
+            os.replace(temporary, self._path(SNAPSHOT_FILE))
+            self._path(ROTATED_JOURNAL_FILE).unlink(missing_ok=True)
+        finally:
+            self.compacting = False
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
@@ -7,10 +7,107 @@ export function setup(quiz_code) {
     connection = new LiveQuizWebsocket(
         '/ws/live/host/' + quiz_code,
         new HostViewRenderer());
+
+    document.getElementById('livequiz_undo').onclick = (e) => {sendHistoryRequest('undo');};
+    document.getElementById('livequiz_redo').onclick = (e) => {sendHistoryRequest('redo');};
+
+    let mode = document.getElementById('livequiz_team_mode');
+    mode.onchange = (e) => {sendTeamModeRequest(mode.checked);};
+
+    let name = document.getElementById('livequiz_team_name');
+    document.getElementById('livequiz_create_team').onclick = (e) => {
+        if (name.value)
+            sendCreateTeamRequest(name.value);
+        name.value = '';
+    };
 }
 
 class HostViewRenderer extends ClientViewRenderer {
-    renderBuzzArea(data) {
+    constructor() {
+        super();
+        this.rosterDiv = document.getElementById('livequiz_roster_div');
+        this.presenceDiv = document.getElementById('livequiz_presence_div');
+    }
+
+    renderAnswerRound(data) {
+        let element = document.createElement('div');
+        if (data.status == 'open') {
+            let button = document.createElement('button');
+            button.innerHTML = 'Stop Taking Answers';
+            button.onclick = (e) => {sendAnswersRequest('end');};
+            element.appendChild(button);
+        }
+        this.swapContent(element, this.answersDiv);
+    }
+
+    renderAnswerSummary(data) {
+        let element = document.createElement('div');
+        let p = document.createElement('p');
+        p.innerHTML = `${data.total} answers, ${data.distinct} different`;
+        element.appendChild(p);
+
+        let list = document.createElement('ol');
+        data.groups.forEach( ([text, count]) => {
+            let li = document.createElement('li');
+            li.innerText = `${text} (${count})`;
+            list.appendChild(li);
+        });
+        element.appendChild(list);
+
+        let old = this.answersDiv.querySelector('.livequiz_answer_summary');
+        if (old)
+            old.remove();
+        element.className = 'livequiz_answer_summary';
+        this.answersDiv.appendChild(element);
+    }
+
+    renderRoster(roster) {
+        let list = document.createElement('ul');
+        roster.forEach( (name) => {
+            let li = document.createElement('li');
+            li.innerText = name;
+            list.appendChild(li);
+        });
+        this.swapContent(list, this.rosterDiv);
+    }
+
+    renderPresence(data) {
+        let p = document.createElement('p');
+        p.innerHTML = `${data.connected} players connected, ${data.idle} idle`;
+        this.swapContent(p, this.presenceDiv);
+    }
+
+    renderPoll(data) {
+        super.renderPoll(data);
+        if (data.status == 'open') {
+            let button = document.createElement('button');
+            button.innerHTML = 'End Poll';
+            button.onclick = (e) => {sendPollRequest('end');};
+            this.pollDiv.children[0].appendChild(button);
+        }
+    }
+
+    renderPollHistogram(data) {
+        let items = this.pollDiv.querySelectorAll('li');
+        data.counts.forEach( (count, index) => {
+            if (index >= items.length)
+                return;
+            let bar = items[index].querySelector('.livequiz_poll_bar');
+            if (!bar) {
+                bar = document.createElement('span');
+                bar.className = 'livequiz_poll_bar';
+                items[index].appendChild(bar);
+            }
+            bar.innerText = ` ${count} (${data.percentages[index]}%)`;
+        });
+    }
+
+    renderTeams(data) {
+        document.getElementById('livequiz_team_mode').checked = data.enabled;
+        super.renderTeams(data);
+    }
+
+    renderBuzzArea(data, queue) {
         let newArea = document.createElement('div');
         if (data.status != 'none') {
             let p = document.createElement('p');
@@ -18,9 +115,23 @@ class HostViewRenderer extends ClientViewRenderer {
 
             if (data.status == 'open')
                 p.innerHTML = 'Waiting for someone to buzz in!'
-            else 
-                p.innerHTML = 'Player ' + data.name + ' buzzed first!'
-            
+            else {
+                p.innerText = 'Player ' + data.name + ' is answering!'
+
+                let next = document.createElement('button')
+                next.onclick = (e) => {sendBuzzRequest('next');};
+                next.innerHTML = 'Next Buzzer'
+                newArea.appendChild(next);
+
+                let scoring = this.createButtons(['Correct', 'Wrong']);
+                scoring.children[0].onclick = (e) => {sendScoreRequest('award');};
+                scoring.children[1].onclick = (e) => {sendScoreRequest('deduct');};
+                newArea.appendChild(scoring);
+            }
+
+            if (queue.length > 0)
+                newArea.appendChild(this.renderBuzzQueue(queue));
+
             let button = document.createElement('button')
             button.onclick = (e) => {sendBuzzRequest('end');};
             button.innerHTML = 'Stop Buzz Event'
@@ -31,18 +142,29 @@ class HostViewRenderer extends ClientViewRenderer {
     renderBoardQuestion(question_data) {
         let element = document.createElement('a');
         element.innerHTML = question_data.value;
-        element.onclick = (e) => {sendViewRequest('question', question_data.id);};
+        element.onclick = (e) => {
+            sendViewRequest('question', question_data.id, getSeconds('livequiz_question_seconds'));
+        };
         return element;
     }
 
     renderQuestion(question_data) {
         super.renderQuestion(question_data);
         let element = this.contentDiv.children[0];
-        let buttons = this.createButtons(['Back', 'Show Answer', '(Re)start Buzz']);
+        let buttons = this.createButtons(['Back', 'Show Answer', '(Re)start Buzz', 'Take Answers']);
         
         buttons.children[0].onclick = (e) => {sendViewRequest('quiz_board');};
         buttons.children[1].onclick = (e) => {sendViewRequest('answer', question_data.id);};
-        buttons.children[2].onclick = (e) => {sendBuzzRequest('start');};
+        buttons.children[2].onclick = (e) => {
+            sendBuzzRequest('start', getSeconds('livequiz_buzz_seconds'));
+        };
+        buttons.children[3].onclick = (e) => {sendAnswersRequest('start');};
+
+        if (question_data.choices) {
+            let poll = this.createButtons(['Start Poll']);
+            poll.children[0].onclick = (e) => {sendPollRequest('start');};
+            buttons.appendChild(poll.children[0]);
+        }
         element.appendChild(buttons);
     }
 
@@ -71,30 +193,97 @@ class HostViewRenderer extends ClientViewRenderer {
     }
 }
 
-function sendViewRequest(view, question_id=null) {
+function getSeconds(input_id) {
+    let input = document.getElementById(input_id);
+    let seconds = input ? parseFloat(input.value) : 0;
+    return seconds > 0 ? seconds : null;
+}
+
+function sendViewRequest(view, question_id=null, seconds=null) {
     connection.socket.send(JSON.stringify({
         type: 'set view',
         payload: {
             'view': view,
-            'question_id': question_id
+            'question_id': question_id,
+            'seconds': seconds
         }
     }))
 }
 
-function sendBuzzRequest(action) {
+function sendBuzzRequest(action, seconds=null) {
     connection.socket.send(JSON.stringify({
         type: 'manage buzz',
+        payload: {
+            'action': action,
+            'seconds': seconds
+        }
+    }));
+}
+
+function sendScoreRequest(action, points=null) {
+    connection.socket.send(JSON.stringify({
+        type: 'score buzzer',
+        payload: {
+            'action': action,
+            'points': points
+        }
+    }));
+}
+
+function sendTeamModeRequest(enabled) {
+    connection.socket.send(JSON.stringify({
+        type: 'manage teams',
+        payload: {
+            'action': 'mode',
+            'enabled': enabled
+        }
+    }));
+}
+
+function sendCreateTeamRequest(name) {
+    connection.socket.send(JSON.stringify({
+        type: 'manage teams',
+        payload: {
+            'action': 'create',
+            'name': name
+        }
+    }));
+}
+
+function sendAnswersRequest(action) {
+    connection.socket.send(JSON.stringify({
+        type: 'manage answers',
         payload: {
             'action': action
         }
     }));
 }
 
-function sendMarkDoneRequest(question_id) {
+function sendPollRequest(action) {
     connection.socket.send(JSON.stringify({
-        type: 'mark answered',
+        type: 'manage poll',
         payload: {
-            'question_id': question_id
+            'action': action
         }
     }));
+}
+
+function sendHistoryRequest(action) {
+    connection.socket.send(JSON.stringify({
+        type: 'history',
+        payload: {
+            'action': action
+        }
+    }));
+}
+
+function sendMarkDoneRequest(question_id) {
+    // Back to the board with the buzz closed, in one go.
+    connection.socket.send(JSON.stringify({
+        type: 'batch',
+        payload: [
+            {type: 'mark answered', payload: {'question_id': question_id}},
+            {type: 'manage buzz', payload: {'action': 'end'}}
+        ]
+    }));
 }
\ No newline at end of file
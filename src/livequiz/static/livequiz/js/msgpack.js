@@ -0,0 +1,115 @@
+// A MessagePack decoder for the frames the server sends on the livequiz.msgpack
+// subprotocol. Extension types are not used by the server and are not supported.
+
+const textDecoder = new TextDecoder();
+
+export function decode(buffer) {
+    let reader = new Reader(buffer);
+    let value = reader.read();
+    if (reader.offset != reader.view.byteLength) {
+        throw new Error('Extra bytes after MessagePack value');
+    }
+    return value;
+}
+
+class Reader {
+    constructor(buffer) {
+        this.bytes = new Uint8Array(buffer);
+        this.view = new DataView(this.bytes.buffer, this.bytes.byteOffset, this.bytes.byteLength);
+        this.offset = 0;
+    }
+
+    read() {
+        let byte = this.uint(1);
+
+        if (byte <= 0x7f) return byte;
+        if (byte >= 0xe0) return byte - 0x100;
+        if ((byte & 0xf0) == 0x80) return this.map(byte & 0x0f);
+        if ((byte & 0xf0) == 0x90) return this.array(byte & 0x0f);
+        if ((byte & 0xe0) == 0xa0) return this.str(byte & 0x1f);
+
+        switch (byte) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: return this.bin(this.uint(1));
+            case 0xc5: return this.bin(this.uint(2));
+            case 0xc6: return this.bin(this.uint(4));
+            case 0xca: return this.float(4);
+            case 0xcb: return this.float(8);
+            case 0xcc: return this.uint(1);
+            case 0xcd: return this.uint(2);
+            case 0xce: return this.uint(4);
+            case 0xcf: return this.uint(8);
+            case 0xd0: return this.int(1);
+            case 0xd1: return this.int(2);
+            case 0xd2: return this.int(4);
+            case 0xd3: return this.int(8);
+            case 0xd9: return this.str(this.uint(1));
+            case 0xda: return this.str(this.uint(2));
+            case 0xdb: return this.str(this.uint(4));
+            case 0xdc: return this.array(this.uint(2));
+            case 0xdd: return this.array(this.uint(4));
+            case 0xde: return this.map(this.uint(2));
+            case 0xdf: return this.map(this.uint(4));
+        }
+        throw new Error('Unsupported MessagePack type 0x' + byte.toString(16));
+    }
+
+    uint(size) {
+        let offset = this.offset;
+        this.offset += size;
+        switch (size) {
+            case 1: return this.view.getUint8(offset);
+            case 2: return this.view.getUint16(offset);
+            case 4: return this.view.getUint32(offset);
+            default: return Number(this.view.getBigUint64(offset));
+        }
+    }
+
+    int(size) {
+        let offset = this.offset;
+        this.offset += size;
+        switch (size) {
+            case 1: return this.view.getInt8(offset);
+            case 2: return this.view.getInt16(offset);
+            case 4: return this.view.getInt32(offset);
+            default: return Number(this.view.getBigInt64(offset));
+        }
+    }
+
+    float(size) {
+        let offset = this.offset;
+        this.offset += size;
+        return size == 4 ? this.view.getFloat32(offset) : this.view.getFloat64(offset);
+    }
+
+    bin(length) {
+        let start = this.offset;
+        this.offset += length;
+        return this.bytes.slice(start, this.offset);
+    }
+
+    str(length) {
+        let start = this.offset;
+        this.offset += length;
+        return textDecoder.decode(this.bytes.subarray(start, this.offset));
+    }
+
+    array(length) {
+        let array = new Array(length);
+        for (let i = 0; i < length; i++) {
+            array[i] = this.read();
+        }
+        return array;
+    }
+
+    map(length) {
+        let map = {};
+        for (let i = 0; i < length; i++) {
+            let key = this.read();
+            map[key] = this.read();
+        }
+        return map;
+    }
+}
@@ -14,13 +14,68 @@ class PlayerRenderer extends ClientViewRenderer {
     constructor() {
         super()
         this.playerDiv = document.getElementById('livequiz_player_div');
+        this.rankDiv = document.getElementById('livequiz_rank_div');
+        this.hasBuzzed = false;
+    }
+
+    renderAnswerRound(data) {
+        if (data.status != 'open')
+            return super.renderAnswerRound(data);
+
+        let element = document.createElement('div');
+        let input = document.createElement('input');
+        input.type = 'text';
+        input.maxLength = 256;
+        element.appendChild(input);
+
+        let button = document.createElement('button');
+        button.innerHTML = 'Submit Answer';
+        button.onclick = (e) => {sendAnswer(input.value);};
+        element.appendChild(button);
+
+        this.swapContent(element, this.answersDiv);
+    }
+
+    renderPoll(data) {
+        if (data.status == 'voted') {
+            this.pollDiv.querySelectorAll('button').forEach( (button, index) => {
+                button.disabled = index == data.choice;
+            });
+            return;
+        }
+        super.renderPoll(data);
+    }
+
+    renderChoiceAction(index) {
+        let button = document.createElement('button');
+        button.innerHTML = 'Pick';
+        button.onclick = (e) => {sendVote(index);};
+        return button;
+    }
+
+    renderTeamActions(team_id) {
+        if (team_id == this.team)
+            return super.renderTeamActions(team_id);
+
+        let button = document.createElement('button');
+        button.innerHTML = 'Join';
+        button.onclick = (e) => {sendJoinTeamRequest(team_id);};
+        return button;
+    }
+
+    renderRank(data) {
+        let p = document.createElement('p');
+        p.innerHTML = `You are #${data.rank} with ${data.score} points.`;
+        this.swapContent(p, this.rankDiv);
     }
 
     renderPlayerInfo(data) {
         console.log('New player info:', data);
+        this.playerId = data.id;
+        this.team = data.team;
         let newDiv = document.createElement('div');
         let p = document.createElement('p');
-        p.innerHTML = `Playing as "${data.name}"`;
+        p.innerText = `Playing as "${data.name}"`;
         newDiv.appendChild(p);
 
         let button = document.createElement('button');
@@ -34,22 +89,33 @@ class PlayerRenderer extends ClientViewRenderer {
 
         this.swapContent(newDiv, this.playerDiv);
     }
-    renderBuzzArea(data) {
+    renderBuzzArea(data, queue) {
         let newDiv = document.createElement('div')
 
+        if (data.status == 'none' || (data.status == 'open' && !data.advanced && queue.length == 0))
+            this.hasBuzzed = false;
+        if (data.id == this.playerId || queue.some( (buzz) => buzz.id == this.playerId ))
+            this.hasBuzzed = true;
+
         if (data.status != 'none') {
-            if (data.status == 'open') {
-                let button = document.createElement('button');
-                button.innerHTML = 'Buzz In!'
-                button.onclick = (e) => {sendBuzzInEvent();};
-                newDiv.appendChild(button);
-            }
-            else {
+            if (data.status == 'closed') {
                 let p = document.createElement('p');
-                p.innerHTML = `${data.name} was the first to buzz in.`;
+                p.innerText = `${data.name} is answering.`;
 
                 newDiv.appendChild(p);
             }
+            if (queue.length > 0)
+                newDiv.appendChild(this.renderBuzzQueue(queue));
+
+            if (!this.hasBuzzed) {
+                let button = document.createElement('button');
+                button.innerHTML = 'Buzz In!'
+                button.onclick = (e) => {
+                    this.hasBuzzed = true;
+                    sendBuzzInEvent();
+                };
+                newDiv.appendChild(button);
+            }
         }
         this.swapContent(newDiv, this.buzzDiv);
     }
@@ -58,7 +124,34 @@ class PlayerRenderer extends ClientViewRenderer {
 function sendBuzzInEvent() {
     connection.socket.send(JSON.stringify({
         type: 'buzz in',
-        payload: {}
+        payload: {time: performance.now() / 1000}
+    }))
+}
+
+function sendAnswer(text) {
+    connection.socket.send(JSON.stringify({
+        type: 'submit answer',
+        payload: {
+            text: text
+        }
+    }))
+}
+
+function sendVote(choice) {
+    connection.socket.send(JSON.stringify({
+        type: 'vote',
+        payload: {
+            choice: choice
+        }
+    }))
+}
+
+function sendJoinTeamRequest(team_id) {
+    connection.socket.send(JSON.stringify({
+        type: 'join team',
+        payload: {
+            team: team_id
+        }
     }))
 }
 
@@ -1,7 +1,24 @@
+function decodeBitmap(text) {
+    return Uint8Array.from(atob(text), (c) => c.charCodeAt(0));
+}
+
+function encodeBitmap(bits) {
+    return btoa(String.fromCharCode(...bits));
+}
+
 export class ClientViewRenderer {
     constructor() {
         this.contentDiv = document.getElementById('livequiz_content_div');
         this.buzzDiv = document.getElementById('livequiz_buzz_div')
+        this.leaderboardDiv = document.getElementById('livequiz_leaderboard_div');
+        this.teamsDiv = document.getElementById('livequiz_teams_div');
+        this.answersDiv = document.getElementById('livequiz_answers_div');
+        this.pollDiv = document.getElementById('livequiz_poll_div');
+        this.buzzQueue = [];
+        this.leaderboard = [];
+        this.roster = new Map();
+        this.board = null;
+        this.view = null;
     }
 
     swapContent(new_child, parent) {
@@ -9,10 +26,130 @@ export class ClientViewRenderer {
         parent.appendChild(new_child);
     }
 
-    renderBuzzArea(data) {
+    updateBuzz(data) {
+        if (data.queue !== undefined)
+            this.buzzQueue = data.queue;
+        else if (data.queued !== undefined)
+            this.buzzQueue.push(data.queued);
+        else if (data.advanced)
+            this.buzzQueue.shift();
+        else
+            this.buzzQueue = [];
+
+        this.renderBuzzArea(data, this.buzzQueue);
+    }
+
+    renderBuzzArea(data, queue) {
         console.log('Whoops, someone forgot to implement renderBuzzArea.');
     }
 
+    renderBuzzQueue(queue) {
+        let list = document.createElement('ol');
+        queue.forEach( (buzz) => {
+            let li = document.createElement('li');
+            li.innerText = `${buzz.name} (+${buzz.time}ms)`;
+            list.appendChild(li);
+        });
+        return list;
+    }
+
+    updateLeaderboard(data) {
+        data.entries.forEach( (entry) => {
+            this.leaderboard[entry.rank - 1] = entry;
+        });
+        this.leaderboard.length = data.size;
+
+        this.renderLeaderboard(this.leaderboard);
+    }
+
+    renderLeaderboard(leaderboard) {
+        let list = document.createElement('ol');
+        leaderboard.forEach( (entry) => {
+            let li = document.createElement('li');
+            li.innerText = `${entry.name}: ${entry.score}`;
+            list.appendChild(li);
+        });
+        this.swapContent(list, this.leaderboardDiv);
+    }
+
+    renderAnswerRound(data) {
+        let element = document.createElement('p');
+        if (data.status == 'open')
+            element.innerHTML = 'Everyone is typing an answer!';
+        else if (data.status == 'submitted')
+            element.innerHTML = 'Your answer is in.';
+        this.swapContent(element, this.answersDiv);
+    }
+
+    renderAnswerSummary(data) {
+        console.log('Answer summary', data);
+    }
+
+    // The roster is kept as names by player id, from [id, name] lists.
+    setRoster(players) {
+        this.roster = new Map(players);
+        this.renderRoster(this.roster);
+    }
+
+    patchRoster(update) {
+        (update.added || []).forEach( ([id, name]) => this.roster.set(id, name) );
+        (update.renamed || []).forEach( ([id, name]) => this.roster.set(id, name) );
+        (update.left || []).forEach( (id) => this.roster.delete(id) );
+        this.renderRoster(this.roster);
+    }
+
+    renderRoster(roster) {
+        console.log('Roster', roster);
+    }
+
+    renderPresence(data) {
+        console.log('Presence', data);
+    }
+
+    renderPoll(data) {
+        let element = document.createElement('div');
+        if (data.status == 'open') {
+            let list = document.createElement('ol');
+            data.choices.forEach( (choice, index) => {
+                let li = document.createElement('li');
+                li.innerText = choice;
+                li.appendChild(this.renderChoiceAction(index));
+                list.appendChild(li);
+            });
+            element.appendChild(list);
+        }
+        this.swapContent(element, this.pollDiv);
+    }
+
+    renderChoiceAction(index) {
+        return document.createElement('span');
+    }
+
+    renderPollHistogram(data) {
+        console.log('Poll histogram', data);
+    }
+
+    renderTeams(data) {
+        let list = document.createElement('ol');
+        if (data.enabled) {
+            data.teams.forEach( ([id, name, score, members]) => {
+                let li = document.createElement('li');
+                li.innerHTML = `${name}: ${score} (${members} players)`;
+                li.appendChild(this.renderTeamActions(id));
+                list.appendChild(li);
+            });
+        }
+        this.swapContent(list, this.teamsDiv);
+    }
+
+    renderTeamActions(team_id) {
+        return document.createElement('span');
+    }
+
+    renderRank(data) {
+        console.log('Rank', data);
+    }
+
     renderPlayerInfo(data) {
         console.log('Setting info', data);
     }
@@ -36,11 +173,19 @@ export class ClientViewRenderer {
         }
     }
 
+    restoreView() {
+        if (this.view !== null) {
+            this.renderView(this.view);
+        }
+    }
+
     renderView(payload) {
+        this.view = payload;
         let name = payload.view
         let data = payload.data
         switch (name) {
             case 'quiz_board':
+                this.board = data;
                 this.renderBoard(data);
                 break;
             case 'question':
@@ -54,30 +199,57 @@ export class ClientViewRenderer {
         }
     }
 
-    renderBoard(categories) {
-        let board = document.createElement('div');
-        board.id = 'livequiz_board'
-    
-        Object.keys(categories).forEach( function (category) {
+    // The board comes in columns, with the answered questions as a base64 bitmap. See
+    // livequiz/board.py.
+    renderBoard(board) {
+        let element = document.createElement('div');
+        element.id = 'livequiz_board'
+        let answered = decodeBitmap(board.answered);
+        let index = 0;
+
+        board.categories.forEach( (category, column) => {
             let category_div = document.createElement('div');
             let category_name = document.createElement('h2');
             category_name.innerHTML = category;
-    
+
             category_div.appendChild(category_name);
-    
-            categories[category].forEach( (question) => {
-                if (question == null) {
+
+            for (let end = index + board.sizes[column]; index < end; index++) {
+                if (answered[index >> 3] & (1 << (index & 7))) {
                     category_div.appendChild(document.createElement('div'));
                 }
                 else {
-                    category_div.appendChild(this.renderBoardQuestion(question));
+                    category_div.appendChild(this.renderBoardQuestion({
+                        id: board.ids[index],
+                        value: board.values[index]
+                    }));
                 }
-            }, this);
-    
-            board.appendChild(category_div);
-        }, this)
-    
-        this.swapContent(board, this.contentDiv);
+            }
+
+            element.appendChild(category_div);
+        });
+
+        this.swapContent(element, this.contentDiv);
+    }
+
+    // Marks the answered questions on the last board shown and shows it again. Returns
+    // false if no board has been shown to patch.
+    patchBoard(patch) {
+        if (this.board === null) {
+            return false;
+        }
+
+        let answered = decodeBitmap(this.board.answered);
+        patch.answered.forEach( (id) => {
+            let index = this.board.ids.indexOf(id);
+            if (index >= 0) {
+                answered[index >> 3] |= 1 << (index & 7);
+            }
+        });
+        this.board.answered = encodeBitmap(answered);
+        this.view = {view: 'quiz_board', data: this.board};
+        this.renderBoard(this.board);
+        return true;
     }
 
     renderBoardQuestion(question_data) {
@@ -1,18 +1,36 @@
+import { decode } from "./msgpack.js"
 import { getWebsocketURLFromLocation } from "./util.js"
 
+// Asked for in order of preference. The server answers with MessagePack frames only if
+// it has msgpack installed, and takes JSON text from the client either way.
+const SUBPROTOCOLS = ['livequiz.msgpack', 'livequiz.json'];
+
+// Close code for a socket the server gave up on for falling too far behind.
+const TRY_AGAIN_LATER = 1013;
+
 export class LiveQuizWebsocket {
     constructor(relativeURL, renderer) {
         this.renderer = renderer;
         this.relativeURL = relativeURL;
         this.socket = null;
         this.lastMessage = null;
+        this.reconnectAfter = null;
+        this.epoch = null;
+        this.seq = null;
+        this.resyncing = false;
         this.establishConnection();
     }
 
     establishConnection() {
         let url = getWebsocketURLFromLocation(this.relativeURL);
+        if (this.seq !== null) {
+            // Only the broadcasts missed while away are sent again, if the server has them.
+            url += `?epoch=${encodeURIComponent(this.epoch)}&seq=${this.seq}`;
+        }
         console.log('Attempting websocket at', url);
-        this.socket = new WebSocket(url);
+        this.resyncing = false;
+        this.socket = new WebSocket(url, SUBPROTOCOLS);
+        this.socket.binaryType = 'arraybuffer';
         this.socket.onopen = (e) => this.onSocketOpen(e);
         this.socket.onclose = (e) => this.onSocketClose(e);
         this.socket.onmessage = (e) => this.onSocketMessage(e);
@@ -20,17 +38,38 @@ export class LiveQuizWebsocket {
 
     onSocketOpen(e) {
         console.log(e);
+        if (this.seq !== null) {
+            // Put back what was showing before the connection dropped, for the missed
+            // broadcasts to apply to.
+            this.renderer.restoreView();
+        }
+    }
+
+    reconnectLater(seconds) {
+        console.log('Attempting to reconnect in', seconds.toFixed(1), 'seconds.');
+        setTimeout(() => {this.establishConnection();}, seconds * 1000);
     }
 
     onSocketClose(e) {
-        if (!e.wasClean) {
+        if (this.reconnectAfter !== null) {
+            console.info('Server is restarting.');
+            this.renderer.renderTemplate('reconnecting-template');
+            this.reconnectLater(this.reconnectAfter);
+            this.reconnectAfter = null;
+        }
+        else if (e.code == TRY_AGAIN_LATER) {
+            console.warn('Fell too far behind the server.');
+            this.renderer.renderTemplate('reconnecting-template');
+            this.reconnectLater(1 + 2 * Math.random());
+        }
+        else if (!e.wasClean) {
             console.warn('Detecting unclean disconnect from server.');
             if (this.socket !== null) {
                 this.socket.close();
             }
             this.renderer.renderTemplate('connection-error-template');
-            console.log('Attempting to reconnect in 5 seconds.');
-            setTimeout(() => {this.establishConnection();}, 5000);
+            // Spread out so that everyone dropped at once does not come back at once.
+            this.reconnectLater(2.5 + 5 * Math.random());
         }
         else {
             console.info('Server intentionally closed connection.');
@@ -49,20 +88,112 @@ export class LiveQuizWebsocket {
     }
 
     onSocketMessage(e) {
-        let data = JSON.parse(e.data);
+        if (typeof e.data == 'string') {
+            this.handleMessage(JSON.parse(e.data));
+        }
+        else {
+            this.handleMessage(decode(e.data));
+        }
+    }
+
+    // Whether a numbered broadcast follows on from the last one. Those already seen are
+    // skipped, and a gap means asking for the missed ones again.
+    inSequence(seq) {
+        if (this.seq === null || seq == this.seq + 1) {
+            this.seq = seq;
+            this.resyncing = false;
+            return true;
+        }
+        if (seq > this.seq + 1) {
+            console.warn('Missed broadcasts', this.seq + 1, 'to', seq - 1);
+            this.resync(true);
+        }
+        return false;
+    }
+
+    // Asks for the broadcasts missed since the last one seen, or for a whole snapshot.
+    resync(replay) {
+        if (this.resyncing) {
+            return;
+        }
+        this.resyncing = true;
+        let payload = replay ? {epoch: this.epoch, seq: this.seq} : {};
+        this.socket.send(JSON.stringify({type: 'resync', payload: payload}));
+    }
+
+    handleMessage(data) {
         let type = data.type;
         let payload = data.payload;
 
+        if (data.seq !== undefined && !this.inSequence(data.seq)) {
+            return;
+        }
+
+        if (type == 'ping') {
+            this.socket.send(JSON.stringify({
+                type: 'pong',
+                payload: {id: payload.id, time: performance.now() / 1000}
+            }));
+            return;
+        }
+
         switch (type) {
+            case 'batch':
+                payload.forEach( message => this.handleMessage(message) );
+                return;
+            case 'snapshot':
+                this.epoch = payload.epoch;
+                this.seq = payload.seq;
+                this.resyncing = false;
+                payload.messages.forEach( message => this.handleMessage(message) );
+                return;
             case 'set view':
                 this.renderer.renderView(payload);
                 break;
+            case 'board patch':
+                if (!this.renderer.patchBoard(payload)) {
+                    this.resync(false);
+                }
+                break;
             case 'buzz event':
-                this.renderer.renderBuzzArea(payload);
+                this.renderer.updateBuzz(payload);
+                break;
+            case 'leaderboard':
+                this.renderer.updateLeaderboard(payload);
+                break;
+            case 'answer round':
+                this.renderer.renderAnswerRound(payload);
+                break;
+            case 'answer summary':
+                this.renderer.renderAnswerSummary(payload);
+                break;
+            case 'roster':
+                this.renderer.setRoster(payload.players);
+                break;
+            case 'roster update':
+                this.renderer.patchRoster(payload);
+                break;
+            case 'presence':
+                this.renderer.renderPresence(payload);
+                break;
+            case 'poll':
+                this.renderer.renderPoll(payload);
+                break;
+            case 'poll histogram':
+                this.renderer.renderPollHistogram(payload);
+                break;
+            case 'team standings':
+                this.renderer.renderTeams(payload);
+                break;
+            case 'rank':
+                this.renderer.renderRank(payload);
                 break;
             case 'player update':
                 this.renderer.renderPlayerInfo(payload);
                 break;
+            case 'reconnect':
+                this.reconnectAfter = payload.after;
+                break;
             case 'info':
                 console.log('Server Message:', payload);
                 break;
@@ -73,7 +204,7 @@ export class LiveQuizWebsocket {
                 console.warn('The quiz has been destroyed!');
                 this.renderer.renderTemplate('terminated-quiz-template');
             default:
-                console.error('Unmatched message', type, e.data);
+                console.error('Unmatched message', type, data);
         }
         this.lastMessage = data;
     }
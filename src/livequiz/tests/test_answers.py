@@ -0,0 +1,33 @@
+from django.test import TestCase
+
+from livequiz.answers import AnswerRound, normalize
+
+
+class TestNormalize(TestCase):
+    def test_case_punctuation_and_spacing_ignored(self):
+        self.assertEqual(normalize('  The  Eiffel Tower!'), normalize('the eiffel tower'))
+
+    def test_compatibility_forms_match(self):
+        self.assertEqual(normalize('Ｐａｒｉｓ'), normalize('paris'))
+
+    def test_different_answers_differ(self):
+        self.assertNotEqual(normalize('Paris'), normalize('Lyon'))
+
+
+class TestAnswerRound(TestCase):
+    def setUp(self):
+        self.answers = AnswerRound(1)
+
+    def test_matching_answers_grouped(self):
+        self.answers.add('a', 'Paris')
+        self.answers.add('b', 'paris.')
+        self.answers.add('c', 'Lyon')
+
+        self.assertEqual(self.answers.summary(), [['Paris', 2], ['Lyon', 1]])
+        self.assertEqual(self.answers.total, 3)
+
+    def test_players_answer_once(self):
+        self.answers.add('a', 'Paris')
+
+        self.assertTrue(self.answers.has_answered('a'))
+        self.assertFalse(self.answers.has_answered('b'))
@@ -0,0 +1,62 @@
+from base64 import b64decode
+from typing import NamedTuple
+
+from django.test import SimpleTestCase
+
+import livequiz.board as module
+
+
+class Question(NamedTuple):
+    pk: int
+    value: int
+
+
+class TestBitmap(SimpleTestCase):
+    def test_bits_are_set_in_order(self):
+        bits = module.get_bitmap([0, 9, 11], 12)
+
+        self.assertEqual(bits, bytearray([0b00000001, 0b00001010]))
+
+    def test_set_bits_adds_to_bitmap(self):
+        bits = module.get_bitmap([0], 8)
+        module.set_bits(bits, [7])
+
+        self.assertEqual(bits, bytearray([0b10000001]))
+
+    def test_encoded_as_base64(self):
+        bits = module.get_bitmap(range(60), 60)
+
+        self.assertEqual(b64decode(module.encode_bitmap(bits)), bytes(bits))
+
+
+class TestRenderBoard(SimpleTestCase):
+    categories = {
+        'Poetry': [Question(7, 100)],
+        'Math': [Question(3, 200), Question(5, 400)],
+    }
+
+    def test_columns(self):
+        board = module.render_board(self.categories, {3})
+
+        self.assertEqual(board, {
+            'categories': ['Poetry', 'Math'],
+            'sizes': [1, 2],
+            'ids': [7, 3, 5],
+            'values': [100, 200, 400],
+            'answered': module.encode_bitmap(module.get_bitmap([1], 3))
+        })
+
+    def test_positions_follow_board_order(self):
+        self.assertEqual(module.get_positions(self.categories), {7: 0, 3: 1, 5: 2})
+
+    def test_large_board_stays_small(self):
+        categories = {
+            f'Category {category}': [
+                Question(category * 10 + row, (row + 1) * 100) for row in range(10)
+            ]
+            for category in range(10)
+        }
+
+        board = module.render_board(categories, set(range(0, 100, 3)))
+
+        self.assertEqual(len(b64decode(board['answered'])), 13)
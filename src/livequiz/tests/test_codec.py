@@ -0,0 +1,59 @@
+import importlib
+import sys
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+import livequiz.codec as module
+
+MESSAGE = {'type': 'set view', 'payload': {'view': 'question', 'data': {'id': 3, 'text': 'Où?'}}}
+
+
+class CodecTests:
+    '''The same behaviour whichever JSON library the codec ended up with.'''
+
+    def test_round_trip(self):
+        self.assertEqual(module.loads(module.dumps(MESSAGE)), MESSAGE)
+        self.assertEqual(module.loads(module.dumpb(MESSAGE)), MESSAGE)
+
+    def test_compact_and_not_escaped(self):
+        self.assertEqual(module.dumps({'a': [1, 'é']}), '{"a":[1,"é"]}')
+
+    def test_bytes_are_utf8(self):
+        self.assertEqual(module.dumpb({'a': 'é'}), '{"a":"é"}'.encode())
+
+    def test_integer_keys_become_strings(self):
+        self.assertEqual(module.loads(module.dumps({1: 'a'})), {'1': 'a'})
+
+    def test_invalid_json_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            module.loads('{"a":')
+
+    def test_msgpack_round_trip(self):
+        self.assertEqual(module.unpackb(module.packb(MESSAGE)), MESSAGE)
+
+
+class TestCodec(CodecTests, SimpleTestCase):
+    pass
+
+
+class TestStandardLibraryCodec(CodecTests, SimpleTestCase):
+    def setUp(self):
+        with patch.dict(sys.modules, {'orjson': None}):
+            importlib.reload(module)
+        self.addCleanup(importlib.reload, module)
+
+    def test_falls_back_without_orjson(self):
+        self.assertEqual(module.NAME, 'json')
+
+
+class TestCodecWithoutMsgpack(SimpleTestCase):
+    def setUp(self):
+        with patch.dict(sys.modules, {'msgpack': None}):
+            importlib.reload(module)
+        self.addCleanup(importlib.reload, module)
+
+    def test_has_no_msgpack(self):
+        self.assertIsNone(module.packb)
+        self.assertIsNone(module.unpackb)
+        self.assertEqual(module.loads(module.dumps(MESSAGE)), MESSAGE)
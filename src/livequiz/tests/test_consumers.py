@@ -1,4 +1,5 @@
-from unittest.mock import patch
+import asyncio
+from unittest.mock import AsyncMock, patch
 
 from asgiref.sync import async_to_sync
 from channels.auth import AuthMiddlewareStack, login
@@ -10,8 +11,15 @@ from django.urls import re_path
 from django.test import TestCase
 
 from quiz.models import QuizModel
-from livequiz.consumers import LiveQuizConsumer, LiveQuizHostConsumer
+from livequiz.drain import RECONNECT_AFTER, SERVICE_RESTART, drain
+from livequiz.engine import engine
+from livequiz.ratelimit import RATE_LIMITS
+from livequiz import codec
+from livequiz.consumers import (JSON_SUBPROTOCOL, MSGPACK_SUBPROTOCOL, LiveQuizConsumer,
+                                LiveQuizHostConsumer)
 from livequiz.models import LiveQuizModel, QuizData
+import livequiz.consumers as consumers
+from livequiz.outbox import MAX_QUEUED, TRY_AGAIN_LATER
 
 
 class LiveQuizConsumerTestCase(TestCase):
@@ -28,12 +36,13 @@ class LiveQuizConsumerTestCase(TestCase):
         
         return LiveQuizModel.objects.create_for_quiz(owner, QuizData(name='A Quiz', categories={})).code
 
-    async def connect_with_code(self, code='ABCDE'):
+    async def connect_with_code(self, code='ABCDE', subprotocols=None, query=''):
         self.communicator = WebsocketCommunicator(
             self.application,
-            f'/testws/{code}/'
+            f'/testws/{code}/{query}',
+            subprotocols=subprotocols
         )
-        await self.communicator.connect()
+        return await self.communicator.connect()
 
     def tearDown(self):
         async_to_sync(self.communicator.disconnect)()
@@ -45,6 +54,7 @@ class LiveQuizConsumerTestCase(TestCase):
             msg['type'],
             f'Expected the message type to be {msg_type} in msg {msg}'
         )
+        return msg
 
 
 class TestGenericLiveQuizConsumer(LiveQuizConsumerTestCase):
@@ -75,15 +85,31 @@ class TestGenericLiveQuizConsumer(LiveQuizConsumerTestCase):
         await self.connect_with_code(quiz_code)
 
         await self.assertMessageType('info')
-        await self.assertMessageType('set view')
+        msg = await self.communicator.receive_json_from()
+        self.assertEqual(msg['type'], 'snapshot')
+        self.assertEqual(
+            [message['type'] for message in msg['payload']['messages']],
+            ['set view', 'buzz event', 'team standings', 'leaderboard']
+        )
+
+    async def test_resync_sends_snapshot(self):
+        quiz_code = await self.add_quiz_info()
+        await self.connect_with_code(quiz_code)
+        for _ in range(2):
+            await self.communicator.receive_json_from()
+
+        await self.communicator.send_json_to({'type': 'resync', 'payload': {}})
+
+        msg = await self.communicator.receive_json_from()
+        self.assertEqual(msg['type'], 'snapshot')
+        self.assertEqual(msg['payload']['seq'], engine.get_loaded_state(quiz_code).seq)
 
     async def test_sends_terminate_when_quiz_killed(self):
         quiz_code = await self.add_quiz_info()
 
         await self.connect_with_code(quiz_code)
         await self.communicator.receive_json_from()  # Connect successfully
-        await self.communicator.receive_json_from()  # Set the view
-        await self.communicator.receive_json_from()  # Update buzz event
+        await self.communicator.receive_json_from()  # Snapshot of the quiz
 
         await database_sync_to_async(
             lambda code: LiveQuizModel.objects.filter(code=code).delete()
@@ -91,6 +117,202 @@ class TestGenericLiveQuizConsumer(LiveQuizConsumerTestCase):
 
         await self.assertMessageType('terminated')
 
+    async def test_flooding_is_answered_once_and_counted(self):
+        quiz_code = await self.add_quiz_info()
+        await self.connect_with_code(quiz_code)
+        for _ in range(2):
+            await self.communicator.receive_json_from()
+
+        _, burst = RATE_LIMITS['pong']
+        for ping_id in range(burst + 3):
+            await self.communicator.send_json_to({'type': 'pong', 'payload': {'id': ping_id}})
+
+        await self.assertMessageType('error')
+        self.assertTrue(await self.communicator.receive_nothing())
+        state = engine.get_loaded_state(quiz_code)
+        self.assertEqual(state.dropped_messages['pong'], 3)
+
+    async def test_reconnect_replays_missed_broadcasts(self):
+        quiz_code = await self.add_quiz_info()
+        await self.connect_with_code(quiz_code)
+        await self.communicator.receive_json_from()
+        snapshot = (await self.communicator.receive_json_from())['payload']
+        await self.communicator.disconnect()
+
+        state = engine.get_loaded_state(quiz_code)
+        await state.broadcast(state.get_buzz_message())
+        await state.broadcast(state.get_team_standings_message())
+
+        await self.connect_with_code(
+            quiz_code, query=f'?epoch={snapshot["epoch"]}&seq={snapshot["seq"]}')
+        await self.assertMessageType('info')
+        await self.assertMessageType('buzz event')
+        await self.assertMessageType('team standings')
+        self.assertTrue(await self.communicator.receive_nothing())
+
+    async def test_reconnect_from_another_epoch_gets_snapshot(self):
+        quiz_code = await self.add_quiz_info()
+
+        await self.connect_with_code(quiz_code, query='?epoch=gone&seq=3')
+
+        await self.assertMessageType('info')
+        await self.assertMessageType('snapshot')
+
+    async def test_slow_socket_gets_snapshot_instead_of_backlog(self):
+        quiz_code = await self.add_quiz_info()
+        await self.connect_with_code(quiz_code)
+        for _ in range(2):
+            await self.communicator.receive_json_from()
+        state = engine.get_loaded_state(quiz_code)
+
+        gate = asyncio.Event()
+        send = LiveQuizConsumer.send
+
+        async def slow_send(consumer, *args, **kwargs):
+            await gate.wait()
+            await send(consumer, *args, **kwargs)
+
+        with patch.object(LiveQuizConsumer, 'send', slow_send):
+            for _ in range(MAX_QUEUED + 5):
+                await state.broadcast(state.get_buzz_message())
+            await asyncio.sleep(0.1)
+            self.assertEqual(len(state.lagging_sockets), 1)
+            gate.set()
+
+            first = await self.communicator.receive_json_from()
+            snapshot = await self.communicator.receive_json_from()
+
+        self.assertEqual(first['seq'], 1)
+        self.assertEqual(snapshot['type'], 'snapshot')
+        self.assertEqual(snapshot['payload']['seq'], state.seq)
+        self.assertTrue(await self.communicator.receive_nothing())
+        self.assertEqual(state.lagging_sockets, {})
+
+    async def test_msgpack_subprotocol_sends_binary_frames(self):
+        quiz_code = await self.add_quiz_info()
+
+        connected = await self.connect_with_code(
+            quiz_code, [MSGPACK_SUBPROTOCOL, JSON_SUBPROTOCOL])
+        self.assertEqual(connected, (True, MSGPACK_SUBPROTOCOL))
+
+        frames = [await self.communicator.receive_output() for _ in range(2)]
+        self.assertTrue(all('text' not in frame for frame in frames))
+        self.assertEqual([codec.unpackb(frame['bytes'])['type'] for frame in frames],
+                         ['info', 'snapshot'])
+
+        _, burst = RATE_LIMITS['pong']
+        for ping_id in range(burst + 1):
+            await self.communicator.send_to(
+                bytes_data=codec.packb({'type': 'pong', 'payload': {'id': ping_id}}))
+
+        error = codec.unpackb(await self.communicator.receive_from())
+        self.assertEqual(error['type'], 'error')
+
+    async def test_json_subprotocol_sends_text_frames(self):
+        quiz_code = await self.add_quiz_info()
+
+        connected = await self.connect_with_code(quiz_code, [JSON_SUBPROTOCOL])
+        self.assertEqual(connected, (True, JSON_SUBPROTOCOL))
+
+        await self.assertMessageType('info')
+        await self.assertMessageType('snapshot')
+
+    def quick_heartbeats(self):
+        for name, value in [('FIRST_PING_DELAY', 0.01),
+                            ('ping_interval', lambda sockets: 0.1),
+                            ('idle_timeout', lambda interval: 0.3)]:
+            patcher = patch.object(consumers, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_silent_socket_goes_idle_then_is_closed(self):
+        self.quick_heartbeats()
+        quiz_code = await self.add_quiz_info()
+
+        with patch.object(LiveQuizConsumer, 'on_idle', AsyncMock()) as on_idle:
+            await self.connect_with_code(quiz_code)
+            messages = []
+            while (output := await self.communicator.receive_output(1))['type'] == 'websocket.send':
+                messages.append(codec.loads(output['text'])['type'])
+
+        self.assertEqual(messages[:3], ['info', 'snapshot', 'ping'])
+        self.assertEqual(output, {'type': 'websocket.close', 'code': TRY_AGAIN_LATER})
+        on_idle.assert_awaited_once_with(True)
+
+    async def test_answering_heartbeats_keeps_socket_open(self):
+        self.quick_heartbeats()
+        quiz_code = await self.add_quiz_info()
+        await self.connect_with_code(quiz_code)
+        for _ in range(2):
+            await self.communicator.receive_json_from()
+
+        _, burst = RATE_LIMITS['pong']
+        for _ in range(burst):
+            ping = await self.communicator.receive_json_from()
+            self.assertEqual(ping['type'], 'ping')
+            await self.communicator.send_json_to(
+                {'type': 'pong', 'payload': {'id': ping['payload']['id']}})
+
+    async def test_socket_missing_heartbeat_gets_snapshot_once_it_answers(self):
+        self.quick_heartbeats()
+        patcher = patch.object(consumers, 'idle_timeout', lambda interval: 5.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        quiz_code = await self.add_quiz_info()
+        await self.connect_with_code(quiz_code)
+        for _ in range(2):
+            await self.communicator.receive_json_from()
+        state = engine.get_loaded_state(quiz_code)
+
+        ping = await self.communicator.receive_json_from()
+        await asyncio.sleep(0.2)
+        for _ in range(MAX_QUEUED + 5):
+            await state.broadcast(state.get_buzz_message())
+
+        self.assertTrue(await self.communicator.receive_nothing(0.2))
+        self.assertEqual(len(state.lagging_sockets), 1)
+
+        await self.communicator.send_json_to(
+            {'type': 'pong', 'payload': {'id': ping['payload']['id']}})
+        snapshot = await self.assertMessageType('snapshot')
+
+        self.assertEqual(snapshot['payload']['seq'], state.seq)
+        self.assertEqual(state.lagging_sockets, {})
+
+    async def test_drain_closes_every_socket_before_exiting(self):
+        quiz_code = await self.add_quiz_info()
+        await self.connect_with_code(quiz_code)
+        for _ in range(2):
+            await self.communicator.receive_json_from()
+        socket = next(iter(drain.sockets))
+        # As if the client missed a heartbeat.
+        socket.outbox.hold()
+
+        exited = []
+        with patch.object(drain, 'draining', False), \
+                patch.object(drain, '_previous', lambda *_: exited.append(len(socket.outbox))), \
+                patch.object(drain, 'engine', AsyncMock()):
+            await drain.drain()
+
+        self.assertEqual(exited, [0])
+        msg = await self.communicator.receive_json_from()
+        closed = await self.communicator.receive_output()
+        self.assertEqual(msg['type'], 'reconnect')
+        self.assertEqual(closed, {'type': 'websocket.close', 'code': SERVICE_RESTART})
+
+    async def test_draining_worker_sends_reconnect_hint(self):
+        quiz_code = await self.add_quiz_info()
+
+        with patch.object(drain, 'draining', True):
+            await self.connect_with_code(quiz_code)
+
+            msg = await self.communicator.receive_json_from()
+            closed = await self.communicator.receive_output()
+
+        self.assertEqual(msg['type'], 'reconnect')
+        self.assertGreaterEqual(msg['payload']['after'], RECONNECT_AFTER[0])
+        self.assertEqual(closed, {'type': 'websocket.close', 'code': SERVICE_RESTART})
+
 
 class TestHostConsumer(LiveQuizConsumerTestCase):
     def setUp(self):
@@ -134,3 +356,56 @@ class TestHostConsumer(LiveQuizConsumerTestCase):
         await self.login_connect(user, quiz_code)
 
         await self.assertMessageType('info')
+
+    async def test_host_commands_are_broadcast(self):
+        user = await self.add_user_info()
+        quiz_code = await self.add_quiz_info(user)
+        await self.login_connect(user, quiz_code)
+
+        await self.assertMessageType('info')
+        await self.assertMessageType('snapshot')
+        roster = await self.assertMessageType('roster')
+        self.assertEqual(roster['payload'], {'players': []})
+        presence = await self.assertMessageType('presence')
+        self.assertEqual(presence['payload'], {'connected': 0, 'idle': 0})
+
+        await self.communicator.send_json_to({'type': 'manage buzz', 'payload': {'action': 'start'}})
+
+        msg = await self.communicator.receive_json_from()
+        self.assertEqual(msg['payload'], {'status': 'open'})
+
+    async def connect_host(self):
+        user = await self.add_user_info()
+        quiz_code = await self.add_quiz_info(user)
+        await self.login_connect(user, quiz_code)
+        for _ in range(4):
+            await self.communicator.receive_json_from()
+
+    async def test_batch_is_broadcast_once(self):
+        await self.connect_host()
+
+        await self.communicator.send_json_to({'type': 'batch', 'payload': [
+            {'type': 'manage buzz', 'payload': {'action': 'start'}},
+            {'type': 'set view', 'payload': {'view': 'quiz_board', 'question_id': None}},
+            {'type': 'manage buzz', 'payload': {'action': 'end'}},
+        ]})
+
+        msg = await self.communicator.receive_json_from()
+        self.assertEqual(msg['type'], 'batch')
+        self.assertEqual(msg['seq'], 1)
+        self.assertEqual(
+            [(message['type'], message['payload'].get('status')) for message in msg['payload']],
+            [('set view', None), ('buzz event', 'none')]
+        )
+        self.assertTrue(await self.communicator.receive_nothing())
+
+    async def test_invalid_batch_is_rejected_whole(self):
+        await self.connect_host()
+
+        await self.communicator.send_json_to({'type': 'batch', 'payload': [
+            {'type': 'manage buzz', 'payload': {'action': 'start'}},
+            {'type': 'manage buzz', 'payload': {'action': 'explode'}},
+        ]})
+
+        await self.assertMessageType('error')
+        self.assertTrue(await self.communicator.receive_nothing())
@@ -0,0 +1,79 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from django.test import SimpleTestCase
+
+import livequiz.drain as module
+
+
+class FakeSocket:
+    def __init__(self, events, write=None):
+        self.events = events
+        self.write = write
+
+    async def reconnect_later(self, delay):
+        self.events.append(('reconnect', delay))
+
+    async def written(self):
+        if self.write is not None:
+            await self.write
+        self.events.append('closed')
+
+
+class TestDrain(SimpleTestCase):
+    def setUp(self):
+        self.events = []
+        self.engine = AsyncMock()
+        self.engine.drain.side_effect = lambda: self.events.append('written')
+        self.drain = module.Drain(self.engine)
+
+    async def test_sockets_are_told_to_reconnect_before_writing(self):
+        self.drain.sockets.update({FakeSocket(self.events), FakeSocket(self.events)})
+
+        await self.drain.drain()
+
+        self.assertTrue(self.drain.draining)
+        self.assertEqual(self.events[2:], ['closed', 'closed', 'written'])
+        for _, delay in self.events[:2]:
+            self.assertGreaterEqual(delay, module.RECONNECT_AFTER[0])
+            self.assertLessEqual(delay, module.RECONNECT_AFTER[1])
+
+    async def test_waits_for_sockets_to_close_but_not_forever(self):
+        self.drain._previous = lambda *_: self.events.append('exit')
+        never = asyncio.get_running_loop().create_future()
+        self.drain.sockets.add(FakeSocket(self.events, never))
+
+        with patch.object(module, 'CLOSE_TIMEOUT', 0.01):
+            await self.drain.drain()
+
+        self.assertEqual(self.events[1:], ['written', 'exit'])
+
+    async def test_drains_once(self):
+        await self.drain.drain()
+        await self.drain.drain()
+
+        self.engine.drain.assert_awaited_once()
+
+    async def test_exits_only_after_writing(self):
+        previous = lambda *_: self.events.append('exit')
+        self.drain._previous = previous
+
+        await self.drain.drain()
+
+        self.assertEqual(self.events, ['written', 'exit'])
+
+    async def test_exits_when_writing_fails(self):
+        self.drain._previous = lambda *_: self.events.append('exit')
+        self.engine.drain.side_effect = OSError
+
+        await self.drain.drain()
+
+        self.assertEqual(self.events, ['exit'])
+
+    async def test_exits_when_writing_times_out(self):
+        self.drain._previous = lambda *_: self.events.append('exit')
+
+        with patch.object(module, 'DRAIN_TIMEOUT', 0):
+            await self.drain.drain()
+
+        self.assertEqual(self.events, ['exit'])
@@ -0,0 +1,1349 @@
+import asyncio
+import json
+from collections import deque
+from tempfile import TemporaryDirectory
+from time import monotonic
+from unittest.mock import AsyncMock, Mock, patch
+
+from channels.db import database_sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+import livequiz.engine as module
+import livequiz.messages as messages
+import livequiz.responses as respond
+from livequiz.models import (
+    BuzzEvent, LiveQuizModel, LiveQuizParticipant, LiveQuizQuestion, LiveQuizResponse,
+    LiveQuizTeam, LiveQuizView, QuizData, render_view
+)
+from livequiz.snapshots import JOURNAL_FILE
+from livequiz.timers import TimerWheel
+
+
+class EngineTestCase(TestCase):
+    '''Creates a small quiz and a fresh engine for each test.'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='engine', password='room')
+        cls.quiz = LiveQuizModel.objects.create_for_quiz(
+            cls.user,
+            QuizData(name='Test', categories={
+                'Math': (
+                    (100, '1+1', '2'),
+                    (200, '2+2', '4', ('3', '4', '5')),
+                )
+            })
+        )
+        cls.q1 = LiveQuizQuestion.objects.get(question='1+1').pk
+        cls.q2 = LiveQuizQuestion.objects.get(question='2+2').pk
+        cls.player = LiveQuizParticipant.objects.register(cls.quiz)
+        cls.other = LiveQuizParticipant.objects.register(cls.quiz)
+
+    def setUp(self):
+        self.engine = module.LiveQuizEngine()
+
+        timers = patch.object(module, 'timers', TimerWheel())
+        timers.start()
+        self.addCleanup(timers.stop)
+
+    async def get_state(self):
+        state = await self.engine.get_state(self.quiz.code)
+        await state.submit(state.join, self.player, 'socket a')
+        await state.submit(state.join, self.other, 'socket b')
+        return state
+
+    async def settle(self, state):
+        return await state.submit(state.settle_buzz, state.buzz)
+
+    async def buzz(self, state, *player_ids):
+        '''Opens a window, buzzes in the given order and settles it.'''
+        await state.submit(state.start_buzz)
+        for player_id in player_ids:
+            await state.submit(state.buzz_in, player_id)
+        await self.settle(state)
+
+    async def handle_before(self, message, state, command):
+        '''
+        Handles message from self.player, running command right after the message's own
+        command as if it had raced it. Returns what was sent back to the player.
+        '''
+        socket = Mock(code=self.quiz.code, player_id=self.player.number, send_json=AsyncMock())
+        submit = state.submit
+
+        async def racing_submit(*args):
+            result = await submit(*args)
+            await submit(command)
+            return result
+
+        with patch.object(messages, 'engine', self.engine), \
+                patch.object(state, 'submit', racing_submit):
+            await message.handle_message(socket)
+
+        return [call.args[0] for call in socket.send_json.await_args_list]
+
+    @database_sync_to_async
+    def get_quiz(self):
+        return LiveQuizModel.objects.select_related('buzz_event').get(code=self.quiz.code)
+
+
+class TestLiveQuizEngineGetState(EngineTestCase):
+    async def test_missing_quiz_raises(self):
+        with self.assertRaises(LiveQuizModel.DoesNotExist):
+            await self.engine.get_state('NOPE')
+
+    async def test_state_is_cached(self):
+        first = await self.engine.get_state(self.quiz.code)
+        second = await self.engine.get_state(self.quiz.code)
+
+        self.assertIs(first, second)
+
+    async def test_state_loaded_from_model(self):
+        state = await self.engine.get_state(self.quiz.code)
+
+        self.assertEqual(state.host_id, self.user.pk)
+        self.assertEqual(state.last_view_command, self.quiz.last_view_command)
+        self.assertIn(self.player.number, state.players)
+
+    async def test_deleting_quiz_forgets_state(self):
+        state = await module.engine.get_state(self.quiz.code)
+        await database_sync_to_async(lambda: LiveQuizModel.objects.get(code=self.quiz.code).delete())()
+
+        self.assertIsNot(state, module.engine._states.get(self.quiz.code))
+
+
+class TestLiveQuizStateCommands(EngineTestCase):
+    async def test_commands_applied_in_order(self):
+        state = await self.get_state()
+        order = []
+
+        first = state.submit(order.append, 1)
+        second = state.submit(order.append, 2)
+        await second
+        await first
+
+        self.assertEqual(order, [1, 2])
+
+    async def test_command_errors_reach_submitter(self):
+        state = await self.get_state()
+
+        with self.assertRaises(LiveQuizQuestion.DoesNotExist):
+            await state.submit(state.set_view, LiveQuizView.QUESTION, -1)
+
+    async def test_set_view_matches_model(self):
+        state = await self.get_state()
+
+        result = await state.submit(state.set_view, LiveQuizView.ANSWER, self.q1)
+        expected = await database_sync_to_async(
+            lambda: LiveQuizModel.objects.get(code=self.quiz.code).set_view(
+                LiveQuizView.ANSWER, self.q1)
+        )()
+
+        self.assertEqual(result, expected)
+
+    async def test_mark_answered_hides_question(self):
+        state = await self.get_state()
+
+        result = await state.submit(state.mark_answered, self.q1)
+
+        self.assertEqual(result, {'type': 'board patch', 'payload': {'answered': [self.q1]}})
+        self.assertEqual(state.last_view_command['payload']['data']['answered'], 'AQ==')
+
+    async def test_patched_board_matches_a_rebuilt_one(self):
+        state = await self.get_state()
+        await state.submit(state.mark_answered, self.q1)
+        await state.submit(state.mark_answered, self.q2)
+        await state.submit(state.undo)
+
+        self.assertEqual(
+            state.last_view_command,
+            render_view(LiveQuizView.QUIZ_BOARD, state.categories, state.answered_questions)
+        )
+
+    async def test_first_buzz_waits_for_window_to_settle(self):
+        state = await self.get_state()
+        await state.submit(state.start_buzz)
+
+        self.assertIsNone(await state.submit(state.buzz_in, self.player.number))
+        self.assertIsNone(state.buzz_player)
+
+        result = await self.settle(state)
+
+        self.assertEqual(result['payload']['status'], 'closed')
+        self.assertEqual(result['payload']['id'], self.player.number)
+
+    async def test_window_settles_by_itself(self):
+        state = await self.get_state()
+        await state.submit(state.start_buzz)
+
+        with patch.object(module, 'BUZZ_TOLERANCE', 0.01), \
+                patch.object(module.LiveQuizState, 'broadcast') as broadcast:
+            await state.submit(state.buzz_in, self.player.number)
+            await asyncio.sleep(0.05)
+
+        self.assertEqual(state.buzz_player.id, self.player.number)
+        broadcast.assert_called_once_with(state.get_buzz_message(), None)
+
+    async def test_earlier_press_wins_while_settling(self):
+        state = await self.get_state()
+        await state.submit(state.start_buzz)
+        opened = state.buzz.opened_at
+
+        await state.submit(state.buzz_in, self.player.number, opened + 0.2)
+        await state.submit(state.buzz_in, self.other.number, opened + 0.1)
+        await self.settle(state)
+
+        self.assertEqual(state.buzz_player.id, self.other.number)
+
+    async def test_earlier_press_cannot_pass_settled_buzzer(self):
+        state = await self.get_state()
+        await state.submit(state.start_buzz)
+        await state.submit(state.buzz_in, self.player.number, monotonic())
+        await self.settle(state)
+
+        await state.submit(state.buzz_in, self.other.number, state.buzz.opened_at)
+
+        self.assertEqual(state.buzz_player.id, self.player.number)
+
+    async def test_each_player_buzzes_once(self):
+        state = await self.get_state()
+        await state.submit(state.start_buzz)
+
+        await asyncio.gather(*(
+            state.submit(state.buzz_in, self.player.number) for _ in range(50)
+        ))
+
+        self.assertEqual(len(state.buzz.queue), 1)
+
+    async def test_losing_buzz_does_not_touch_database(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number)
+
+        with patch.object(module, 'database_sync_to_async') as mock:
+            state = await self.engine.get_state(self.quiz.code)
+            self.assertFalse(state.can_buzz(self.player.number))
+            self.assertIsNone(await state.submit(state.buzz_in, self.player.number))
+
+            mock.assert_not_called()
+
+    async def test_later_buzzes_are_queued(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number)
+
+        result = await state.submit(state.buzz_in, self.other.number)
+
+        self.assertEqual(result['payload']['id'], self.player.number)
+        self.assertEqual(result['payload']['queued']['id'], self.other.number)
+        self.assertEqual(
+            [buzz['id'] for buzz in state.get_buzz_message()['payload']['queue']],
+            [self.other.number]
+        )
+
+    async def test_advance_moves_to_next_buzzer(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number, self.other.number)
+
+        result = await state.submit(state.advance_buzz)
+
+        self.assertEqual(result['payload']['status'], 'closed')
+        self.assertEqual(result['payload']['id'], self.other.number)
+        self.assertTrue(result['payload']['advanced'])
+
+    async def test_advance_past_last_buzzer_keeps_window_open(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number)
+
+        result = await state.submit(state.advance_buzz)
+
+        self.assertEqual(result['payload'], {'status': 'open', 'advanced': True})
+        self.assertIsNone(await state.submit(state.buzz_in, self.player.number))
+
+    async def test_question_reveals_answer_by_itself(self):
+        state = await self.get_state()
+
+        with patch.object(module.LiveQuizState, 'broadcast') as broadcast:
+            await state.submit(state.set_view, LiveQuizView.QUESTION, self.q1, 0.02)
+            await asyncio.sleep(0.1)
+
+        self.assertEqual(state.last_view_command['payload']['view'], 'answer')
+        broadcast.assert_called_once_with(state.last_view_command, None)
+
+    async def test_changing_view_cancels_reveal(self):
+        state = await self.get_state()
+
+        with patch.object(module.LiveQuizState, 'broadcast') as broadcast:
+            await state.submit(state.set_view, LiveQuizView.QUESTION, self.q1, 0.02)
+            await state.submit(state.set_view, LiveQuizView.QUIZ_BOARD)
+            await asyncio.sleep(0.1)
+
+        self.assertEqual(state.last_view_command['payload']['view'], 'quiz_board')
+        broadcast.assert_not_called()
+
+    async def test_stale_reveal_ignored(self):
+        state = await self.get_state()
+        await state.submit(state.set_view, LiveQuizView.QUESTION, self.q2)
+
+        self.assertIsNone(await state.submit(state.reveal_answer, self.q1))
+
+    async def test_buzz_closes_by_itself(self):
+        state = await self.get_state()
+
+        with patch.object(module.LiveQuizState, 'broadcast') as broadcast:
+            await state.submit(state.start_buzz, 0.02)
+            await asyncio.sleep(0.1)
+
+        self.assertIsNone(state.buzz)
+        broadcast.assert_called_once_with(state.get_buzz_message(), None)
+
+    async def test_restarting_buzz_resets_timer(self):
+        state = await self.get_state()
+
+        with patch.object(module.LiveQuizState, 'broadcast') as broadcast:
+            await state.submit(state.start_buzz, 0.02)
+            await state.submit(state.start_buzz)
+            await asyncio.sleep(0.1)
+
+        self.assertIsNotNone(state.buzz)
+        broadcast.assert_not_called()
+
+    async def test_buzz_ignored_when_closed(self):
+        state = await self.get_state()
+
+        self.assertIsNone(await state.submit(state.buzz_in, self.player.number))
+
+    async def test_reconnect_keeps_unsaved_name(self):
+        state = await self.get_state()
+        await state.submit(state.rename, self.player.number, 'Bob')
+
+        participant = await database_sync_to_async(
+            LiveQuizParticipant.objects.register
+        )(self.quiz, self.player.number)
+        player = await state.submit(state.join, participant, 'socket c')
+
+        self.assertEqual(player.name, 'Bob')
+        self.assertEqual(state.sockets[player.id], 'socket c')
+
+    async def test_leaving_forgets_socket_unless_replaced(self):
+        state = await self.get_state()
+        await state.submit(state.join, self.player, 'socket c')
+
+        await state.submit(state.leave, self.player.number, 'socket a')
+        await state.submit(state.leave, self.other.number, 'socket b')
+
+        self.assertEqual(state.sockets, {self.player.number: 'socket c'})
+        _, ranks = await state.submit(state.take_leaderboard_changes)
+        self.assertEqual([socket for socket, _ in ranks], ['socket c'])
+
+    async def test_hosts_get_one_roster_update_for_a_join_storm(self):
+        with patch.object(module, 'ROSTER_INTERVAL', 0.02), \
+                patch.object(module.LiveQuizState, 'broadcast') as broadcast:
+            state = await self.get_state()
+            await state.submit(state.rename, self.player.number, 'Bob')
+            await asyncio.sleep(0.1)
+
+        broadcast.assert_called_once()
+        message, group_name = broadcast.call_args.args
+        self.assertEqual(group_name, state.host_group_name)
+        self.assertEqual(message['payload'], {
+            'added': [[self.player.number, 'Bob'], [self.other.number, 'Anonymous']]
+        })
+
+    async def test_roster_sends_renames_and_leaves(self):
+        state = await self.get_state()
+        await state.submit(state.take_roster_changes)
+
+        await state.submit(state.rename, self.player.number, 'Bob')
+        await state.submit(state.leave, self.other.number, 'socket b')
+        message = await state.submit(state.take_roster_changes)
+
+        self.assertEqual(message['payload'], {
+            'renamed': [[self.player.number, 'Bob']],
+            'left': [self.other.number]
+        })
+        self.assertEqual(
+            state.get_roster_message()['payload'], {'players': [[self.player.number, 'Bob']]})
+        self.assertIsNone(await state.submit(state.take_roster_changes))
+
+    async def test_presence_counts_connected_and_idle_players(self):
+        state = await self.get_state()
+        await state.submit(state.set_idle, 'socket a', True)
+
+        self.assertEqual(state.get_presence_message()['payload'], {'connected': 2, 'idle': 1})
+        message = await state.submit(state.take_presence_changes)
+        self.assertEqual(message['payload'], {'connected': 2, 'idle': 1})
+
+        await state.submit(state.leave, self.player.number, 'socket a')
+        await state.submit(state.join, self.player, 'socket c')
+        message = await state.submit(state.take_presence_changes)
+        self.assertEqual(message['payload'], {'connected': 2, 'idle': 0})
+
+        await state.submit(state.set_idle, 'socket b', True)
+        await state.submit(state.set_idle, 'socket b', False)
+        self.assertIsNone(await state.submit(state.take_presence_changes))
+
+
+class TestLiveQuizStateScoring(EngineTestCase):
+    async def test_nobody_to_score(self):
+        state = await self.get_state()
+
+        self.assertIsNone(await state.submit(state.score_buzzer, 100))
+
+    async def test_award_defaults_to_question_value(self):
+        state = await self.get_state()
+        await state.submit(state.set_view, LiveQuizView.QUESTION, self.q2)
+        await self.buzz(state, self.player.number)
+
+        player = await state.submit(state.score_buzzer)
+
+        self.assertEqual(player.score, 200)
+
+    async def test_deduct(self):
+        state = await self.get_state()
+        await self.buzz(state, self.other.number)
+
+        player = await state.submit(state.score_buzzer, 50, True)
+
+        self.assertEqual(player.score, -50)
+
+    async def test_award_without_question_raises(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number)
+
+        with self.assertRaises(LiveQuizQuestion.DoesNotExist):
+            await state.submit(state.score_buzzer)
+
+    async def test_leaderboard_changes_only_hold_changed_entries(self):
+        state = await self.get_state()
+        await state.submit(state.take_leaderboard_changes)
+        await self.buzz(state, self.other.number)
+        await state.submit(state.score_buzzer, 100)
+
+        message, ranks = await state.submit(state.take_leaderboard_changes)
+
+        self.assertEqual(message['type'], 'leaderboard')
+        self.assertEqual(message['payload']['size'], 2)
+        self.assertEqual(
+            [entry['id'] for entry in message['payload']['entries']],
+            [self.other.number, self.player.number]
+        )
+        self.assertEqual(
+            sorted((socket, rank['payload']['rank']) for socket, rank in ranks),
+            [('socket a', 2), ('socket b', 1)]
+        )
+
+    async def test_unchanged_leaderboard_not_published(self):
+        state = await self.get_state()
+        await state.submit(state.take_leaderboard_changes)
+        await self.buzz(state, self.player.number)
+        await state.submit(state.score_buzzer, 100)
+        await state.submit(state.take_leaderboard_changes)
+
+        await state.submit(state.score_buzzer, 0)
+
+        self.assertEqual(await state.submit(state.take_leaderboard_changes), (None, []))
+
+    async def test_joining_player_gets_rank(self):
+        state = await self.get_state()
+
+        _, ranks = await state.submit(state.take_leaderboard_changes)
+
+        self.assertEqual(
+            sorted((socket, rank['payload']['rank']) for socket, rank in ranks),
+            [('socket a', 1), ('socket b', 2)]
+        )
+
+
+class TestLiveQuizStateTeams(EngineTestCase):
+    async def get_team_state(self):
+        '''Both players in one team, with team mode on.'''
+        state = await self.get_state()
+        team = await database_sync_to_async(LiveQuizTeam.objects.create)(
+            name='Red', quiz=self.quiz)
+        await state.submit(state.add_team, team)
+        await state.submit(state.set_team_mode, True)
+        await state.submit(state.join_team, self.player.number, team.pk)
+        await state.submit(state.join_team, self.other.number, team.pk)
+        return state, state.teams[team.pk]
+
+    async def test_first_buzz_locks_team(self):
+        state, _ = await self.get_team_state()
+        await self.buzz(state, self.player.number, self.other.number)
+
+        self.assertEqual(len(state.buzz.queue), 1)
+        self.assertFalse(state.can_buzz(self.other.number))
+        self.assertEqual(state.get_buzz_message()['payload']['team'], 'Red')
+
+    async def test_players_without_team_cannot_buzz(self):
+        state = await self.get_state()
+        await state.submit(state.set_team_mode, True)
+        await state.submit(state.start_buzz)
+
+        self.assertFalse(state.can_buzz(self.player.number))
+
+    async def test_scores_add_up_per_team(self):
+        state, team = await self.get_team_state()
+        await self.buzz(state, self.player.number)
+        await state.submit(state.score_buzzer, 100)
+        await state.submit(state.advance_buzz)
+        await self.buzz(state, self.other.number)
+        await state.submit(state.score_buzzer, 30, True)
+
+        self.assertEqual(team.score, 70)
+        self.assertEqual(team.members, 2)
+
+    async def test_switching_team_moves_points(self):
+        state, red = await self.get_team_state()
+        await self.buzz(state, self.player.number)
+        await state.submit(state.score_buzzer, 100)
+        blue = await database_sync_to_async(LiveQuizTeam.objects.create)(
+            name='Blue', quiz=self.quiz)
+        await state.submit(state.add_team, blue)
+
+        await state.submit(state.join_team, self.player.number, blue.pk)
+
+        self.assertEqual((red.score, red.members), (0, 1))
+        self.assertEqual(state.teams[blue.pk].score, 100)
+
+    async def test_unknown_team_raises(self):
+        state = await self.get_state()
+
+        with self.assertRaises(LiveQuizTeam.DoesNotExist):
+            await state.submit(state.join_team, self.player.number, -1)
+
+    async def test_standings_taken_once_per_change(self):
+        state, team = await self.get_team_state()
+
+        standings = await state.submit(state.take_team_standings)
+
+        self.assertEqual(standings['payload'], {'enabled': True, 'teams': [[team.pk, 'Red', 0, 2]]})
+        self.assertIsNone(await state.submit(state.take_team_standings))
+
+    async def test_teams_survive_flush_and_reload(self):
+        state, team = await self.get_team_state()
+        await self.buzz(state, self.player.number)
+        await state.submit(state.score_buzzer, 100)
+        await self.engine.flush()
+
+        self.engine.forget(self.quiz.code)
+        reloaded = await self.engine.get_state(self.quiz.code)
+
+        self.assertTrue(reloaded.team_mode)
+        self.assertEqual(reloaded.teams[team.pk].as_list(), [team.pk, 'Red', 100, 2])
+        self.assertIs(reloaded.players[self.player.number].team, reloaded.teams[team.pk])
+
+
+class TestLiveQuizStateAnswers(EngineTestCase):
+    async def get_answer_state(self):
+        state = await self.get_state()
+        await state.submit(state.set_view, LiveQuizView.QUESTION, self.q1)
+        await state.submit(state.start_answers)
+        return state
+
+    async def test_answers_need_question_on_screen(self):
+        state = await self.get_state()
+
+        with self.assertRaises(LiveQuizQuestion.DoesNotExist):
+            await state.submit(state.start_answers)
+
+    async def test_each_player_answers_once(self):
+        state = await self.get_answer_state()
+
+        self.assertEqual(
+            await state.submit(state.submit_answer, self.player.number, 'Two'), self.q1)
+        self.assertIsNone(await state.submit(state.submit_answer, self.player.number, 'Three'))
+        self.assertEqual(state.answers.total, 1)
+
+    async def test_answers_rejected_when_closed(self):
+        state = await self.get_state()
+
+        self.assertIsNone(await state.submit(state.submit_answer, self.player.number, 'Two'))
+
+    async def test_hosts_get_one_throttled_summary(self):
+        state = await self.get_answer_state()
+
+        with patch.object(module, 'SUMMARY_INTERVAL', 0.02), \
+                patch.object(module.LiveQuizState, 'broadcast') as broadcast:
+            await state.submit(state.submit_answer, self.player.number, 'two')
+            await state.submit(state.submit_answer, self.other.number, 'Two!')
+            await asyncio.sleep(0.1)
+
+        broadcast.assert_called_once()
+        message, group_name = broadcast.call_args.args
+        self.assertEqual(group_name, state.host_group_name)
+        self.assertEqual(message['payload']['groups'], [['two', 2]])
+
+    async def test_ack_names_question_after_round_ends(self):
+        state = await self.get_answer_state()
+
+        sent = await self.handle_before(
+            messages.SubmitAnswerMessage({'text': 'Two'}), state, state.end_answers)
+
+        self.assertEqual(sent, [respond.get_answer_round_message('submitted', self.q1)])
+
+    async def test_end_returns_final_summary(self):
+        state = await self.get_answer_state()
+        await state.submit(state.submit_answer, self.player.number, '2')
+
+        closed, summary = await state.submit(state.end_answers)
+
+        self.assertEqual(closed['payload'], {'status': 'closed', 'question': self.q1})
+        self.assertEqual(summary['payload']['total'], 1)
+        self.assertIsNone(state.answers)
+
+    async def test_answers_written_in_one_batch(self):
+        state = await self.get_answer_state()
+        await state.submit(state.submit_answer, self.player.number, 'Two')
+        await state.submit(state.submit_answer, self.other.number, 'two')
+
+        with patch.object(LiveQuizResponse.objects, 'bulk_create',
+                          wraps=LiveQuizResponse.objects.bulk_create) as bulk_create:
+            await self.engine.flush()
+
+        bulk_create.assert_called_once()
+        texts = await database_sync_to_async(
+            lambda: sorted(LiveQuizResponse.objects.values_list('text', flat=True))
+        )()
+        self.assertEqual(texts, ['Two', 'two'])
+
+
+class TestLiveQuizStatePolls(EngineTestCase):
+    async def get_poll_state(self):
+        state = await self.get_state()
+        await state.submit(state.set_view, LiveQuizView.QUESTION, self.q2)
+        await state.submit(state.start_poll)
+        return state
+
+    async def test_poll_needs_choices(self):
+        state = await self.get_state()
+        await state.submit(state.set_view, LiveQuizView.QUESTION, self.q1)
+
+        with self.assertRaises(ValueError):
+            await state.submit(state.start_poll)
+
+    async def test_poll_message_lists_choices(self):
+        state = await self.get_poll_state()
+
+        self.assertEqual(
+            state.get_poll_message()['payload'],
+            {'status': 'open', 'question': self.q2, 'choices': ['3', '4', '5']}
+        )
+
+    async def test_changed_vote_moves_count(self):
+        state = await self.get_poll_state()
+        await state.submit(state.vote, self.player.number, 0)
+        await state.submit(state.vote, self.other.number, 1)
+        await state.submit(state.vote, self.player.number, 1)
+
+        payload = state.get_histogram_message()['payload']
+
+        self.assertEqual(payload['counts'], [0, 2, 0])
+        self.assertEqual(payload['percentages'], [0.0, 100.0, 0.0])
+        self.assertEqual(payload['total'], 2)
+
+    async def test_hosts_get_one_throttled_histogram(self):
+        state = await self.get_poll_state()
+
+        with patch.object(module, 'HISTOGRAM_INTERVAL', 0.02), \
+                patch.object(module.LiveQuizState, 'broadcast') as broadcast:
+            await state.submit(state.vote, self.player.number, 0)
+            await state.submit(state.vote, self.other.number, 2)
+            await asyncio.sleep(0.1)
+
+        broadcast.assert_called_once()
+        message, group_name = broadcast.call_args.args
+        self.assertEqual(group_name, state.host_group_name)
+        self.assertEqual(message['payload']['counts'], [1, 0, 1])
+
+    async def test_failed_batch_keeps_histogram_coming(self):
+        state = await self.get_poll_state()
+
+        with patch.object(module, 'HISTOGRAM_INTERVAL', 0.02), \
+                patch.object(module.LiveQuizState, 'broadcast') as broadcast:
+            await state.submit(state.vote, self.player.number, 0)
+            with self.assertRaises(LiveQuizQuestion.DoesNotExist):
+                async with state.transaction():
+                    await state.submit(state.end_poll)
+                    await state.submit(state.set_view, LiveQuizView.QUESTION, -1)
+            await asyncio.sleep(0.1)
+
+        self.assertIsNotNone(state.poll)
+        message, group_name = broadcast.call_args.args
+        self.assertEqual(group_name, state.host_group_name)
+        self.assertEqual(message['payload']['counts'], [1, 0, 0])
+
+    async def test_reopened_poll_keeps_votes(self):
+        state = await self.get_poll_state()
+        await state.submit(state.vote, self.player.number, 2)
+        await state.submit(state.end_poll)
+
+        await state.submit(state.start_poll)
+
+        self.assertEqual(state.get_histogram_message()['payload']['counts'], [0, 0, 1])
+
+    async def test_votes_rejected_when_closed(self):
+        state = await self.get_state()
+
+        self.assertIsNone(await state.submit(state.vote, self.player.number, 0))
+
+    async def test_ack_names_question_after_poll_ends(self):
+        state = await self.get_poll_state()
+
+        sent = await self.handle_before(messages.VoteMessage({'choice': 1}), state, state.end_poll)
+
+        self.assertEqual(sent, [respond.get_poll_message('voted', self.q2, choice=1)])
+
+
+class TestSpawn(EngineTestCase):
+    async def test_task_is_kept_until_done(self):
+        tasks, gate = set(), asyncio.Event()
+
+        task = module.spawn(tasks, gate.wait())
+        self.assertEqual(tasks, {task})
+
+        gate.set()
+        await task
+        self.assertEqual(tasks, set())
+
+    async def test_failure_is_logged(self):
+        async def fail():
+            raise RuntimeError
+
+        with patch.object(module.LOG, 'error') as error:
+            task = module.spawn(set(), fail())
+            await asyncio.gather(task, return_exceptions=True)
+            await asyncio.sleep(0)
+
+        error.assert_called_once()
+
+    async def test_timer_task_is_kept_on_the_state(self):
+        state = await self.get_state()
+        gate = asyncio.Event()
+
+        async def broadcast(*args):
+            await gate.wait()
+
+        with patch.object(state, 'broadcast', AsyncMock(side_effect=broadcast)):
+            state._after(0, state.get_buzz_message)
+            await asyncio.sleep(0.05)
+            self.assertEqual(len(state._tasks), 1)
+
+            gate.set()
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(state._tasks, set())
+
+
+class TestCoalesce(TestCase):
+    def test_whole_state_message_replaces_earlier_ones(self):
+        board = {'type': 'set view', 'payload': {'view': 'quiz_board'}}
+        question = {'type': 'set view', 'payload': {'view': 'question'}}
+        buzz = {'type': 'buzz event', 'payload': {'status': 'none'}}
+
+        self.assertEqual(module.coalesce([question, buzz, board]), [buzz, board])
+
+    def test_incremental_buzz_updates_are_kept(self):
+        opened = {'type': 'buzz event', 'payload': {'status': 'open'}}
+        queued = {'type': 'buzz event', 'payload': {'status': 'open', 'queued': {}}}
+
+        self.assertEqual(module.coalesce([opened, queued]), [opened, queued])
+
+    def test_full_buzz_update_replaces_incremental_ones(self):
+        opened = {'type': 'buzz event', 'payload': {'status': 'open'}}
+        closed = {'type': 'buzz event', 'payload': {'status': 'none'}}
+
+        self.assertEqual(module.coalesce([opened, closed]), [closed])
+
+    def test_board_view_kept_for_the_patch_after_it(self):
+        board = {'type': 'set view', 'payload': {'view': 'quiz_board'}}
+        patch = {'type': 'board patch', 'payload': {'answered': [1]}}
+        question = {'type': 'set view', 'payload': {'view': 'question'}}
+
+        self.assertEqual(
+            module.coalesce([board, patch, question]), [board, patch, question])
+        self.assertEqual(module.coalesce([board, question, patch]), [board, question, patch])
+
+    def test_only_last_board_view_kept_for_patches(self):
+        old = {'type': 'set view', 'payload': {'view': 'quiz_board', 'data': 'old'}}
+        board = {'type': 'set view', 'payload': {'view': 'quiz_board', 'data': 'new'}}
+        patch = {'type': 'board patch', 'payload': {'answered': [1]}}
+        question = {'type': 'set view', 'payload': {'view': 'question'}}
+
+        self.assertEqual(
+            module.coalesce([old, patch, board, patch, question]),
+            [patch, board, patch, question]
+        )
+
+
+class TestLiveQuizStateBroadcast(EngineTestCase):
+    async def test_broadcast_carries_encoded_frame(self):
+        state = await self.get_state()
+        layer = AsyncMock()
+
+        with patch.object(module, 'get_channel_layer', return_value=layer):
+            await state.broadcast(state.get_buzz_message())
+
+        layer.group_send.assert_awaited_once()
+        group_name, event = layer.group_send.call_args.args
+        self.assertEqual(group_name, state.group_name)
+        self.assertEqual(json.loads(event['text']), {**state.get_buzz_message(), 'seq': 1})
+
+    async def test_only_broadcasts_to_everyone_are_numbered(self):
+        state = await self.get_state()
+        layer = AsyncMock()
+
+        with patch.object(module, 'get_channel_layer', return_value=layer):
+            await state.broadcast(state.get_buzz_message())
+            await state.broadcast(state.get_leaderboard_message(), state.host_group_name)
+            await state.broadcast(state.get_buzz_message())
+
+        seqs = [json.loads(call.args[1]['text']).get('seq')
+                for call in layer.group_send.call_args_list]
+        self.assertEqual(seqs, [1, None, 2])
+
+    async def test_coalescing_sends_only_what_still_matters(self):
+        state = await self.get_state()
+        layer = AsyncMock()
+
+        with patch.object(module, 'COALESCE_WINDOW', 0.03), \
+                patch.object(module, 'get_channel_layer', return_value=layer):
+            await state.broadcast(await state.submit(state.set_view, LiveQuizView.QUESTION, self.q1))
+            await state.broadcast(await state.submit(state.start_buzz))
+            await state.broadcast(await state.submit(state.set_view, LiveQuizView.ANSWER, self.q1))
+            await state.broadcast(await state.submit(state.end_buzz))
+            await state.broadcast(await state.submit(state.set_view, LiveQuizView.QUIZ_BOARD))
+            layer.group_send.assert_not_awaited()
+
+            await state.send_outbox()
+
+        layer.group_send.assert_awaited_once()
+        sent = json.loads(layer.group_send.call_args.args[1]['text'])
+        self.assertEqual(sent['seq'], 1)
+        self.assertEqual(
+            [message['type'] for message in sent['payload']],
+            ['buzz event', 'set view']
+        )
+        self.assertEqual(sent['payload'][1], state.last_view_command)
+        self.assertEqual(state.frames_saved, 4)
+
+    async def test_coalescing_window_sends_by_itself(self):
+        state = await self.get_state()
+        layer = AsyncMock()
+
+        with patch.object(module, 'COALESCE_WINDOW', 0.03), \
+                patch.object(module, 'get_channel_layer', return_value=layer):
+            await state.broadcast(state.get_buzz_message())
+            await state.broadcast(state.get_leaderboard_message(), state.host_group_name)
+            await asyncio.sleep(0.1)
+
+        self.assertEqual(
+            [call.args[0] for call in layer.group_send.call_args_list],
+            [state.group_name, state.host_group_name]
+        )
+        self.assertIsNone(state.outbox_timer)
+
+    async def test_snapshot_covers_coalesced_updates(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number, self.other.number)
+        layer = AsyncMock()
+
+        with patch.object(module, 'COALESCE_WINDOW', 0.03), \
+                patch.object(module, 'get_channel_layer', return_value=layer):
+            await state.broadcast(await state.submit(state.advance_buzz))
+            snapshot = json.loads((await state.get_snapshot_frame()).text)['payload']
+            replay = await state.frames_since(state.epoch, 0)
+
+        advanced = json.loads(layer.group_send.call_args.args[1]['text'])
+        self.assertTrue(advanced['payload']['advanced'])
+        self.assertEqual(snapshot['seq'], advanced['seq'])
+        self.assertEqual(json.loads(replay[-1].text), advanced)
+        self.assertEqual(state.outbox, {})
+
+    async def test_frames_since_replays_what_was_missed(self):
+        state = await self.get_state()
+        with patch.object(module, 'get_channel_layer', return_value=AsyncMock()):
+            for _ in range(3):
+                await state.broadcast(state.get_buzz_message())
+
+        self.assertEqual(
+            [json.loads(frame.text)['seq'] for frame in await state.frames_since(state.epoch, 1)],
+            [2, 3]
+        )
+        self.assertEqual(await state.frames_since(state.epoch, 3), [])
+        self.assertIsNone(await state.frames_since('another', 1))
+        self.assertIsNone(await state.frames_since(state.epoch, 4))
+
+    async def test_frames_since_needs_snapshot_once_rolled_over(self):
+        state = await self.get_state()
+        state.recent_frames = deque(maxlen=2)
+        with patch.object(module, 'get_channel_layer', return_value=AsyncMock()):
+            for _ in range(3):
+                await state.broadcast(state.get_buzz_message())
+
+        self.assertIsNone(await state.frames_since(state.epoch, 0))
+        self.assertEqual(len(await state.frames_since(state.epoch, 1)), 2)
+
+    async def test_snapshot_frame_is_encoded_once_per_broadcast(self):
+        state = await self.get_state()
+
+        first = await state.get_snapshot_frame()
+        self.assertIs(await state.get_snapshot_frame(), first)
+
+        await state.submit(state.set_view, LiveQuizView.QUESTION, self.q1)
+        with patch.object(module, 'get_channel_layer', return_value=AsyncMock()):
+            await state.broadcast(state.last_view_command)
+
+        snapshot = json.loads((await state.get_snapshot_frame()).text)
+        self.assertEqual(snapshot['payload']['seq'], 1)
+        self.assertEqual(snapshot['payload']['messages'][0], state.last_view_command)
+
+
+class TestLiveQuizStateTransaction(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.layer = AsyncMock()
+        layer = patch.object(module, 'get_channel_layer', return_value=self.layer)
+        layer.start()
+        self.addCleanup(layer.stop)
+
+    def sent(self):
+        return [json.loads(call.args[1]['text']) for call in self.layer.group_send.call_args_list]
+
+    async def test_broadcasts_once_at_the_end(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number)
+
+        async with state.transaction():
+            await state.broadcast(await state.submit(state.mark_answered, self.q1))
+            await state.broadcast(await state.submit(state.end_buzz))
+            self.assertEqual(self.sent(), [])
+
+        self.assertEqual(self.sent(), [{
+            'type': 'batch',
+            'payload': [
+                {'type': 'board patch', 'payload': {'answered': [self.q1]}},
+                state.get_buzz_message()
+            ],
+            'seq': 1
+        }])
+
+    async def test_single_message_is_sent_as_is(self):
+        state = await self.get_state()
+
+        async with state.transaction():
+            await state.broadcast(await state.submit(state.set_view, LiveQuizView.QUESTION, self.q1))
+            await state.broadcast(await state.submit(state.set_view, LiveQuizView.QUIZ_BOARD))
+
+        self.assertEqual(self.sent(), [{**state.last_view_command, 'seq': 1}])
+
+    async def test_board_is_sent_with_its_patch(self):
+        state = await self.get_state()
+
+        async with state.transaction():
+            board = await state.submit(state.set_view, LiveQuizView.QUIZ_BOARD)
+            await state.broadcast(board)
+            patch = await state.submit(state.mark_answered, self.q1)
+            await state.broadcast(patch)
+            await state.broadcast(
+                await state.submit(state.set_view, LiveQuizView.QUESTION, self.q2))
+
+        self.assertEqual(
+            self.sent()[0]['payload'], [board, patch, state.last_view_command])
+
+    async def test_other_commands_wait_for_the_transaction(self):
+        state = await self.get_state()
+
+        async def show_board():
+            return await state.submit(state.set_view, LiveQuizView.QUIZ_BOARD)
+
+        async with state.transaction():
+            await state.submit(state.mark_answered, self.q1)
+            other = asyncio.create_task(show_board())
+            await asyncio.sleep(0.01)
+            self.assertFalse(other.done())
+
+        await other
+        self.assertEqual(state.answered_questions, {self.q1})
+
+    async def test_failure_takes_everything_back(self):
+        state = await self.get_state()
+        board = await state.submit(state.set_view, LiveQuizView.QUIZ_BOARD)
+        await self.buzz(state, self.player.number)
+        window = state.buzz
+
+        with self.assertRaises(LiveQuizQuestion.DoesNotExist):
+            async with state.transaction():
+                await state.broadcast(await state.submit(state.mark_answered, self.q1))
+                await state.submit(state.end_buzz)
+                await state.submit(state.set_view, LiveQuizView.QUESTION, -1)
+
+        self.assertEqual(self.sent(), [])
+        self.assertEqual(state.answered_questions, frozenset())
+        self.assertEqual(state.last_view_command, board)
+        self.assertIs(state.buzz, window)
+
+    async def test_failed_batch_takes_back_teams_and_ranks(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number)
+        socket = Mock(code=self.quiz.code)
+
+        with patch.object(messages, 'engine', self.engine), \
+                self.assertRaises(LiveQuizQuestion.DoesNotExist):
+            await messages.ClientMessage.handle_batch(socket, [
+                {'type': 'score buzzer', 'payload': {'action': 'award', 'points': 100}},
+                {'type': 'manage teams', 'payload': {'action': 'create', 'name': 'Owls'}},
+                {'type': 'set view', 'payload': {'view': 'question', 'question_id': -1}},
+            ], is_host=True)
+
+        self.assertEqual(self.sent(), [])
+        self.layer.send.assert_not_called()
+        self.assertEqual(state.teams, {})
+        self.assertEqual(state.players[self.player.number].score, 0)
+        self.assertEqual(await database_sync_to_async(LiveQuizTeam.objects.count)(), 0)
+
+    async def test_ranks_are_sent_after_the_batch(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number)
+
+        async with state.transaction():
+            await state.submit(state.score_buzzer, 100, False)
+            await state.publish_scores()
+            self.layer.send.assert_not_called()
+
+        self.layer.send.assert_any_await('socket a', {
+            'type': 'send.generic.message',
+            'data': state.get_rank_message(state.players[self.player.number])
+        })
+
+    async def test_history_gets_one_entry(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number)
+        depth = len(state.history.undo_stack)
+
+        async with state.transaction():
+            await state.submit(state.mark_answered, self.q1)
+            await state.submit(state.end_buzz)
+
+        self.assertEqual(len(state.history.undo_stack), depth + 1)
+        await state.submit(state.undo)
+        self.assertEqual(state.answered_questions, frozenset())
+        self.assertEqual(state.buzz_player.id, self.player.number)
+
+    async def test_flush_waits_for_the_transaction(self):
+        state = await self.get_state()
+
+        async with state.transaction():
+            await state.submit(state.mark_answered, self.q1)
+            await self.engine.flush()
+            self.assertEqual((await self.get_quiz()).answered_questions, [])
+
+        await self.engine.flush()
+        self.assertEqual((await self.get_quiz()).answered_questions, [self.q1])
+
+
+class TestLiveQuizStateHistory(EngineTestCase):
+    async def test_undo_mark_answered(self):
+        state = await self.get_state()
+        board = await state.submit(state.set_view, LiveQuizView.QUIZ_BOARD)
+        await state.submit(state.mark_answered, self.q1)
+
+        messages = await state.submit(state.undo)
+
+        self.assertEqual(messages, [board])
+        self.assertEqual(state.answered_questions, frozenset())
+
+    async def test_entries_share_previous_values(self):
+        state = await self.get_state()
+        board = await state.submit(state.set_view, LiveQuizView.QUIZ_BOARD)
+        answered = state.answered_questions
+        await state.submit(state.mark_answered, self.q1)
+
+        self.assertEqual(
+            state.history.undo_stack[-1],
+            (('answered', answered), ('view', board))
+        )
+        self.assertIs(state.history.undo_stack[-1][1][1], board)
+
+    async def test_undo_score(self):
+        state = await self.get_state()
+        await self.buzz(state, self.other.number)
+        await state.submit(state.score_buzzer, 100)
+        await state.submit(state.take_leaderboard_changes)
+
+        messages = await state.submit(state.undo)
+        leaderboard, _ = await state.submit(state.take_leaderboard_changes)
+
+        self.assertEqual(messages, [])
+        self.assertEqual(state.players[self.other.number].score, 0)
+        self.assertEqual(leaderboard['payload']['entries'][0]['id'], self.player.number)
+
+    async def test_undo_advance_restores_buzzer(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number, self.other.number)
+        await state.submit(state.advance_buzz)
+
+        messages = await state.submit(state.undo)
+
+        self.assertEqual(state.buzz_player.id, self.player.number)
+        self.assertEqual(messages, [state.get_buzz_message()])
+
+    async def test_undo_end_buzz_reopens_window(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number)
+        await state.submit(state.end_buzz)
+
+        await state.submit(state.undo)
+
+        self.assertEqual(state.buzz_player.id, self.player.number)
+
+    async def test_redo_after_undo(self):
+        state = await self.get_state()
+        await state.submit(state.mark_answered, self.q1)
+        await state.submit(state.undo)
+
+        messages = await state.submit(state.redo)
+
+        self.assertEqual(state.answered_questions, {self.q1})
+        self.assertEqual(messages, [state.last_view_command])
+
+    async def test_nothing_to_undo(self):
+        state = await self.get_state()
+
+        self.assertEqual(await state.submit(state.undo), [])
+
+
+class TestLiveQuizEngineSnapshots(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.engine = self.restart()
+
+    def restart(self):
+        engine = module.LiveQuizEngine(self.directory)
+        self.addCleanup(engine.snapshots.close)
+        return engine
+
+    async def test_significant_change_is_snapshotted_straight_away(self):
+        state = await self.get_state()
+        await self.buzz(state, self.other.number, self.player.number)
+        await asyncio.sleep(0)
+
+        snapshot = self.engine.snapshots.get(self.quiz.code)
+
+        self.assertEqual(snapshot['buzz'][0], True)
+        self.assertEqual([pk for pk, _ in snapshot['buzz'][1]], [self.other.pk, self.player.pk])
+
+    async def test_restart_restores_state(self):
+        state = await self.get_state()
+        await self.buzz(state, self.other.number, self.player.number)
+        await state.submit(state.score_buzzer, 300)
+        await state.submit(state.rename, self.player.number, 'Renamed')
+        await state.submit(state.mark_answered, self.q1)
+        await self.engine.flush()
+
+        restored = await self.restart().get_state(self.quiz.code)
+
+        self.assertEqual(restored.answered_questions, {self.q1})
+        self.assertEqual(restored.last_view_command, state.last_view_command)
+        self.assertEqual(restored.players[self.player.number].name, 'Renamed')
+        self.assertEqual(restored.players[self.other.number].score, 300)
+        self.assertEqual(restored.buzz_player.pk, self.other.pk)
+        self.assertEqual(restored.get_buzz_message(), state.get_buzz_message())
+        self.assertEqual(restored.leaderboard.rank(restored.players[self.other.number]), 1)
+
+    async def test_restored_state_is_written_back(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number)
+        await state.submit(state.score_buzzer, 100)
+        self.engine.save_snapshots()
+
+        engine = self.restart()
+        await engine.get_state(self.quiz.code)
+        await engine.flush()
+
+        participant = await database_sync_to_async(LiveQuizParticipant.objects.get)(
+            pk=self.player.pk)
+        self.assertEqual(participant.score, 100)
+
+    async def test_drain_writes_snapshot_file(self):
+        state = await self.get_state()
+        await state.submit(state.mark_answered, self.q1)
+
+        await self.engine.drain()
+
+        self.assertFalse(self.engine.snapshots.compacting)
+        snapshots = self.restart().snapshots
+        snapshots.open()
+        self.assertEqual(snapshots.get(self.quiz.code)['answered'], [self.q1])
+        quiz = await self.get_quiz()
+        self.assertEqual(quiz.answered_questions, [self.q1])
+
+    async def test_unsettled_buzz_settles_on_restore(self):
+        state = await self.get_state()
+        await state.submit(state.start_buzz)
+        await state.submit(state.buzz_in, self.player.number)
+        # Taken for some other change, before the window settles.
+        self.engine.schedule_snapshot(state)
+        self.engine.save_snapshots()
+
+        restored = await self.restart().get_state(self.quiz.code)
+        await restored.submit(restored.join, self.other, 'socket b')
+        queued = await restored.submit(restored.buzz_in, self.other.number)
+
+        self.assertTrue(restored.buzz.settled)
+        self.assertEqual(restored.buzz_player.pk, self.player.pk)
+        self.assertEqual(queued['payload']['queued']['id'], self.other.number)
+
+    async def test_forgotten_quiz_is_not_restored(self):
+        state = await self.get_state()
+        await state.submit(state.mark_answered, self.q1)
+        self.engine.save_snapshots()
+        self.engine.forget(self.quiz.code)
+
+        restored = await self.restart().get_state(self.quiz.code)
+
+        self.assertEqual(restored.answered_questions, frozenset())
+
+    async def test_unreadable_snapshot_falls_back_to_database(self):
+        state = await self.get_state()
+        await state.submit(state.rename, self.player.number, 'Renamed')
+        self.engine.save_snapshots()
+        self.engine.snapshots.close()
+        with open(f'{self.directory}/{JOURNAL_FILE}', 'ab') as file:
+            file.write(self.quiz.code.encode() + b'\t{"view":\n')
+
+        restored = await self.restart().get_state(self.quiz.code)
+
+        self.assertEqual(restored.players[self.player.number].name, self.player.name)
+
+    async def test_unusable_snapshot_directory_falls_back_to_database(self):
+        with open(f'{self.directory}/file', 'w'):
+            pass
+        engine = module.LiveQuizEngine(f'{self.directory}/file/snapshots')
+
+        state = await engine.get_state(self.quiz.code)
+
+        self.assertEqual(state.code, self.quiz.code)
+        self.assertFalse(engine.snapshots.compacting)
+
+
+class TestLiveQuizEngineFlush(EngineTestCase):
+    async def test_nothing_written_before_flush(self):
+        state = await self.get_state()
+        await state.submit(state.mark_answered, self.q1)
+
+        quiz = await self.get_quiz()
+
+        self.assertEqual(quiz.answered_questions, [])
+
+    async def test_flush_writes_quiz(self):
+        state = await self.get_state()
+        await state.submit(state.mark_answered, self.q2)
+
+        await self.engine.flush()
+        quiz = await self.get_quiz()
+
+        self.assertEqual(quiz.answered_questions, [self.q2])
+        self.assertEqual(quiz.last_view_command, state.last_view_command)
+
+    async def test_flush_writes_players(self):
+        state = await self.get_state()
+        await state.submit(state.rename, self.player.number, 'Linda')
+
+        await self.engine.flush()
+
+        name = await database_sync_to_async(
+            lambda: LiveQuizParticipant.objects.get(pk=self.player.pk).name
+        )()
+        self.assertEqual(name, 'Linda')
+
+    async def test_flush_writes_scores(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number)
+        await state.submit(state.score_buzzer, 300)
+
+        await self.engine.flush()
+
+        score = await database_sync_to_async(
+            lambda: LiveQuizParticipant.objects.get(pk=self.player.pk).score
+        )()
+        self.assertEqual(score, 300)
+
+    async def test_flush_writes_buzz(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number)
+
+        await self.engine.flush()
+        quiz = await self.get_quiz()
+
+        self.assertEqual(quiz.buzz_event.player_id, self.player.pk)
+
+    async def test_flush_never_replaces_stored_winner(self):
+        state = await self.get_state()
+        await state.submit(state.start_buzz)
+        await self.engine.flush()
+
+        other = await database_sync_to_async(
+            LiveQuizParticipant.objects.register
+        )(self.quiz)
+        await database_sync_to_async(
+            lambda: BuzzEvent.objects.update(player=other)
+        )()
+
+        await state.submit(state.buzz_in, self.player.number)
+        await self.settle(state)
+        await self.engine.flush()
+        quiz = await self.get_quiz()
+
+        self.assertEqual(quiz.buzz_event.player_id, other.pk)
+
+    async def test_flush_writes_advanced_buzzer(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number, self.other.number)
+        await self.engine.flush()
+
+        await state.submit(state.advance_buzz)
+        await self.engine.flush()
+        quiz = await self.get_quiz()
+
+        self.assertEqual(quiz.buzz_event.player_id, self.other.pk)
+
+    async def test_flush_removes_ended_buzz(self):
+        state = await self.get_state()
+        await state.submit(state.start_buzz)
+        await self.engine.flush()
+        await state.submit(state.end_buzz)
+
+        await self.engine.flush()
+        quiz = await self.get_quiz()
+
+        self.assertIsNone(quiz.buzz_event)
+        self.assertEqual(await database_sync_to_async(BuzzEvent.objects.count)(), 0)
+
+    async def test_failed_flush_keeps_changes(self):
+        state = await self.get_state()
+        await self.buzz(state, self.player.number)
+        await state.submit(state.score_buzzer, 300)
+        await state.submit(state.mark_answered, self.q2)
+
+        with patch.object(module, 'write_changes', side_effect=RuntimeError):
+            await self.engine.flush()
+        await self.engine.flush()
+        quiz = await self.get_quiz()
+        score = await database_sync_to_async(
+            lambda: LiveQuizParticipant.objects.get(pk=self.player.pk).score
+        )()
+
+        self.assertEqual(quiz.answered_questions, [self.q2])
+        self.assertEqual(quiz.buzz_event.player_id, self.player.pk)
+        self.assertEqual(score, 300)
+
+    async def test_failed_flush_is_retried(self):
+        state = await self.get_state()
+        await state.submit(state.mark_answered, self.q2)
+
+        with patch.object(module, 'write_changes', side_effect=RuntimeError):
+            await self.engine.flush()
+
+        self.assertIs(self.engine._dirty[self.quiz.code], state)
+        self.assertIsNotNone(self.engine._flush_handle)
@@ -0,0 +1,81 @@
+from django.test import TestCase
+
+import livequiz.history as module
+
+
+class TestHistory(TestCase):
+    def setUp(self):
+        self.history = module.History()
+        self.state = {'a': 1, 'b': 1}
+
+    def restore(self, field, value):
+        current = self.state[field]
+        self.state[field] = value
+        return field, current
+
+    def change(self, field, value):
+        self.history.record((field, self.state[field]))
+        self.state[field] = value
+
+    def test_undo_puts_back_previous_value(self):
+        self.change('a', 2)
+
+        self.assertEqual(self.history.undo(self.restore), {'a'})
+        self.assertEqual(self.state, {'a': 1, 'b': 1})
+
+    def test_redo_applies_again(self):
+        self.change('a', 2)
+        self.history.undo(self.restore)
+
+        self.assertEqual(self.history.redo(self.restore), {'a'})
+        self.assertEqual(self.state['a'], 2)
+
+    def test_entries_with_several_fields(self):
+        self.history.record(('a', 1), ('b', 1))
+        self.state = {'a': 2, 'b': 3}
+
+        self.history.undo(self.restore)
+
+        self.assertEqual(self.state, {'a': 1, 'b': 1})
+
+    def test_nothing_to_undo(self):
+        self.assertEqual(self.history.undo(self.restore), set())
+        self.assertEqual(self.history.redo(self.restore), set())
+
+    def test_new_command_clears_redo(self):
+        self.change('a', 2)
+        self.history.undo(self.restore)
+        self.change('b', 5)
+
+        self.assertEqual(self.history.redo(self.restore), set())
+
+    def test_history_is_bounded(self):
+        for value in range(2 * module.MAX_HISTORY):
+            self.change('a', value)
+
+        self.assertEqual(len(self.history.undo_stack), module.MAX_HISTORY)
+
+    def test_group_is_recorded_as_one_entry(self):
+        self.history.begin()
+        self.change('a', 2)
+        self.change('b', 3)
+        self.history.commit()
+
+        self.assertEqual(self.history.undo(self.restore), {'a', 'b'})
+        self.assertEqual(self.state, {'a': 1, 'b': 1})
+
+    def test_rollback_puts_back_group(self):
+        self.change('a', 2)
+        self.history.begin()
+        self.change('a', 3)
+        self.change('b', 4)
+
+        self.assertEqual(self.history.rollback(self.restore), {'a', 'b'})
+        self.assertEqual(self.state, {'a': 2, 'b': 1})
+        self.assertEqual(len(self.history.undo_stack), 1)
+
+    def test_empty_group_records_nothing(self):
+        self.history.begin()
+        self.history.commit()
+
+        self.assertEqual(len(self.history.undo_stack), 0)
@@ -0,0 +1,84 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+import livequiz.latency as module
+
+
+class TestPingInterval(TestCase):
+    def test_small_quizzes_use_base_interval(self):
+        self.assertEqual(module.ping_interval(3), module.PING_INTERVAL)
+
+    def test_pings_per_second_stay_bounded(self):
+        for sockets in (10, 500, 5000):
+            self.assertLessEqual(
+                sockets / module.ping_interval(sockets),
+                module.MAX_PINGS_PER_SECOND
+            )
+
+
+class TestRoundTripEstimator(TestCase):
+    def setUp(self):
+        self.estimator = module.RoundTripEstimator()
+
+    def sample(self, sent, received, client_time=None):
+        with patch.object(module, 'monotonic', return_value=sent):
+            ping_id = self.estimator.ping()
+        with patch.object(module, 'monotonic', return_value=received):
+            self.estimator.pong(ping_id, client_time)
+
+    def test_first_sample_is_taken_as_is(self):
+        self.sample(10.0, 10.2)
+
+        self.assertAlmostEqual(self.estimator.round_trip, 0.2)
+
+    def test_samples_are_smoothed(self):
+        self.sample(10.0, 10.2)
+        self.sample(20.0, 21.0)
+
+        self.assertAlmostEqual(
+            self.estimator.round_trip,
+            0.2 + module.SMOOTHING * 0.8
+        )
+
+    def test_unknown_pong_ignored(self):
+        self.estimator.pong(42)
+
+        self.assertIsNone(self.estimator.round_trip)
+
+    def test_outstanding_pings_are_bounded(self):
+        for _ in range(10 * module.MAX_OUTSTANDING_PINGS):
+            self.estimator.ping()
+
+        self.assertEqual(len(self.estimator._outstanding), module.MAX_OUTSTANDING_PINGS)
+
+    def test_clock_offset_from_client_time(self):
+        self.sample(10.0, 10.2, client_time=1000.1)
+
+        self.assertAlmostEqual(self.estimator.clock_offset, 990.0)
+
+    def test_pressed_at_without_samples_is_arrival(self):
+        self.assertEqual(self.estimator.pressed_at(50.0), 50.0)
+
+    def test_pressed_at_uses_half_round_trip(self):
+        self.sample(10.0, 10.1)
+
+        self.assertAlmostEqual(self.estimator.pressed_at(50.0), 49.95)
+
+    def test_pressed_at_uses_client_clock(self):
+        self.sample(10.0, 10.2, client_time=1000.1)
+
+        self.assertAlmostEqual(self.estimator.pressed_at(50.0, 1039.97), 49.97)
+
+    def test_pressed_at_is_bounded_by_tolerance(self):
+        self.sample(10.0, 12.0)
+
+        self.assertAlmostEqual(
+            self.estimator.pressed_at(50.0),
+            50.0 - module.BUZZ_TOLERANCE
+        )
+
+    def test_pressed_at_never_after_arrival(self):
+        self.sample(10.0, 10.2, client_time=1000.1)
+
+        self.assertEqual(self.estimator.pressed_at(50.0, 2000.0), 50.0)
@@ -0,0 +1,46 @@
+from django.test import TestCase
+
+from livequiz.engine import Player
+from livequiz.leaderboard import Leaderboard
+
+
+class TestLeaderboard(TestCase):
+    def setUp(self):
+        self.a = Player(1, 'socket a', 'A', 10)
+        self.b = Player(2, 'socket b', 'B', 30)
+        self.c = Player(3, 'socket c', 'C', 20)
+        self.leaderboard = Leaderboard([self.a, self.b, self.c])
+
+    def test_sorted_by_score(self):
+        self.assertEqual(self.leaderboard.top(), [self.b, self.c, self.a])
+        self.assertEqual(self.leaderboard.rank(self.b), 1)
+        self.assertEqual(self.leaderboard.rank(self.a), 3)
+
+    def test_ties_go_to_first_joined(self):
+        d = Player(4, 'socket d', 'D', 20)
+        self.leaderboard.add(d)
+
+        self.assertEqual(self.leaderboard.top(), [self.b, self.c, d, self.a])
+
+    def test_top_is_limited(self):
+        self.assertEqual(self.leaderboard.top(2), [self.b, self.c])
+
+    def test_change_score_moves_player(self):
+        moved = self.leaderboard.change_score(self.a, 25)
+
+        self.assertEqual(moved, (2, 0))
+        self.assertEqual(self.a.score, 35)
+        self.assertEqual(self.leaderboard.top(), [self.a, self.b, self.c])
+
+    def test_deduction_moves_player_down(self):
+        moved = self.leaderboard.change_score(self.b, -100)
+
+        self.assertEqual(moved, (0, 2))
+        self.assertEqual(self.leaderboard.top(), [self.c, self.a, self.b])
+
+    def test_add_replaces_same_player(self):
+        replacement = Player(1, 'socket z', 'A', 50)
+        self.leaderboard.add(replacement)
+
+        self.assertEqual(len(self.leaderboard), 3)
+        self.assertEqual(self.leaderboard.top(), [replacement, self.b, self.c])
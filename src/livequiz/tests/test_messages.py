@@ -74,3 +74,43 @@ class TestParentClientMessageClass(TestCase):
             )
 
             mock.assert_called_once()
+
+
+class TestBatch(TestCase):
+    async def test_players_cannot_send_batches(self):
+        with self.assertRaises(module.AuthorizationException):
+            await module.ClientMessage.handle(None, {'type': 'batch', 'payload': []})
+
+    async def test_batch_must_be_a_list(self):
+        for payload in (None, [], [{}] * (module.MAX_BATCH_SIZE + 1)):
+            with self.assertRaises(module.MalformedMessageException):
+                await module.ClientMessage.handle(
+                    None, {'type': 'batch', 'payload': payload}, is_host=True)
+
+    async def test_history_cannot_be_batched(self):
+        with self.assertRaises(module.MalformedMessageException):
+            await module.ClientMessage.handle(None, {'type': 'batch', 'payload': [
+                {'type': 'history', 'payload': {'action': 'undo'}}
+            ]}, is_host=True)
+
+    async def test_nothing_runs_unless_every_message_is_valid(self):
+        with patch.object(module.MarkQuestionAnswered, 'handle_message') as mock, \
+                self.assertRaises(module.MalformedMessageException):
+            await module.ClientMessage.handle(None, {'type': 'batch', 'payload': [
+                {'type': 'mark answered', 'payload': {'question_id': 1}},
+                {'type': 'mark answered', 'payload': {}},
+            ]}, is_host=True)
+
+        mock.assert_not_called()
+
+
+class TestUpdatePlayerName(TestCase):
+    def test_name_must_be_a_string(self):
+        for data in ({}, {'name': None}, {'name': ['<b>']}, {'name': {'x': 1}}):
+            with self.assertRaises(module.MalformedMessageException):
+                module.UpdatePlayerName(data)
+
+    def test_name_is_capped(self):
+        message = module.UpdatePlayerName({'name': 'a' * 500})
+
+        self.assertEqual(message.new_name, 'a' * 128)
@@ -65,12 +65,11 @@ class TestLiveQuizManagerCreateForQuizMethod(TestCase):
                 'payload': {
                     'view': module.LiveQuizView.QUIZ_BOARD.value,
                     'data': {
-                        'Test': [
-                            {
-                                'id': q_id,
-                                'value': 100
-                            }
-                        ]
+                        'categories': ['Test'],
+                        'sizes': [1],
+                        'ids': [q_id],
+                        'values': [100],
+                        'answered': 'AA=='
                     }
                 }
             }
@@ -90,7 +89,7 @@ class TestLiveQuizModelSetViewMethod(TestCase):
                     ),
                     'Math': (
                         (200, '1+1', '2'),
-                        (400, '4*9', '36'),
+                        (400, '4*9', '36', ('36', '42')),
                     )
                 }
             ),
@@ -112,19 +111,11 @@ class TestLiveQuizModelSetViewMethod(TestCase):
                 'payload': {
                     'view': module.LiveQuizView.QUIZ_BOARD.value,
                     'data': {
-                        'Poetry': [
-                            {
-                                'id': self.q1,
-                                'value': 100
-                            },
-                        ],
-                        'Math': [
-                            None,
-                            {
-                                'id': self.q3,
-                                'value': 400
-                            }
-                        ]
+                        'categories': ['Poetry', 'Math'],
+                        'sizes': [1, 2],
+                        'ids': [self.q1, self.q2, self.q3],
+                        'values': [100, 200, 400],
+                        'answered': 'Ag=='
                     }
                 }
             }
@@ -151,6 +142,14 @@ class TestLiveQuizModelSetViewMethod(TestCase):
             }
         )
 
+    def test_set_view_to_question_with_choices(self):
+        result = self.quiz.set_view(
+            module.LiveQuizView.QUESTION,
+            question=self.q3
+        )
+
+        self.assertEqual(result['payload']['data']['choices'], ['36', '42'])
+
     def test_set_view_to_answer_result(self):
         result = self.quiz.set_view(
             module.LiveQuizView.ANSWER,
@@ -234,31 +233,34 @@ class TestLiveQuizParticipantManagerRegistration(TestCase):
 
     def test_register_creates_first(self):
         self.assertEqual(0, module.LiveQuizParticipant.objects.all().count())
-        
-        module.LiveQuizParticipant.objects.register_socket(
-            self.quiz,
-            new_socket_name='socket a',
-            old_socket_name=None
-        )
 
-        module.LiveQuizParticipant.objects.get(socket_name='socket a')
+        participant = module.LiveQuizParticipant.objects.register(self.quiz)
 
-    def test_register_replaces_socket(self):
-        pk = module.LiveQuizParticipant.objects.register_socket(
-            self.quiz,
-            new_socket_name='socket a',
-            old_socket_name=None
-        ).pk
+        self.assertEqual(participant.number, 1)
+        module.LiveQuizParticipant.objects.get(quiz=self.quiz, number=1)
 
-        module.LiveQuizParticipant.objects.register_socket(
-            self.quiz,
-            new_socket_name='socket c',
-            old_socket_name='socket a'
+    def test_register_numbers_participants_within_quiz(self):
+        other = module.LiveQuizModel.objects.create_for_quiz(
+            self.user,
+            module.QuizData(name='Other', categories={})
         )
 
-        result = module.LiveQuizParticipant.objects.get(socket_name='socket c')
-        
+        numbers = [
+            module.LiveQuizParticipant.objects.register(quiz).number
+            for quiz in [self.quiz, self.quiz, other]
+        ]
+
+        self.assertEqual(numbers, [1, 2, 1])
+
+    def test_register_returns_existing_participant(self):
+        pk = module.LiveQuizParticipant.objects.register(self.quiz).pk
+
+        result = module.LiveQuizParticipant.objects.register(self.quiz, 1)
+
         self.assertEqual(pk, result.pk)
+        self.assertEqual(1, module.LiveQuizParticipant.objects.all().count())
+
+    def test_register_creates_for_unknown_number(self):
+        result = module.LiveQuizParticipant.objects.register(self.quiz, 7)
 
-        with self.assertRaises(module.LiveQuizParticipant.DoesNotExist):
-            module.LiveQuizParticipant.objects.get(socket_name='socket a')
\ No newline at end of file
+        self.assertEqual(result.number, 1)
\ No newline at end of file
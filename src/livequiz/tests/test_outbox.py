@@ -0,0 +1,103 @@
+from django.test import SimpleTestCase
+
+import livequiz.outbox as module
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestOutbox(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.outbox = module.Outbox(max_queued=4, max_lag=10.0, clock=self.clock)
+
+    def drain(self):
+        items = []
+        while (item := self.outbox.get()) is not None:
+            items.append(item)
+        return items
+
+    def test_items_come_out_in_order(self):
+        for item in ['a', 'b', 'c']:
+            self.assertTrue(self.outbox.put(item, numbered=True))
+
+        self.assertEqual(self.drain(), ['a', 'b', 'c'])
+        self.assertEqual(self.outbox.behind, 0.0)
+
+    def test_falling_behind_replaces_broadcasts_with_snapshot(self):
+        self.outbox.put('rank')
+        for item in ['a', 'b', 'c']:
+            self.assertTrue(self.outbox.put(item, numbered=True))
+
+        self.assertEqual(self.outbox.lag(), {'queued': 2, 'dropped': 3, 'behind': 0.0})
+        self.assertEqual(self.drain(), ['rank', module.SNAPSHOT])
+
+    def test_broadcasts_are_dropped_while_snapshot_is_queued(self):
+        for item in ['a', 'b', 'c', 'd']:
+            self.outbox.put(item, numbered=True)
+        self.outbox.put('e', numbered=True)
+        self.outbox.put('error')
+
+        self.assertEqual(self.drain(), [module.SNAPSHOT, 'error'])
+        self.assertEqual(self.outbox.dropped, 5)
+
+        self.outbox.put('f', numbered=True)
+        self.assertEqual(self.drain(), ['f'])
+
+    def test_staying_behind_gives_up(self):
+        for item in ['a', 'b', 'c', 'd']:
+            self.outbox.put(item, numbered=True)
+
+        self.clock.now = 5.0
+        self.assertTrue(self.outbox.put('e', numbered=True))
+        self.clock.now = 10.0
+        self.assertFalse(self.outbox.put('f', numbered=True))
+
+    def test_catching_up_resets_lag(self):
+        for item in ['a', 'b', 'c', 'd']:
+            self.outbox.put(item, numbered=True)
+        self.clock.now = 9.0
+        self.drain()
+
+        self.assertTrue(self.outbox.put('e', numbered=True))
+        self.assertEqual(self.outbox.behind, 0.0)
+
+    def test_too_many_unnumbered_items_gives_up(self):
+        for item in ['a', 'b', 'c']:
+            self.assertTrue(self.outbox.put(item))
+
+        self.assertFalse(self.outbox.put('d'))
+
+    def test_closed_outbox_takes_nothing(self):
+        self.outbox.put('a')
+        self.outbox.close()
+
+        self.assertTrue(self.outbox.put('b'))
+        self.assertEqual(self.drain(), [])
+
+    def test_held_outbox_writes_nothing(self):
+        self.outbox.put('a', numbered=True)
+        self.outbox.hold()
+
+        self.assertEqual(self.drain(), [])
+        self.outbox.put('b', numbered=True)
+
+        self.outbox.release()
+        self.assertEqual(self.drain(), ['a', 'b'])
+
+    def test_held_outbox_falls_behind(self):
+        self.outbox.hold()
+        for item in ['a', 'b', 'c', 'd', 'e']:
+            self.outbox.put(item, numbered=True)
+        self.clock.now = 5.0
+
+        self.assertEqual(self.drain(), [])
+        self.assertEqual(self.outbox.behind, 5.0)
+
+        self.outbox.release()
+        self.assertEqual(self.drain(), [module.SNAPSHOT])
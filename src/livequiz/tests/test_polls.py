@@ -0,0 +1,41 @@
+from django.test import TestCase
+
+from livequiz.polls import Poll
+
+
+class TestPoll(TestCase):
+    def setUp(self):
+        self.poll = Poll(1, ['a', 'b', 'c'])
+
+    def test_votes_counted(self):
+        self.poll.vote('x', 0)
+        self.poll.vote('y', 0)
+        self.poll.vote('z', 2)
+
+        self.assertEqual(self.poll.counts.tolist(), [2, 0, 1])
+        self.assertEqual(self.poll.total, 3)
+
+    def test_changing_vote_moves_it(self):
+        self.poll.vote('x', 0)
+
+        self.assertTrue(self.poll.vote('x', 1))
+        self.assertEqual(self.poll.counts.tolist(), [0, 1, 0])
+
+    def test_same_vote_changes_nothing(self):
+        self.poll.vote('x', 0)
+
+        self.assertFalse(self.poll.vote('x', 0))
+        self.assertEqual(self.poll.counts.tolist(), [1, 0, 0])
+
+    def test_unknown_choice_raises(self):
+        with self.assertRaises(IndexError):
+            self.poll.vote('x', 3)
+
+    def test_percentages(self):
+        self.assertEqual(self.poll.percentages(), [0.0, 0.0, 0.0])
+
+        self.poll.vote('x', 0)
+        self.poll.vote('y', 0)
+        self.poll.vote('z', 1)
+
+        self.assertEqual(self.poll.percentages(), [66.7, 33.3, 0.0])
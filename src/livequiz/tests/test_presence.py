@@ -0,0 +1,37 @@
+from django.test import SimpleTestCase
+
+import livequiz.presence as module
+
+
+class TestPresence(SimpleTestCase):
+    def setUp(self):
+        self.presence = module.Presence()
+        self.presence.add('socket a')
+        self.presence.add('socket b')
+
+    def test_counts(self):
+        self.presence.set_idle('socket a', True)
+
+        self.assertEqual(self.presence.counts(), {'connected': 2, 'idle': 1})
+
+    def test_speaking_again_is_not_idle(self):
+        self.presence.set_idle('socket a', True)
+        self.presence.set_idle('socket a', False)
+
+        self.assertEqual(self.presence.idle, 0)
+
+    def test_disconnecting_leaves_both_counts(self):
+        self.presence.set_idle('socket a', True)
+        self.presence.discard('socket a')
+
+        self.assertEqual(self.presence.counts(), {'connected': 1, 'idle': 0})
+
+    def test_unknown_socket_never_idle(self):
+        self.presence.discard('socket a')
+        self.presence.set_idle('socket a', True)
+
+        self.assertEqual(self.presence.idle, 0)
+
+    def test_timeout_grows_with_heartbeat_interval(self):
+        self.assertEqual(module.idle_timeout(5.0), module.IDLE_TIMEOUT)
+        self.assertEqual(module.idle_timeout(20.0), module.MISSED_HEARTBEATS * 20.0)
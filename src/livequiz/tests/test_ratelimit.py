@@ -0,0 +1,67 @@
+import json
+
+from django.test import SimpleTestCase
+
+import livequiz.ratelimit as module
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(SimpleTestCase):
+    def test_allows_a_burst(self):
+        bucket = module.TokenBucket(1.0, 3, 0.0)
+
+        self.assertEqual([bucket.take(0.0) for _ in range(4)], [True, True, True, False])
+
+    def test_refills_over_time(self):
+        bucket = module.TokenBucket(2.0, 1, 0.0)
+        bucket.take(0.0)
+
+        self.assertFalse(bucket.take(0.25))
+        self.assertTrue(bucket.take(0.5))
+
+    def test_never_holds_more_than_capacity(self):
+        bucket = module.TokenBucket(10.0, 2, 0.0)
+
+        self.assertEqual([bucket.take(100.0) for _ in range(3)], [True, True, False])
+
+
+class TestRateLimiter(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = module.RateLimiter(
+            {'buzz in': (1.0, 1)}, default=(1.0, 2), clock=self.clock)
+
+    def test_each_limited_type_has_its_own_bucket(self):
+        self.assertTrue(self.limiter.allow('buzz in'))
+        self.assertFalse(self.limiter.allow('buzz in'))
+        self.assertTrue(self.limiter.allow('set view'))
+
+    def test_other_types_share_a_bucket(self):
+        self.assertTrue(self.limiter.allow('set view'))
+        self.assertTrue(self.limiter.allow('made up'))
+        self.assertFalse(self.limiter.allow(['not', 'hashable']))
+        self.assertEqual(set(self.limiter.buckets), {None})
+
+    def test_allows_again_once_refilled(self):
+        self.limiter.allow('buzz in')
+        self.clock.now = 1.0
+
+        self.assertTrue(self.limiter.allow('buzz in'))
+
+
+class TestThrottledFrame(SimpleTestCase):
+    def test_frame_is_an_encoded_error(self):
+        frame = json.loads(module.get_throttled_frame('buzz in').text)
+
+        self.assertEqual(frame['type'], 'error')
+        self.assertIn('buzz in', frame['payload'][0])
+
+    def test_frame_is_cached(self):
+        self.assertIs(module.get_throttled_frame('vote'), module.get_throttled_frame('vote'))
@@ -0,0 +1,60 @@
+from django.test import SimpleTestCase
+
+import livequiz.roster as module
+
+
+class TestRoster(SimpleTestCase):
+    def setUp(self):
+        self.roster = module.Roster()
+
+    def test_nothing_to_take(self):
+        self.assertIsNone(self.roster.take())
+
+    def test_changes_are_taken_once(self):
+        self.roster.add(1, 'Ann')
+        self.roster.add(2, 'Bob')
+
+        self.assertEqual(
+            self.roster.take(), {'added': [[1, 'Ann'], [2, 'Bob']], 'renamed': [], 'left': []})
+        self.assertIsNone(self.roster.take())
+
+    def test_rename_before_taking_is_an_add(self):
+        self.roster.add(1, 'Anonymous')
+        self.roster.add(1, 'Ann')
+
+        self.assertEqual(self.roster.take()['added'], [[1, 'Ann']])
+
+    def test_joining_and_leaving_in_between_is_not_sent(self):
+        self.roster.add(1, 'Ann')
+        self.roster.remove(1)
+
+        self.assertIsNone(self.roster.take())
+
+    def test_reconnecting_under_same_name_is_not_sent(self):
+        self.roster.add(1, 'Ann')
+        self.roster.take()
+
+        self.roster.remove(1)
+        self.roster.add(1, 'Ann')
+
+        self.assertIsNone(self.roster.take())
+
+    def test_renames_and_leaves(self):
+        self.roster.add(1, 'Ann')
+        self.roster.add(2, 'Bob')
+        self.roster.take()
+
+        self.roster.add(1, 'Anna')
+        self.roster.remove(2)
+
+        self.assertEqual(
+            self.roster.take(), {'added': [], 'renamed': [[1, 'Anna']], 'left': [2]})
+        self.assertEqual(self.roster.published, {1: 'Anna'})
+
+    def test_entries_include_pending_changes(self):
+        self.roster.add(1, 'Ann')
+        self.roster.take()
+        self.roster.add(2, 'Bob')
+        self.roster.remove(1)
+
+        self.assertEqual(self.roster.entries(), {2: 'Bob'})
@@ -0,0 +1,108 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+import livequiz.snapshots as module
+
+
+class TestSnapshotStore(SimpleTestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.store = self.open()
+
+    def open(self):
+        store = module.SnapshotStore(self.directory)
+        store.open()
+        self.addCleanup(store.close)
+        return store
+
+    def test_disabled_without_directory(self):
+        store = module.SnapshotStore()
+        store.open()
+
+        self.assertFalse(store.save({'ABC': {'view': 1}}))
+        self.assertIsNone(store.get('ABC'))
+
+    def test_saved_snapshot_survives_restart(self):
+        self.store.save({'ABC': {'view': 1}})
+        self.store.save({'ABC': {'view': 2}, 'DEF': {'view': 3}})
+
+        store = self.open()
+
+        self.assertEqual(store.get('ABC'), {'view': 2})
+        self.assertEqual(store.get('DEF'), {'view': 3})
+
+    def test_deleted_snapshot_stays_deleted(self):
+        self.store.save({'ABC': {'view': 1}})
+        self.store.save({'ABC': None})
+
+        self.assertIsNone(self.store.get('ABC'))
+        self.assertIsNone(self.open().get('ABC'))
+
+    def test_truncated_line_is_ignored(self):
+        self.store.save({'ABC': {'view': 1}})
+        self.store.close()
+        with open(self.directory / module.JOURNAL_FILE, 'ab') as file:
+            file.write(b'ABC\t{"view":')
+
+        self.assertEqual(self.open().get('ABC'), {'view': 1})
+
+    def test_unreadable_snapshot_is_dropped(self):
+        self.store.save({'ABC': {'view': 1}, 'DEF': {'view': 2}})
+        self.store.close()
+        with open(self.directory / module.JOURNAL_FILE, 'ab') as file:
+            file.write(b'ABC\t{"view":\n')
+
+        store = self.open()
+
+        self.assertIsNone(store.get('ABC'))
+        self.assertNotIn('ABC', store.lines)
+        self.assertEqual(store.get('DEF'), {'view': 2})
+
+    def test_nothing_restored_if_reading_fails(self):
+        self.store.save({'ABC': {'view': 1}})
+        store = module.SnapshotStore(self.directory)
+
+        with patch.object(store, '_read', side_effect=[None, OSError]), \
+                self.assertRaises(OSError):
+            store.open()
+
+        self.assertEqual(store.lines, {})
+
+    def test_open_compacts_journal(self):
+        self.store.save({'ABC': {'view': 1}})
+        self.store.save({'ABC': {'view': 2}})
+
+        self.open()
+
+        self.assertFalse((self.directory / module.JOURNAL_FILE).exists())
+        snapshot = (self.directory / module.SNAPSHOT_FILE).read_bytes()
+        self.assertEqual(snapshot, b'ABC\t{"view":2}\n')
+
+    def test_compaction_is_due_once_journal_outgrows_snapshots(self):
+        with patch.object(module, 'COMPACT_AFTER', 3):
+            self.assertFalse(self.store.save({'ABC': {'view': 1}, 'DEF': {'view': 1}}))
+            self.assertTrue(self.store.save({'ABC': {'view': 2}}))
+
+    def test_saves_during_compaction_go_to_new_journal(self):
+        self.store.save({'ABC': {'view': 1}})
+        lines = self.store.rotate()
+        self.store.save({'ABC': {'view': 2}})
+        self.store.write_snapshot(lines)
+
+        self.assertEqual(self.open().get('ABC'), {'view': 2})
+
+    def test_interrupted_compaction_keeps_rotated_journal(self):
+        self.store.save({'ABC': {'view': 1}})
+        self.store.rotate()
+        self.store.save({'DEF': {'view': 2}})
+        self.store.close()
+
+        store = self.open()
+
+        self.assertEqual(store.get('ABC'), {'view': 1})
+        self.assertEqual(store.get('DEF'), {'view': 2})
@@ -0,0 +1,96 @@
+from django.test import TestCase
+
+import livequiz.timers as module
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTimerWheel(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.wheel = module.TimerWheel(clock=self.clock)
+        self.fired = []
+
+    def schedule(self, delay, name):
+        return self.wheel.schedule(delay, self.fired.append, name)
+
+    def advance(self, seconds):
+        self.clock.now += seconds
+        self.wheel.run_due()
+
+    def test_timer_fires_once_due(self):
+        self.schedule(0.5, 'a')
+
+        self.advance(0.49)
+        self.assertEqual(self.fired, [])
+
+        self.advance(0.02)
+        self.assertEqual(self.fired, ['a'])
+
+    def test_timers_fire_in_order(self):
+        self.schedule(0.3, 'c')
+        self.schedule(0.1, 'a')
+        self.schedule(0.2, 'b')
+
+        self.advance(1)
+
+        self.assertEqual(self.fired, ['a', 'b', 'c'])
+
+    def test_cancelled_timer_does_not_fire(self):
+        timer = self.schedule(0.1, 'a')
+        timer.cancel()
+        timer.cancel()
+
+        self.advance(1)
+
+        self.assertEqual(self.fired, [])
+        self.assertEqual(self.wheel.count, 0)
+        self.assertFalse(timer.active)
+
+    def test_far_timers_cascade(self):
+        delays = [0.7, 5.0, 42.0, 3000.0]
+        for delay in delays:
+            self.schedule(delay, delay)
+
+        for delay in delays:
+            self.advance(delay - self.clock.now + 100 - module.TICK)
+            self.assertNotIn(delay, self.fired)
+            self.advance(2 * module.TICK)
+            self.assertIn(delay, self.fired)
+
+    def test_timers_fire_within_a_tick(self):
+        for index in range(1000):
+            self.schedule(index * 0.037, index)
+
+        fired_at = {}
+        while self.wheel.count:
+            self.advance(module.TICK)
+            for index in self.fired:
+                fired_at.setdefault(index, self.clock.now - 100)
+
+        for index, when in fired_at.items():
+            self.assertGreaterEqual(when + 1e-9, index * 0.037)
+            self.assertLess(when, index * 0.037 + 2 * module.TICK)
+
+    def test_idle_wheel_skips_ahead(self):
+        self.advance(10_000)
+        self.schedule(0.1, 'a')
+
+        self.advance(0.2)
+
+        self.assertEqual(self.fired, ['a'])
+        self.assertLessEqual(self.wheel.current, self.wheel._now())
+
+    def test_failing_callback_does_not_stop_others(self):
+        self.wheel.schedule(0.1, lambda: 1 / 0)
+        self.schedule(0.1, 'a')
+
+        self.advance(0.2)
+
+        self.assertEqual(self.fired, ['a'])
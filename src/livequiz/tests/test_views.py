@@ -1,8 +1,13 @@
+from collections import Counter
+from unittest.mock import Mock, patch
+
 from django.contrib.auth.models import User
 from django.test import TestCase
 from django.urls import reverse
 
+from livequiz.engine import engine
 from livequiz.models import LiveQuizModel, QuizData
+from livequiz.presence import Presence
 
 
 class TestLiveQuizList(TestCase):
@@ -73,6 +78,57 @@ class TestLiveQuizList(TestCase):
         )
 
 
+    def test_dropped_messages_shown_for_quiz_in_memory(self):
+        quiz = LiveQuizModel.objects.create_for_quiz(self.user, QuizData(name='Test', categories={}))
+        state = Mock(dropped_messages=Counter({'buzz in': 2, 'vote': 1}), frames_saved=0,
+                     lagging_sockets={}, slow_sockets_closed=0, presence=Presence())
+
+        with patch.object(engine, 'get_loaded_state', return_value=state) as get_loaded_state:
+            response = self.get_response()
+
+        get_loaded_state.assert_called_once_with(quiz.code)
+        self.assertContains(response, '3 messages dropped')
+        self.assertNotContains(response, 'saved by coalescing')
+
+    def test_frames_saved_shown_for_quiz_in_memory(self):
+        LiveQuizModel.objects.create_for_quiz(self.user, QuizData(name='Test', categories={}))
+        state = Mock(dropped_messages=Counter(), frames_saved=4,
+                     lagging_sockets={}, slow_sockets_closed=0, presence=Presence())
+
+        with patch.object(engine, 'get_loaded_state', return_value=state):
+            response = self.get_response()
+
+        self.assertContains(response, '4 broadcast frames saved by coalescing')
+
+    def test_slow_connections_shown_for_quiz_in_memory(self):
+        LiveQuizModel.objects.create_for_quiz(self.user, QuizData(name='Test', categories={}))
+        outbox = Mock()
+        outbox.lag.return_value = {'queued': 3, 'dropped': 40, 'behind': 2.5}
+        state = Mock(dropped_messages=Counter(), frames_saved=0,
+                     lagging_sockets={'socket a': outbox}, slow_sockets_closed=2,
+                     presence=Presence())
+
+        with patch.object(engine, 'get_loaded_state', return_value=state):
+            response = self.get_response()
+
+        self.assertContains(response, '1 connection falling behind, 2 closed for staying behind')
+        self.assertContains(response, '2.5s behind, 3 queued, 40 dropped')
+
+    def test_presence_shown_for_quiz_in_memory(self):
+        LiveQuizModel.objects.create_for_quiz(self.user, QuizData(name='Test', categories={}))
+        presence = Presence()
+        for channel_name in ['socket a', 'socket b', 'socket c']:
+            presence.add(channel_name)
+        presence.set_idle('socket b', True)
+        state = Mock(dropped_messages=Counter(), frames_saved=0,
+                     lagging_sockets={}, slow_sockets_closed=0, presence=presence)
+
+        with patch.object(engine, 'get_loaded_state', return_value=state):
+            response = self.get_response()
+
+        self.assertContains(response, '3 players connected, 1 idle')
+
+
 class TestDeletePage(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -0,0 +1,150 @@
+'''
+A hierarchical timer wheel shared by every live quiz in this worker. Scheduling and
+cancelling are O(1), and a single asyncio task drives all timers instead of one sleeping
+task per quiz.
+'''
+
+import asyncio
+import logging as LOG
+from math import ceil
+from time import monotonic
+
+# Seconds per tick of the innermost wheel, which bounds how late a timer can fire.
+TICK = 0.01
+
+# Each level has 2**LEVEL_BITS slots, and each slot of a level spans a whole
+# revolution of the level below it. Four levels of 64 slots reach about 45 hours.
+LEVEL_BITS = 6
+LEVELS = 4
+
+SLOTS = 1 << LEVEL_BITS
+SLOT_MASK = SLOTS - 1
+MAX_TICKS = (1 << (LEVEL_BITS * LEVELS)) - 1
+
+
+class Timer:
+    '''A scheduled callback. Cancel it to stop it from firing.'''
+    __slots__ = ('wheel', 'tick', 'callback', 'args', 'slot')
+
+    def __init__(self, wheel, tick, callback, args):
+        self.wheel = wheel
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.slot = None
+
+    @property
+    def active(self) -> bool:
+        '''Whether the timer is still waiting to fire.'''
+        return self.slot is not None
+
+    def cancel(self):
+        '''Stops the timer from firing. Does nothing if it already fired or was cancelled.'''
+        if self.slot is not None:
+            del self.slot[self]
+            self.slot = None
+            self.wheel.count -= 1
+
+
+class TimerWheel:
+    '''
+    Hashed, hierarchical timing wheel in the style of Varghese and Lauck. Timers due
+    within one revolution of the innermost level sit in the slot of their tick. Later
+    timers sit in coarser levels and cascade inwards as the wheel turns.
+    '''
+
+    def __init__(self, clock=monotonic, tick=TICK):
+        self.clock = clock
+        self.tick = tick
+        self.started_at = clock()
+        self.current = 0
+        self.count = 0
+        self.levels = [[{} for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self._task = None
+
+    def _now(self) -> int:
+        return int((self.clock() - self.started_at) / self.tick)
+
+    def schedule(self, delay: float, callback, *args) -> Timer:
+        '''Calls callback(*args) once delay seconds have passed.'''
+        if self.count == 0:
+            self.current = max(self.current, self._now())
+
+        due = ceil((self.clock() - self.started_at + delay) / self.tick)
+        due = min(max(due, self.current + 1), self.current + MAX_TICKS)
+
+        timer = Timer(self, due, callback, args)
+        self._insert(timer)
+        self.count += 1
+
+        self._ensure_running()
+        return timer
+
+    def _insert(self, timer: Timer):
+        distance = timer.tick - self.current
+
+        level = 0
+        while level < LEVELS - 1 and distance >= 1 << (LEVEL_BITS * (level + 1)):
+            level += 1
+
+        slot = self.levels[level][(timer.tick >> (LEVEL_BITS * level)) & SLOT_MASK]
+        slot[timer] = None
+        timer.slot = slot
+
+    def _cascade(self, level: int) -> int:
+        '''Moves the timers of the current slot of level into lower levels.'''
+        index = (self.current >> (LEVEL_BITS * level)) & SLOT_MASK
+        slot = self.levels[level][index]
+        self.levels[level][index] = {}
+
+        for timer in slot:
+            self._insert(timer)
+
+        return index
+
+    def run_due(self):
+        '''Turns the wheel up to the present, firing every timer that came due.'''
+        now = self._now()
+
+        while self.current < now and self.count:
+            self.current += 1
+
+            level = 1
+            while level < LEVELS and (self.current & ((1 << (LEVEL_BITS * level)) - 1)) == 0:
+                self._cascade(level)
+                level += 1
+
+            index = self.current & SLOT_MASK
+            due = self.levels[0][index]
+            self.levels[0][index] = {}
+
+            for timer in due:
+                timer.slot = None
+                self.count -= 1
+                try:
+                    timer.callback(*timer.args)
+                except Exception:
+                    LOG.exception('Timer callback %s failed', timer.callback)
+
+        if not self.count:
+            self.current = max(self.current, now)
+
+    def _ensure_running(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        task = self._task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        '''Wakes up once per tick for as long as there are timers.'''
+        while self.count:
+            self.run_due()
+            next_tick = self.started_at + (self.current + 1) * self.tick
+            await asyncio.sleep(max(0, next_tick - self.clock()))
+
+
+timers = TimerWheel()
@@ -4,6 +4,7 @@ from django.shortcuts import redirect
 from django.urls import reverse
 from django.views.generic import TemplateView, View
 
+from livequiz.engine import engine
 from livequiz.models import LiveQuizModel
 from quiz.models import QuizModel
 
@@ -17,6 +18,18 @@ class ListHostableQuizzesPage(TemplateView):
             self.request.user)
         context['live_quizzes'] = LiveQuizModel.objects.owned_by_user(
             self.request.user)
+        for quiz in context['live_quizzes']:
+            state = engine.get_loaded_state(quiz.code)
+            quiz.dropped_messages = sum(state.dropped_messages.values()) if state else 0
+            quiz.frames_saved = state.frames_saved if state else 0
+            quiz.socket_lags = sorted(
+                (outbox.lag() for outbox in state.lagging_sockets.values()),
+                key=lambda lag: -lag['behind']
+            ) if state else []
+            quiz.lagging_sockets = len(quiz.socket_lags)
+            quiz.slow_sockets_closed = state.slow_sockets_closed if state else 0
+            quiz.connected_players = state.presence.connected if state else 0
+            quiz.idle_players = state.presence.idle if state else 0
         return context
 
 
@@ -130,6 +130,12 @@ DATABASES =  {
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Live quizzes are snapshotted here so a restarted worker can carry on where it stopped.
+LIVEQUIZ_SNAPSHOT_DIR = None if 'test' in argv else BASE_DIR / 'snapshots'
+
+# Seconds broadcasts are held back to be sent together, dropping those made obsolete.
+LIVEQUIZ_COALESCE_WINDOW = 0 if 'test' in argv else 0.03
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels.layers.InMemoryChannelLayer"